@@ -1,14 +1,17 @@
 from discord.ext import commands
 import discord
 import aiohttp
+import asyncio
 import logging
 from datetime import datetime
 from typing import Optional, Dict, ClassVar, Callable
 from functools import wraps
+from utils.image_pool import ImagePool
+from utils.http_client import HTTPStatusError, CircuitOpenError
 
 def anime_command(name: str, title: str, help_text: str):
     def decorator(func: Callable):
-        @commands.command(name=name)
+        @commands.command(name=name, extras={"endpoint": name})
         @commands.cooldown(1, 5, commands.BucketType.user)
         @wraps(func)
         async def wrapper(self, ctx, member: Optional[discord.Member] = None):
@@ -71,15 +74,16 @@ class AnimeCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = logging.getLogger('AnimeCommands')
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.pool: Optional[ImagePool] = None
 
     async def cog_load(self):
-        self.session = aiohttp.ClientSession()
+        self.pool = ImagePool(self.bot.http_client, self.BASE_API_URL)
+        self.pool.warm(command.extras["endpoint"] for command in self.get_commands() if "endpoint" in command.extras)
 
     async def cog_unload(self):
-        if self.session:
-            await self.session.close()
-            self.session = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
 
     def create_embed(self, title: str, image_url: str, artist: Optional[str], 
         interaction_msg: Optional[str] = None,
@@ -103,49 +107,41 @@ class AnimeCommands(commands.Cog):
 
     async def _fetch_anime_image(self, ctx: commands.Context, endpoint: str, 
                                title: str, mentioned_user: Optional[discord.Member] = None) -> None:
-        if not self.session:
+        if not self.pool:
             await ctx.send("Bot is not properly initialized. Please try again later.")
             return
 
         try:
-            async with self.session.get(f"{self.BASE_API_URL}{endpoint}") as response:
-                if response.status != 200:
-                    await ctx.send(f"API returned status {response.status}. Please try again later.")
-                    return
-
-                data = await response.json()
-                results = data.get('results', [])
-                if not results:
-                    await ctx.send("No images found. Please try again later.")
-                    return
-
-                image_data = results[0]
-                image_url = image_data.get('url')
-                if not image_url:
-                    await ctx.send("Invalid image data received. Please try again later.")
-                    return
-
-                interaction_msg = None
-                target_member = mentioned_user
-                if mentioned_user and endpoint in self.INTERACTION_DESCRIPTIONS:
-                    interaction_msg = self.INTERACTION_DESCRIPTIONS[endpoint].format(
-                        author=ctx.author.mention,
-                        target=mentioned_user.mention
-                    )
-                elif not mentioned_user:
-                    target_member = ctx.author
-
-                embed = self.create_embed(
-                    title=title,
-                    image_url=image_url,
-                    artist=image_data.get('artist_name'),
-                    interaction_msg=interaction_msg,
-                    member=target_member
+            image_data = await self.pool.get(endpoint)
+            if not image_data:
+                await ctx.send("No images found. Please try again later.")
+                return
+
+            interaction_msg = None
+            target_member = mentioned_user
+            if mentioned_user and endpoint in self.INTERACTION_DESCRIPTIONS:
+                interaction_msg = self.INTERACTION_DESCRIPTIONS[endpoint].format(
+                    author=ctx.author.mention,
+                    target=mentioned_user.mention
                 )
-                
-                await ctx.send(embed=embed)
+            elif not mentioned_user:
+                target_member = ctx.author
+
+            embed = self.create_embed(
+                title=title,
+                image_url=image_data['url'],
+                artist=image_data.get('artist_name'),
+                interaction_msg=interaction_msg,
+                member=target_member
+            )
+            
+            await ctx.send(embed=embed)
 
-        except aiohttp.ClientError as e:
+        except HTTPStatusError as e:
+            await ctx.send(f"API returned status {e.status}. Please try again later.")
+        except CircuitOpenError:
+            await ctx.send("The image service is down right now. Please try again in a bit.")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             self.logger.error(f"API request failed: {str(e)}")
             await ctx.send("Failed to connect to the image service. Please try again later.")
         except Exception as e:
@@ -230,7 +226,7 @@ class AnimeCommands(commands.Cog):
     @anime_command(name="handshake", title="Handshake!", help_text="Shake hands with someone!")
     async def handshake(self, ctx, member: discord.Member = None): pass
 
-    @commands.command(name="punt")
+    @commands.command(name="punt", extras={"endpoint": "kick"})
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def punt(self, ctx, member: Optional[discord.Member] = None):
         """Kick someone!"""
@@ -0,0 +1,123 @@
+from discord.ext import commands
+import discord
+from datetime import datetime
+import logging
+from utils.automod import RateLimits, StrikeCounter
+from utils.time_parser import format_duration
+from utils.pipeline import MODERATION
+
+# Mute length for the 2nd, 3rd, ... strike; the 1st only deletes and warns
+ESCALATION = (10 * 60, 60 * 60, 24 * 3600)
+
+# Strikes are forgotten after an hour without a new one
+STRIKE_RESET = 3600
+
+class AutoMod(commands.Cog):
+    """Rate limits messages, mentions and attachments per member
+
+    A message over a limit is deleted and counts as a strike; repeated
+    strikes mute through the Mute cog for longer each time. Members who can
+    manage messages are exempt.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = bot.db
+        self.limits = RateLimits()
+        self.strikes = StrikeCounter(STRIKE_RESET)
+        # (guild_id, user_id) of members being muted right now
+        self.acting = set()
+        self.checked = 0
+        self.violations = 0
+
+    async def cog_load(self):
+        self.bot.pipeline.register('automod', MODERATION, self.check_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('automod')
+
+    async def check_message(self, ctx):
+        message = ctx.message
+        if not ctx.guild:
+            return False
+        key = (ctx.guild.id, ctx.author.id)
+        self.checked += 1
+        kind = self.limits.check(
+            key,
+            len(message.mentions) + len(message.role_mentions) + message.mention_everyone,
+            len(message.attachments)
+        )
+        if kind is None or ctx.author.guild_permissions.manage_messages:
+            return False
+        self.violations += 1
+        await self.handle_violation(message, key, kind)
+        return True
+
+    async def handle_violation(self, message, key, kind):
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+        if key in self.acting:
+            # Already being muted, the rest of the burst is just cleaned up
+            return
+
+        # The rest of a burst is deleted without more strikes, until the
+        # broken limit would have refilled
+        strikes = self.strikes.add(key, cooldown=self.limits.limits[kind][1])
+        if not strikes:
+            return
+        reason = f"Automod: too many {kind}"
+        self.db.log_action(
+            message.guild.id,
+            message.author.id,
+            "automod",
+            {
+                "reason": reason,
+                "strike": strikes,
+                "moderator": self.bot.user.id,
+                "moderator_name": str(self.bot.user)
+            }
+        )
+
+        if strikes == 1:
+            await message.channel.send(
+                f"{message.author.mention}, slow down! ({kind})", delete_after=10
+            )
+            return
+
+        mute = self.bot.get_cog('Mute')
+        if mute is None:
+            return
+        duration = ESCALATION[min(strikes - 2, len(ESCALATION) - 1)]
+        self.acting.add(key)
+        try:
+            if await mute.apply_mute(message.guild, message.author, message.guild.me, duration, reason):
+                await message.channel.send(
+                    f"{message.author.mention} has been muted for {format_duration(duration)}. Reason: {reason}",
+                    delete_after=30
+                )
+        except discord.HTTPException as e:
+            logging.error(f"Automod could not mute {message.author.id} in {message.guild.id}: {e}")
+        finally:
+            self.acting.discard(key)
+
+    @commands.command()
+    @commands.has_permissions(manage_messages=True)
+    async def automodstats(self, ctx):
+        """Show what the automod has seen since the bot started"""
+        embed = discord.Embed(
+            title="Automod",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Messages checked", value=str(self.checked), inline=True)
+        embed.add_field(name="Violations", value=str(self.violations), inline=True)
+        embed.add_field(name="Members with strikes", value=str(len(self.strikes)), inline=True)
+        embed.add_field(name="Active buckets", value=str(len(self.limits)), inline=True)
+        for kind, (capacity, per) in self.limits.limits.items():
+            embed.add_field(name=kind.capitalize(), value=f"{capacity} per {per}s", inline=True)
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(AutoMod(bot))
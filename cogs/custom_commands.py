@@ -3,7 +3,11 @@ import discord
 import json
 import os
 import logging
+import asyncio
 from datetime import datetime
+from utils.atomic_io import SnapshotWriter
+from utils.pipeline import CUSTOM_COMMANDS
+from utils.templates import PLACEHOLDERS, Template, compile_commands, case_conflicts
 
 class CustomCommands(commands.Cog):
     def __init__(self, bot):
@@ -11,12 +15,33 @@ class CustomCommands(commands.Cog):
         self.logger = logging.getLogger('CustomCommands')
         os.makedirs('data', exist_ok=True)
         self.commands_file = 'data/custom_commands.json'
-        self.commands = self.load_commands()
+        self.commands = {}
+        # guild_id -> {lower-cased name or alias: CustomCommand}
+        self.tables = {}
+        self.writer = SnapshotWriter(
+            self.commands_file,
+            lambda: {guild_id: {name: dict(data) for name, data in cmds.items()}
+                     for guild_id, cmds in self.commands.items()},
+            indent=4
+        )
+
+    async def cog_load(self):
+        self.commands = await asyncio.to_thread(self.load_commands)
+        for guild_id, cmds in self.commands.items():
+            for names in case_conflicts(cmds):
+                self.logger.warning(
+                    f"Custom commands {', '.join(names)} in {guild_id} only differ by case, "
+                    f"only {names[-1]} can be used"
+                )
+            self.compile(guild_id)
+        self.bot.pipeline.register('custom_commands', CUSTOM_COMMANDS, self.run_custom_command)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('custom_commands')
+        await self.writer.close()
 
     async def log_to_modchannel(self, guild, embed):
-        mod_channel = discord.utils.get(guild.channels, name='mod-logs')
-        if mod_channel:
-            await mod_channel.send(embed=embed)
+        self.bot.modlog.enqueue(guild, embed)
 
     def load_commands(self):
         if not os.path.exists(self.commands_file):
@@ -29,47 +54,63 @@ class CustomCommands(commands.Cog):
             return {}
 
     def save_commands(self):
-        try:
-            with open(self.commands_file, 'w') as f:
-                json.dump(self.commands, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Failed to save custom commands: {e}")
+        """Queue a write of the current commands, done off the event loop"""
+        self.writer.request_save()
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    def compile(self, guild_id):
+        """Rebuild a guild's dispatch table after its commands changed"""
+        self.tables[guild_id] = compile_commands(self.commands.get(guild_id, {}), self.tables.get(guild_id))
 
-        content = message.content.lower().strip()
+    def find(self, guild_id, name):
+        return self.tables.get(guild_id, {}).get(name.lower())
+
+    def describe(self, command):
+        data = command.data
+        role_req = "Everyone" if command.required_role == 0 else f"Role ID: {command.required_role}"
+        details = f"Required Role: {role_req}"
+        if command.template.needs_target:
+            details += " (requires mention)"
+        if command.aliases:
+            details += f"\nAliases: {', '.join('!' + alias for alias in command.aliases)}"
+        if command.cooldown:
+            details += f"\nCooldown: {command.cooldown}s"
+        details += f"\nUsed: {data.get('uses', 0)} times"
+        return details
+
+    async def run_custom_command(self, ctx):
+        """Pipeline stage for "no u" and custom commands, stops the message if it was one"""
+        message = ctx.message
+        content = ctx.lower
         if content.startswith('no') and content.endswith('u'):
-            parts = content.split()
+            parts = ctx.words
             if len(parts) > 1 and all(part == 'no' for part in parts[:-1]) and parts[-1] == 'u':
                 response = 'no ' * (len(parts)) + 'u'
                 await message.channel.send(response)
-                return
-
-        if not message.content.startswith('!'):
-            return
+                return True
 
-        guild_id = str(message.guild.id)
-        if guild_id not in self.commands:
-            return
+        # Uses the bot's own parse of the message; built-in commands win
+        invocation = ctx.invocation
+        if invocation is None or invocation.command is not None or not invocation.invoked_with or not ctx.guild:
+            return False
+        command = self.find(str(ctx.guild.id), invocation.invoked_with)
+        if command is None:
+            return False
 
-        command = message.content[1:].split()[0]
-        if command not in self.commands[guild_id]:
-            return
-
-        cmd_data = self.commands[guild_id][command]
-        required_role = cmd_data["required_role"]
-
-        if required_role != 0 and not any(role.id == required_role for role in message.author.roles):
+        if command.required_role != 0 and message.author.get_role(command.required_role) is None:
             await message.channel.send("You don't have permission to use this command!")
-            return
+            return True
 
-        response = cmd_data["response"]
-        
-        if cmd_data.get("requires_mention", False):
-            target_user = None
+        retry_after = command.use_cooldown(message.author.id)
+        if retry_after:
+            await message.channel.send(
+                f"Please wait {retry_after:.1f} seconds before using this command again.",
+                delete_after=5
+            )
+            return True
+
+        template = command.template
+        target_user = None
+        if template.needs_target:
             if message.reference and message.reference.resolved:
                 target_user = message.reference.resolved.author
             elif message.mentions:
@@ -77,16 +118,29 @@ class CustomCommands(commands.Cog):
             
             if not target_user:
                 await message.channel.send("Command requires user mention!")
-                return
-                
-            response = response.replace("{mention}", target_user.mention)
+                return True
 
-        await message.channel.send(response)
+        args = invocation.view.read_rest().strip()
+        values = {
+            "user": message.author.mention,
+            "user.name": message.author.display_name,
+            "mention": target_user.mention if target_user else "",
+            "target.name": target_user.display_name if target_user else "",
+            "channel": message.channel.mention,
+            "server": ctx.guild.name,
+            "count": str(command.used()),
+            "args": args
+        }
+        if template.needs_count:
+            self.save_commands()
+
+        await message.channel.send(template.render(values, args.split()))
+        return True
 
     @commands.group(name='cc', invoke_without_command=True)
     async def custom_commands(self, ctx):
         if ctx.invoked_subcommand is None:
-            await ctx.send("Available subcommands: add, remove, list")
+            await ctx.send("Available subcommands: add, remove, list, alias, unalias, cooldown, placeholders")
 
     @custom_commands.command(name='add')
     @commands.has_permissions(manage_messages=True)
@@ -96,11 +150,11 @@ class CustomCommands(commands.Cog):
         if guild_id not in self.commands:
             self.commands[guild_id] = {}
         
-        if command in self.commands[guild_id]:
+        if self.find(guild_id, command) or self.bot.get_command(command):
             await ctx.send(f"Command `{command}` already exists!")
             return
 
-        requires_mention = "{mention}" in response
+        requires_mention = Template(response).needs_target
 
         self.commands[guild_id][command] = {
             "response": response,
@@ -108,6 +162,7 @@ class CustomCommands(commands.Cog):
             "requires_mention": requires_mention
         }
         
+        self.compile(guild_id)
         self.save_commands()
         mention_info = " (requires user mention)" if requires_mention else ""
         await ctx.send(f"Added command `{command}` with role requirement {required_role}{mention_info}")
@@ -130,11 +185,14 @@ class CustomCommands(commands.Cog):
     @commands.has_permissions(manage_messages=True)
     async def remove_command(self, ctx, command: str):
         guild_id = str(ctx.guild.id)
+        found = self.find(guild_id, command)
         
-        if guild_id in self.commands and command in self.commands[guild_id]:
+        if found and found.name.lower() == command.lower():
+            command = found.name
             cmd_data = self.commands[guild_id][command]
             
             del self.commands[guild_id][command]
+            self.compile(guild_id)
             self.save_commands()
             await ctx.send(f"Removed command `{command}`")
 
@@ -149,9 +207,72 @@ class CustomCommands(commands.Cog):
             embed.add_field(name="Removed By", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
             
             await self.log_to_modchannel(ctx.guild, embed)
+        elif found:
+            await ctx.send(f"`{command}` is an alias of `{found.name}`, use `!cc unalias {command}`.")
         else:
             await ctx.send(f"Command `{command}` not found!")
 
+    @custom_commands.command(name='alias')
+    @commands.has_permissions(manage_messages=True)
+    async def add_alias(self, ctx, command: str, *aliases: str):
+        """Give a custom command more names, e.g. `!cc alias hug cuddle snuggle`"""
+        guild_id = str(ctx.guild.id)
+        found = self.find(guild_id, command)
+        if found is None:
+            await ctx.send(f"Command `{command}` not found!")
+            return
+        if not aliases:
+            await ctx.send("Give at least one alias.")
+            return
+        taken = [alias for alias in aliases if self.find(guild_id, alias) or self.bot.get_command(alias)]
+        if taken:
+            await ctx.send(f"Already in use: {', '.join(taken)}")
+            return
+        
+        # Replaced rather than appended to, the saved snapshot may share the old list
+        found.data["aliases"] = list(found.aliases) + list(dict.fromkeys(aliases))
+        self.compile(guild_id)
+        self.save_commands()
+        await ctx.send(f"`{found.name}` can now also be used as {', '.join('`' + alias + '`' for alias in aliases)}")
+
+    @custom_commands.command(name='unalias')
+    @commands.has_permissions(manage_messages=True)
+    async def remove_alias(self, ctx, alias: str):
+        guild_id = str(ctx.guild.id)
+        found = self.find(guild_id, alias)
+        if found is None or found.name.lower() == alias.lower():
+            await ctx.send(f"`{alias}` isn't an alias.")
+            return
+        
+        found.data["aliases"] = [a for a in found.aliases if a.lower() != alias.lower()]
+        self.compile(guild_id)
+        self.save_commands()
+        await ctx.send(f"Removed alias `{alias}` of `{found.name}`")
+
+    @custom_commands.command(name='cooldown')
+    @commands.has_permissions(manage_messages=True)
+    async def set_cooldown(self, ctx, command: str, seconds: int):
+        """Limit how often each member can use a custom command, 0 turns it off"""
+        guild_id = str(ctx.guild.id)
+        found = self.find(guild_id, command)
+        if found is None:
+            await ctx.send(f"Command `{command}` not found!")
+            return
+        if seconds < 0:
+            await ctx.send("The cooldown can't be negative.")
+            return
+        
+        found.data["cooldown"] = seconds
+        self.compile(guild_id)
+        self.save_commands()
+        await ctx.send(f"`{found.name}` now has a {seconds}s cooldown." if seconds else f"`{found.name}` has no cooldown anymore.")
+
+    @custom_commands.command(name='placeholders')
+    async def list_placeholders(self, ctx):
+        lines = [f"`{{{name}}}` - {description}" for name, description in PLACEHOLDERS.items()]
+        lines.append("`{1}`, `{2}`, ... - the words after the command")
+        await ctx.send("\n".join(lines))
+
     @custom_commands.command(name='list')
     async def list_commands(self, ctx):
         guild_id = str(ctx.guild.id)
@@ -167,11 +288,9 @@ class CustomCommands(commands.Cog):
         )
 
         for cmd, data in self.commands[guild_id].items():
-            role_req = "Everyone" if data["required_role"] == 0 else f"Role ID: {data['required_role']}"
-            mention_req = " (requires mention)" if data.get("requires_mention", False) else ""
             embed.add_field(
                 name=f"!{cmd}",
-                value=f"Required Role: {role_req}{mention_req}\nResponse: {data['response']}",
+                value=f"{self.describe(self.find(guild_id, cmd))}\nResponse: {data['response']}",
                 inline=False
             )
 
@@ -0,0 +1,114 @@
+from discord.ext import commands
+import discord
+from datetime import datetime
+
+class Diagnostics(commands.Cog):
+    """Admin-only views of the bot's own services: storage, mod-log, pipeline, HTTP
+
+    These report on bot-wide machinery rather than on a guild's members,
+    so they live apart from the moderation statistics in the Stats cog.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = bot.db
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def dbstats(self, ctx):
+        """Show user cache and write-behind statistics"""
+        cache = self.db.users.stats()
+        
+        embed = discord.Embed(
+            title="Database Statistics",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(
+            name="User Cache",
+            value=f"Entries: {cache['size']}/{cache['capacity']} ({cache['dirty']} unsaved)\n"
+                  f"Hits: {cache['hits']}, Misses: {cache['misses']} "
+                  f"({cache['hit_rate']:.1%} hit rate)\n"
+                  f"Evictions: {cache['evictions']}, Write-backs: {cache['write_backs']}",
+            inline=False
+        )
+        embed.add_field(name="Pending Writes", value=str(self.db.pending_changes), inline=False)
+        
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def modlogstats(self, ctx):
+        """Show mod-log delivery statistics"""
+        outbox = self.bot.modlog.stats()
+        
+        embed = discord.Embed(
+            title="Mod-log Outbox",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(
+            name="Queue",
+            value=f"Waiting: {outbox['queued']} (peak {outbox['max_depth']})\n"
+                  f"Dropped: {outbox['dropped']}, Failed: {outbox['failed']}, "
+                  f"No mod-log channel: {outbox['unrouted']}",
+            inline=False
+        )
+        embed.add_field(
+            name="Delivery",
+            value=f"Sent: {outbox['sent']}/{outbox['enqueued']} embeds in {outbox['messages']} messages "
+                  f"({outbox['embeds_per_message']:.1f} per message)\n"
+                  f"Average delay: {outbox['avg_delay']:.2f}s",
+            inline=False
+        )
+        
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def pipelinestats(self, ctx):
+        """Show how long each message-handling stage takes"""
+        pipeline = self.bot.pipeline
+        
+        embed = discord.Embed(
+            title="Message Pipeline",
+            description=f"{pipeline.messages} messages, {pipeline.average():.1f}µs each on average",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        for stage in pipeline.report():
+            value = (f"Calls: {stage['calls']}, stopped: {stage['stops']}\n"
+                     f"Average: {stage['avg_us']:.1f}µs, max: {stage['max_us']:.0f}µs")
+            if stage['errors']:
+                value += f"\nErrors: {stage['errors']}"
+            embed.add_field(name=stage['stage'], value=value, inline=False)
+        
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def httpstats(self, ctx):
+        """Show how the external APIs the bot uses are doing"""
+        report = self.bot.http_client.report()
+        if not report:
+            await ctx.send("No external requests made yet.")
+            return
+        
+        embed = discord.Embed(
+            title="External APIs",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        for host in report:
+            p50, p95 = (f"<{ms:.0f}ms" if ms is not None else ">10s" for ms in (host['p50_ms'], host['p95_ms']))
+            value = (f"Requests: {host['requests']}, retries: {host['retries']}\n"
+                     f"Latency p50: {p50}, p95: {p95}\n"
+                     f"Circuit: {host['circuit']}")
+            if host['errors']:
+                value += "\nErrors: " + ", ".join(f"{kind} x{count}" for kind, count in host['errors'].items())
+            embed.add_field(name=host['host'], value=value, inline=False)
+        
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(Diagnostics(bot))
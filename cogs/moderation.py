@@ -1,92 +1,248 @@
 from discord.ext import commands
 import discord
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
+import json
+import os
 import logging
-from utils.time_parser import parse_time, format_duration
+from utils.time_parser import parse_time, format_duration, timestamp_now, TimeParseError
+from utils.catchup import catch_up_sanctions
+from utils.permissions import OverwriteJob
+from utils.atomic_io import SnapshotWriter
+from utils.bulk import parse_bulk_args, filter_targets, run_bulk, bulk_summary
+from utils.ban_cache import BanCache
+
+# What @everyone loses during a lockdown
+LOCKDOWN_PERMISSIONS = {
+    "send_messages": False,
+    "send_messages_in_threads": False,
+    "create_public_threads": False,
+    "create_private_threads": False,
+    "add_reactions": False
+}
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = bot.db
-        self.temp_bans = {}
-        self.load_active_bans()
+        self.ban_cache = BanCache()
+        self.lockdowns_file = 'data/lockdowns.json'
+        # guild_id -> {channel_id: overwrite values from before the lockdown}
+        self.lockdowns = {}
+        self.lockdown_writer = SnapshotWriter(
+            self.lockdowns_file,
+            lambda: {guild_id: dict(channels) for guild_id, channels in self.lockdowns.items()}
+        )
+
+    def load_lockdowns(self):
+        if not os.path.exists(self.lockdowns_file):
+            return {}
+        try:
+            with open(self.lockdowns_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Failed to load lockdowns: {e}")
+            return {}
 
     def load_active_bans(self):
-        """Load active temporary bans from the database"""
+        """Schedule active temporary bans from the database's sanctions index
+
+        Returns the (guild_id, user_id) of bans that expired while offline.
+        """
+        overdue = []
+        now = timestamp_now()
         try:
-            for user_id, user_data in self.db.data.items():
-                for ban in user_data.get('bans', []):
-                    if ban.get('expires_at'):
-                        expires_at = datetime.fromisoformat(ban['expires_at'])
-                        if expires_at > datetime.utcnow():
-                            self.temp_bans[user_id] = {
-                                'guild_id': ban['guild_id'],
-                                'expires_at': expires_at
-                            }
+            for (guild_id, user_id, category), expires_at in self.db.active_sanctions().items():
+                if category != 'bans':
+                    continue
+                if expires_at <= now:
+                    overdue.append((int(guild_id), int(user_id)))
+                else:
+                    self.schedule_unban(int(guild_id), int(user_id), expires_at)
         except Exception as e:
             logging.error(f"Error loading active bans: {e}")
+        return overdue
 
     async def log_to_modchannel(self, guild, embed):
-        """Send log message to mod-logs channel"""
-        mod_channel = discord.utils.get(guild.channels, name='mod-logs')
-        if mod_channel:
-            await mod_channel.send(embed=embed)
+        """Queue log message for the mod-logs channel"""
+        self.bot.modlog.enqueue(guild, embed)
 
-    async def check_temp_bans(self):
-        """Check and unban users whose temporary ban has expired"""
+    def schedule_unban(self, guild_id, user_id, expires_at):
+        self.bot.scheduler.schedule(('bans', guild_id, user_id), expires_at, self.expire_ban, guild_id, user_id)
+
+    async def expire_ban(self, guild_id, user_id):
+        """Unban a user whose temporary ban has expired"""
         await self.bot.wait_until_ready()
         
-        while not self.bot.is_closed():
+        try:
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                return
             try:
-                current_time = datetime.utcnow()
-                to_remove = []
-                
-                for user_id, ban_data in self.temp_bans.items():
-                    if current_time >= ban_data['expires_at']:
-                        guild = self.bot.get_guild(ban_data['guild_id'])
-                        if guild:
-                            try:
-                                ban_entry = await guild.fetch_ban(discord.Object(id=int(user_id)))
-                                if ban_entry:
-                                    await guild.unban(ban_entry.user, reason="Temp ban expired")
-                                    
-                                    embed = discord.Embed(
-                                        title="Member Unbanned (Auto)",
-                                        color=discord.Color.green(),
-                                        timestamp=current_time
-                                    )
-                                    embed.add_field(name="Member", value=f"{ban_entry.user} ({ban_entry.user.name})", inline=False)
-                                    embed.add_field(name="Reason", value="Temporary ban expired", inline=False)
-                                    embed.set_footer(text=f"User ID: {ban_entry.user.id}")
-                                    
-                                    await self.log_to_modchannel(guild, embed)
-                                    
-                                    self.db.log_action(
-                                        int(user_id),
-                                        "unban",
-                                        {
-                                            "reason": "Temporary ban expired",
-                                            "moderator": self.bot.user.id,
-                                            "moderator_name": str(self.bot.user),
-                                            "timestamp": str(current_time)
-                                        }
-                                    )
-                                    
-                                    to_remove.append(user_id)
-                            except discord.NotFound:
-                                to_remove.append(user_id)
-                
-                for user_id in to_remove:
-                    del self.temp_bans[user_id]
-                
-            except Exception as e:
-                logging.error(f"Error in check_temp_bans: {e}")
+                ban_entry = await guild.fetch_ban(discord.Object(id=user_id))
+            except discord.NotFound:
+                # Already unbanned by hand
+                self.db.lift_sanction(guild_id, user_id, 'bans')
+                return
+            
+            await guild.unban(ban_entry.user, reason="Temp ban expired")
+            
+            embed = discord.Embed(
+                title="Member Unbanned (Auto)",
+                color=discord.Color.green(),
+                timestamp=datetime.utcnow()
+            )
+            embed.add_field(name="Member", value=f"{ban_entry.user} ({ban_entry.user.name})", inline=False)
+            embed.add_field(name="Reason", value="Temporary ban expired", inline=False)
+            embed.set_footer(text=f"User ID: {ban_entry.user.id}")
             
-            await asyncio.sleep(60)
+            await self.log_to_modchannel(guild, embed)
+            
+            self.db.log_action(
+                guild.id,
+                user_id,
+                "unban",
+                {
+                    "reason": "Temporary ban expired",
+                    "moderator": self.bot.user.id,
+                    "moderator_name": str(self.bot.user)
+                }
+            )
+        except Exception as e:
+            logging.error(f"Error expiring ban: {e}")
+
+    async def remove_ban(self, guild, user_id):
+        """Unban an expired user without looking the ban up first, False if they weren't banned"""
+        try:
+            await guild.unban(discord.Object(id=user_id), reason="Temp ban expired")
+        except discord.NotFound:
+            return False
+        return True
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild, user):
+        self.ban_cache.add(guild.id, user)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild, user):
+        self.ban_cache.remove(guild.id, user)
 
     async def cog_load(self):
-        self.temp_ban_task = self.bot.loop.create_task(self.check_temp_bans())
+        self.lockdowns = await asyncio.to_thread(self.load_lockdowns)
+        overdue = self.load_active_bans()
+        if overdue:
+            self.catch_up_task = asyncio.create_task(catch_up_sanctions(
+                self.bot, overdue, self.remove_ban, 'bans', 'unban', "Expired Bans Lifted", self.log_to_modchannel
+            ))
+
+    async def cog_unload(self):
+        self.bot.scheduler.cancel_group('bans')
+        await self.lockdown_writer.close()
+
+    async def run_with_progress(self, ctx, job, title):
+        """Run an OverwriteJob, keeping a status message up to date"""
+        status = await ctx.send(f"{title}: starting on {job.total} channels...")
+        
+        async def progress(job):
+            await status.edit(content=f"{title}: {job.summary()}")
+        
+        await job.run(progress)
+        return job
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def setmodlog(self, ctx, channel: discord.TextChannel):
+        """Use another channel for mod-logs"""
+        self.bot.settings.set_mod_log_channel(ctx.guild, channel)
+        await ctx.send(f"Mod-logs will go to {channel.mention}.")
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def setmutedrole(self, ctx, role: discord.Role):
+        """Use another role for muting"""
+        self.bot.settings.set_muted_role(ctx.guild, role)
+        await ctx.send(f"Muted members will get {role.name}.")
+
+    def lockdown_job(self, guild, reason):
+        channels = [c for c in guild.channels if not isinstance(c, discord.CategoryChannel)]
+        return OverwriteJob(guild, guild.default_role, channels, LOCKDOWN_PERMISSIONS, reason=reason)
+
+    def save_lockdown(self, guild, job):
+        """Remember what !unlock restores, a repeated lockdown keeps the values from the first one"""
+        if job.previous:
+            saved = self.lockdowns.setdefault(str(guild.id), {})
+            for channel_id, previous in job.previous.items():
+                saved.setdefault(str(channel_id), previous)
+            self.lockdown_writer.request_save()
+
+    async def lock_guild(self, guild, reason):
+        """Lock a guild down without a command, e.g. when a raid is detected"""
+        job = self.lockdown_job(guild, reason)
+        try:
+            await job.run()
+        finally:
+            self.save_lockdown(guild, job)
+        return job
+
+    @commands.command()
+    @commands.has_permissions(manage_channels=True)
+    async def lockdown(self, ctx, *, reason="No reason provided"):
+        """Stop @everyone from sending messages in every channel"""
+        job = self.lockdown_job(ctx.guild, f"Lockdown by {ctx.author}: {reason}")
+        try:
+            await self.run_with_progress(ctx, job, "Locking down")
+        finally:
+            # Saved even if the run was cut short
+            self.save_lockdown(ctx.guild, job)
+        
+        embed = discord.Embed(
+            title="Server Locked Down",
+            color=discord.Color.red(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+        embed.add_field(name="Reason", value=reason, inline=False)
+        embed.add_field(name="Channels", value=job.summary(), inline=False)
+        await self.log_to_modchannel(ctx.guild, embed)
+
+    @commands.command()
+    @commands.has_permissions(manage_channels=True)
+    async def unlock(self, ctx):
+        """Restore the channel permissions from before !lockdown"""
+        saved = self.lockdowns.get(str(ctx.guild.id))
+        if not saved:
+            await ctx.send("This server isn't locked down.")
+            return
+        
+        channels = [c for c in ctx.guild.channels if str(c.id) in saved]
+        job = OverwriteJob(
+            ctx.guild, ctx.guild.default_role, channels,
+            lambda channel: saved[str(channel.id)],
+            reason=f"Lockdown lifted by {ctx.author}"
+        )
+        try:
+            await self.run_with_progress(ctx, job, "Unlocking")
+        finally:
+            # Keep what couldn't be restored so !unlock can be run again,
+            # channels deleted in the meantime are dropped
+            remaining = {
+                channel_id: previous for channel_id, previous in saved.items()
+                if int(channel_id) in job.pending or int(channel_id) in job.failed
+            }
+            if remaining:
+                self.lockdowns[str(ctx.guild.id)] = remaining
+            else:
+                del self.lockdowns[str(ctx.guild.id)]
+            self.lockdown_writer.request_save()
+        
+        embed = discord.Embed(
+            title="Server Unlocked",
+            color=discord.Color.green(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+        embed.add_field(name="Channels", value=job.summary(), inline=False)
+        await self.log_to_modchannel(ctx.guild, embed)
 
     @commands.command()
     @commands.has_permissions(ban_members=True)
@@ -103,7 +259,7 @@ class Moderation(commands.Cog):
         duration_seconds = parse_time(duration) if duration else None
         expires_at = None
         if duration_seconds:
-            expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
+            expires_at = timestamp_now() + duration_seconds
         
         await member.ban(reason=reason)
         
@@ -124,18 +280,16 @@ class Moderation(commands.Cog):
             "reason": reason,
             "moderator": ctx.author.id,
             "moderator_name": str(ctx.author),
-            "timestamp": str(datetime.utcnow()),
             "guild_id": ctx.guild.id
         }
         
         if expires_at:
-            ban_data["expires_at"] = str(expires_at)
-            self.temp_bans[str(member.id)] = {
-                'guild_id': ctx.guild.id,
-                'expires_at': expires_at
-            }
+            ban_data["expires_at"] = expires_at
+            self.schedule_unban(ctx.guild.id, member.id, expires_at)
+        else:
+            self.bot.scheduler.cancel(('bans', ctx.guild.id, member.id))
         
-        self.db.log_action(member.id, "ban", ban_data)
+        self.db.log_action(ctx.guild.id, member.id, "ban", ban_data)
         
         duration_text = f" for {duration}" if duration else ""
         await ctx.send(f"{member.mention} has been banned{duration_text}. Reason: {reason or 'No reason provided'}")
@@ -143,43 +297,168 @@ class Moderation(commands.Cog):
     @commands.command()
     @commands.has_permissions(ban_members=True)
     async def unban(self, ctx, *, member):
-        """Unban a member"""
-        banned_users = [entry async for entry in ctx.guild.bans()]
-        member_name, member_discriminator = member.split('#')
-        
-        for ban_entry in banned_users:
-            user = ban_entry.user
-            if (user.name, user.discriminator) == (member_name, member_discriminator):
-                await ctx.guild.unban(user)
-                
-                embed = discord.Embed(
-                    title="Member Unbanned",
-                    color=discord.Color.green(),
-                    timestamp=datetime.utcnow()
-                )
-                embed.add_field(name="Member", value=f"{user} ({user.name})", inline=False)
-                embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
-                embed.add_field(name="Reason", value="Manual unban by moderator", inline=False)
-                embed.set_footer(text=f"User ID: {user.id}")
-                
-                await self.log_to_modchannel(ctx.guild, embed)
-                
-                if str(user.id) in self.temp_bans:
-                    del self.temp_bans[str(user.id)]
-                
-                self.db.log_action(
-                    user.id,
-                    "unban",
-                    {
-                        "reason": "Manual unban by moderator",
-                        "moderator": ctx.author.id,
-                        "moderator_name": str(ctx.author),
-                        "timestamp": str(datetime.utcnow())
-                    }
-                )
-                
-                await ctx.send(f"{user.mention} has been unbanned.")
-                return
+        """Unban a user by ID, mention or name"""
+        matches = await self.ban_cache.find(ctx.guild, member)
+        if not matches:
+            await ctx.send(f"No banned user matches {member}.")
+            return
+        if len(matches) > 1:
+            await ctx.send(
+                "Several banned users match, use an ID: " +
+                ", ".join(f"{user} ({user.id})" for user in matches[:10])
+            )
+            return
+        
+        user = matches[0]
+        await ctx.guild.unban(user)
+        self.ban_cache.remove(ctx.guild.id, user)
+        
+        embed = discord.Embed(
+            title="Member Unbanned",
+            color=discord.Color.green(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Member", value=f"{user} ({user.name})", inline=False)
+        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+        embed.add_field(name="Reason", value="Manual unban by moderator", inline=False)
+        embed.set_footer(text=f"User ID: {user.id}")
+        
+        await self.log_to_modchannel(ctx.guild, embed)
+        
+        self.bot.scheduler.cancel(('bans', ctx.guild.id, user.id))
+        
+        self.db.log_action(
+            ctx.guild.id,
+            user.id,
+            "unban",
+            {
+                "reason": "Manual unban by moderator",
+                "moderator": ctx.author.id,
+                "moderator_name": str(ctx.author)
+            }
+        )
+        
+        await ctx.send(f"{user.mention} has been unbanned.")
+
+    @commands.command()
+    @commands.has_permissions(ban_members=True)
+    async def massunban(self, ctx, *args):
+        """Unban many users at once by ID or mention, e.g. `!massunban 1234 5678 appeal accepted`"""
+        try:
+            user_ids, _, reason = parse_bulk_args(ctx.guild, args)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        await self.ban_cache.load(ctx.guild)
+        banned = self.ban_cache.bans[ctx.guild.id]
+        targets = [user_id for user_id in user_ids if user_id in banned]
+        skipped = [user_id for user_id in user_ids if user_id not in banned]
+        if not targets:
+            await ctx.send("None of those users are banned.")
+            return
+        
+        unbanned, failed = await run_bulk(
+            targets, lambda user_id: ctx.guild.unban(discord.Object(id=user_id), reason=reason)
+        )
+        for user_id in unbanned:
+            self.ban_cache.remove(ctx.guild.id, banned[user_id])
+            self.bot.scheduler.cancel(('bans', ctx.guild.id, user_id))
+        
+        self.db.log_actions(
+            ctx.guild.id,
+            unbanned,
+            "unban",
+            {
+                "reason": reason or "Manual unban by moderator",
+                "moderator": ctx.author.id,
+                "moderator_name": str(ctx.author)
+            }
+        )
+        
+        await self.log_to_modchannel(ctx.guild, bulk_summary(
+            ctx, "Mass Unban", discord.Color.green(), unbanned, failed, skipped, reason
+        ))
+        await ctx.send(f"Unbanned {len(unbanned)} users ({len(failed)} failed, {len(skipped)} not banned).")
+
+    @commands.command()
+    @commands.has_permissions(ban_members=True)
+    async def massban(self, ctx, *args):
+        """Ban many users at once, e.g. `!massban @a @b 1234 joined:10m for:1d raid`"""
+        try:
+            user_ids, duration_seconds, reason = parse_bulk_args(ctx.guild, args)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        targets, skipped = filter_targets(ctx, user_ids)
+        if not targets:
+            await ctx.send("No one to ban.")
+            return
+        
+        # Up to 200 users per request
+        banned, failed = [], []
+        for i in range(0, len(targets), 200):
+            chunk = targets[i:i + 200]
+            try:
+                result = await ctx.guild.bulk_ban(chunk, reason=reason)
+                banned += [user.id for user in result.banned]
+                failed += [user.id for user in result.failed]
+            except discord.HTTPException:
+                failed += [target.id for target in chunk]
+        
+        ban_data = {
+            "reason": reason,
+            "moderator": ctx.author.id,
+            "moderator_name": str(ctx.author),
+            "guild_id": ctx.guild.id
+        }
+        if duration_seconds:
+            ban_data["expires_at"] = timestamp_now() + duration_seconds
+        for user_id in banned:
+            if duration_seconds:
+                self.schedule_unban(ctx.guild.id, user_id, ban_data["expires_at"])
+            else:
+                self.bot.scheduler.cancel(('bans', ctx.guild.id, user_id))
+        self.db.log_actions(ctx.guild.id, banned, "ban", ban_data)
+        
+        await self.log_to_modchannel(ctx.guild, bulk_summary(
+            ctx, "Mass Ban", discord.Color.red(), banned, failed, skipped, reason, duration_seconds
+        ))
+        await ctx.send(f"Banned {len(banned)} users ({len(failed)} failed, {len(skipped)} skipped).")
+
+    @commands.command()
+    @commands.has_permissions(kick_members=True)
+    async def masskick(self, ctx, *args):
+        """Kick many members at once, e.g. `!masskick @a @b joined:10m raid`"""
+        try:
+            user_ids, _, reason = parse_bulk_args(ctx.guild, args)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        targets, skipped = filter_targets(ctx, user_ids, members_only=True)
+        if not targets:
+            await ctx.send("No one to kick.")
+            return
+        
+        kicked, failed = await run_bulk(targets, lambda member: member.kick(reason=reason))
+        kicked = [member.id for member in kicked]
+        failed = [member.id for member in failed]
+        
+        self.db.log_actions(
+            ctx.guild.id,
+            kicked,
+            "kick",
+            {
+                "reason": reason,
+                "moderator": ctx.author.id,
+                "moderator_name": str(ctx.author),
+                "guild_id": ctx.guild.id
+            }
+        )
+        
+        await self.log_to_modchannel(ctx.guild, bulk_summary(
+            ctx, "Mass Kick", discord.Color.orange(), kicked, failed, skipped, reason
+        ))
+        await ctx.send(f"Kicked {len(kicked)} members ({len(failed)} failed, {len(skipped)} skipped).")
 
     @commands.command()
     @commands.has_permissions(kick_members=True)
@@ -204,13 +483,13 @@ class Moderation(commands.Cog):
         await self.log_to_modchannel(ctx.guild, embed)
         
         self.db.log_action(
+            ctx.guild.id,
             member.id,
             "kick",
             {
                 "reason": reason,
                 "moderator": ctx.author.id,
                 "moderator_name": str(ctx.author),
-                "timestamp": str(datetime.utcnow()),
                 "guild_id": ctx.guild.id
             }
         )
@@ -254,13 +533,13 @@ class Moderation(commands.Cog):
             await self.log_to_modchannel(ctx.guild, log_embed)
             
             self.db.log_action(
+                ctx.guild.id,
                 member.id,
                 "dm",
                 {
                     "message": message,
                     "moderator": ctx.author.id,
                     "moderator_name": str(ctx.author),
-                    "timestamp": str(datetime.utcnow()),
                     "guild_id": ctx.guild.id
                 }
             )
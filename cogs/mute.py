@@ -1,35 +1,51 @@
 from discord.ext import commands
 import discord
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
 import logging
-from utils.time_parser import parse_time, format_duration
+from utils.time_parser import parse_time, format_duration, timestamp_now, TimeParseError
+from utils.catchup import catch_up_sanctions
+from utils.permissions import OverwriteJob
+from utils.bulk import parse_bulk_args, filter_targets, run_bulk, bulk_summary
+
+MUTED_PERMISSIONS = {
+    "speak": False,
+    "send_messages": False,
+    "add_reactions": False,
+    "stream": False
+}
 
 class Mute(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = bot.db
-        self.temp_mutes = {}
-        self.load_active_mutes()
+        self.muted_role_setup = {}
 
     def load_active_mutes(self):
-        """Load active temporary mutes from the database"""
+        """Schedule active temporary mutes from the database's sanctions index
+
+        Returns the (guild_id, user_id) of mutes that expired while offline.
+        """
+        overdue = []
+        now = timestamp_now()
         try:
-            for user_id, user_data in self.db.data.items():
-                for mute in user_data.get('mutes', []):
-                    if mute.get('expires_at'):
-                        expires_at = datetime.fromisoformat(mute['expires_at'])
-                        if expires_at > datetime.utcnow():
-                            self.temp_mutes[user_id] = {
-                                'guild_id': mute['guild_id'],
-                                'expires_at': expires_at
-                            }
+            for (guild_id, user_id, category), expires_at in self.db.active_sanctions().items():
+                if category != 'mutes':
+                    continue
+                if expires_at <= now:
+                    overdue.append((int(guild_id), int(user_id)))
+                else:
+                    self.schedule_unmute(int(guild_id), int(user_id), expires_at)
         except Exception as e:
             logging.error(f"Error loading active mutes: {e}")
+        return overdue
 
     async def ensure_muted_role(self, guild):
-        """Ensure the Muted role exists and has proper permissions"""
-        muted_role = discord.utils.get(guild.roles, name="Muted")
+        """Ensure the Muted role exists and start checking its channel overwrites
+
+        wait_for_muted_role() waits for that to finish.
+        """
+        muted_role = self.bot.settings.muted_role(guild)
         if not muted_role:
             try:
                 muted_role = await guild.create_role(
@@ -37,82 +53,167 @@ class Mute(commands.Cog):
                     reason="Created for muting members",
                     color=discord.Color.dark_gray()
                 )
-
-                for channel in guild.channels:
-                    try:
-                        await channel.set_permissions(muted_role, 
-                            speak=False, 
-                            send_messages=False,
-                            add_reactions=False,
-                            stream=False
-                        )
-                    except discord.errors.Forbidden:
-                        continue
-
+                self.bot.settings.set_muted_role(guild, muted_role)
             except discord.errors.Forbidden:
                 return None
 
+        # Every mute checks the channels again, which costs no API calls for
+        # channels that are already set and finishes an interrupted setup
+        key = (guild.id, muted_role.id)
+        if key not in self.muted_role_setup:
+            job = OverwriteJob(guild, muted_role, guild.channels, MUTED_PERMISSIONS, reason="Muted role setup")
+            self.muted_role_setup[key] = (job, asyncio.create_task(self.setup_muted_role(key, job)))
+
         return muted_role
 
+    async def setup_muted_role(self, key, job):
+        """Apply the Muted role's overwrites to every channel that doesn't have them yet"""
+        try:
+            await job.run()
+            if job.updated or job.failed:
+                logging.info(f"Muted role setup in {job.guild.name}: {job.summary()}")
+        except Exception as e:
+            logging.error(f"Error setting up Muted role: {e}")
+        finally:
+            self.muted_role_setup.pop(key, None)
+
+    async def wait_for_muted_role(self, guild, muted_role, channel=None):
+        """Wait until the Muted role's overwrites are in place, so a mute takes effect
+
+        If that takes a while, progress is reported in `channel`.
+        """
+        setup = self.muted_role_setup.get((guild.id, muted_role.id))
+        if setup is None:
+            return
+        job, task = setup
+        done, _ = await asyncio.wait({task}, timeout=3)
+        if done:
+            return
+        message = None
+        if channel is not None:
+            message = await channel.send(f"Setting up the Muted role: {job.done}/{job.total} channels...")
+        await asyncio.shield(task)
+        if message is not None:
+            await message.edit(content=f"Muted role set up: {job.summary()}")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        muted_role = self.bot.settings.muted_role(channel.guild)
+        if muted_role:
+            job = OverwriteJob(channel.guild, muted_role, [channel], MUTED_PERMISSIONS, reason="Muted role setup")
+            await job.run()
+
     async def log_to_modchannel(self, guild, embed):
-        """Send log message to mod-logs channel"""
-        mod_channel = discord.utils.get(guild.channels, name='mod-logs')
-        if mod_channel:
-            await mod_channel.send(embed=embed)
+        """Queue log message for the mod-logs channel"""
+        self.bot.modlog.enqueue(guild, embed)
+
+    def schedule_unmute(self, guild_id, user_id, expires_at):
+        self.bot.scheduler.schedule(('mutes', guild_id, user_id), expires_at, self.expire_mute, guild_id, user_id)
 
-    async def check_temp_mutes(self):
-        """Check and unmute users whose temporary mute has expired"""
+    async def expire_mute(self, guild_id, user_id):
+        """Unmute a member whose temporary mute has expired"""
         await self.bot.wait_until_ready()
         
-        while not self.bot.is_closed():
-            try:
-                current_time = datetime.utcnow()
-                to_remove = []
-                
-                for user_id, mute_data in self.temp_mutes.items():
-                    if current_time >= mute_data['expires_at']:
-                        guild = self.bot.get_guild(mute_data['guild_id'])
-                        if guild:
-                            member = guild.get_member(int(user_id))
-                            if member:
-                                muted_role = discord.utils.get(guild.roles, name="Muted")
-                                if muted_role and muted_role in member.roles:
-                                    await member.remove_roles(muted_role, reason="Temporary mute expired")
-                                    
-                                    embed = discord.Embed(
-                                        title="Member Unmuted (Auto)",
-                                        color=discord.Color.green(),
-                                        timestamp=current_time
-                                    )
-                                    embed.add_field(name="Member", value=f"{member.mention} ({member.name})", inline=False)
-                                    embed.add_field(name="Reason", value="Temporary mute expired", inline=False)
-                                    embed.set_footer(text=f"User ID: {member.id}")
-                                    
-                                    await self.log_to_modchannel(guild, embed)
-                                    
-                                    self.db.log_action(
-                                        int(user_id),
-                                        "unmute",
-                                        {
-                                            "reason": "Temporary mute expired",
-                                            "moderator": self.bot.user.id,
-                                            "moderator_name": str(self.bot.user),
-                                            "timestamp": str(current_time)
-                                        }
-                                    )
-                                    to_remove.append(user_id)
+        try:
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                return
+            if not await self.remove_mute(guild, user_id):
+                # Left the guild or already unmuted by hand
+                self.db.lift_sanction(guild_id, user_id, 'mutes')
+                return
+            
+            member = guild.get_member(user_id)
+            embed = discord.Embed(
+                title="Member Unmuted (Auto)",
+                color=discord.Color.green(),
+                timestamp=datetime.utcnow()
+            )
+            embed.add_field(name="Member", value=f"{member.mention} ({member.name})", inline=False)
+            embed.add_field(name="Reason", value="Temporary mute expired", inline=False)
+            embed.set_footer(text=f"User ID: {member.id}")
             
-                for user_id in to_remove:
-                    del self.temp_mutes[user_id]
-                
-            except Exception as e:
-                logging.error(f"Error in check_temp_mutes: {e}")
+            await self.log_to_modchannel(guild, embed)
             
-            await asyncio.sleep(60)
+            self.db.log_action(
+                guild.id,
+                user_id,
+                "unmute",
+                {
+                    "reason": "Temporary mute expired",
+                    "moderator": self.bot.user.id,
+                    "moderator_name": str(self.bot.user)
+                }
+            )
+        except Exception as e:
+            logging.error(f"Error expiring mute: {e}")
+
+    async def remove_mute(self, guild, user_id):
+        """Take the Muted role off an expired member, False if there was nothing to remove"""
+        member = guild.get_member(user_id)
+        muted_role = self.bot.settings.muted_role(guild)
+        if not (member and muted_role and muted_role in member.roles):
+            return False
+        await member.remove_roles(muted_role, reason="Temporary mute expired")
+        return True
 
     async def cog_load(self):
-        """Start the temporary mute checker when the cog loads"""
-        self.temp_mute_task = self.bot.loop.create_task(self.check_temp_mutes())
+        """Schedule the running temporary mutes when the cog loads"""
+        overdue = self.load_active_mutes()
+        if overdue:
+            self.catch_up_task = asyncio.create_task(catch_up_sanctions(
+                self.bot, overdue, self.remove_mute, 'mutes', 'unmute', "Expired Mutes Lifted", self.log_to_modchannel
+            ))
+
+    async def cog_unload(self):
+        self.bot.scheduler.cancel_group('mutes')
+        for _, task in self.muted_role_setup.values():
+            task.cancel()
+
+    async def apply_mute(self, guild, member, moderator, duration_seconds=None, reason=None, channel=None):
+        """Give a member the Muted role, log it and schedule the unmute
+
+        Used by !mute and by automatic moderation. Returns once the role's
+        channel overwrites are in place, reporting setup progress in
+        `channel` if given. Returns False if there is no Muted role and it
+        couldn't be created; Discord errors adding the role are raised.
+        """
+        muted_role = await self.ensure_muted_role(guild)
+        if not muted_role:
+            return False
+
+        await member.add_roles(muted_role, reason=reason)
+        await self.wait_for_muted_role(guild, muted_role, channel)
+        
+        embed = discord.Embed(
+            title="Member Muted",
+            color=discord.Color.orange(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Member", value=f"{member.mention} ({member.name})", inline=False)
+        embed.add_field(name="Moderator", value=f"{moderator.mention} ({moderator.name})", inline=False)
+        embed.add_field(name="Duration", value=format_duration(duration_seconds) if duration_seconds else "Permanent", inline=False)
+        embed.add_field(name="Reason", value=reason or "No reason provided", inline=False)
+        embed.set_footer(text=f"User ID: {member.id}")
+        
+        await self.log_to_modchannel(guild, embed)
+        
+        mute_data = {
+            "reason": reason,
+            "moderator": moderator.id,
+            "moderator_name": str(moderator),
+            "guild_id": guild.id
+        }
+        
+        if duration_seconds:
+            mute_data["expires_at"] = timestamp_now() + duration_seconds
+            self.schedule_unmute(guild.id, member.id, mute_data["expires_at"])
+        else:
+            # A permanent mute replaces a running temporary one
+            self.bot.scheduler.cancel(('mutes', guild.id, member.id))
+        
+        self.db.log_action(guild.id, member.id, "mute", mute_data)
+        return True
 
     @commands.command()
     @commands.has_permissions(manage_roles=True)
@@ -127,53 +228,73 @@ class Mute(commands.Cog):
             duration = None
         
         duration_seconds = parse_time(duration) if duration else None
-        expires_at = None
-        if duration_seconds:
-            expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
-        
-        muted_role = await self.ensure_muted_role(ctx.guild)
-        if not muted_role:
-            await ctx.send("Failed to create or find Muted role. Please check my permissions.")
-            return
-
         try:
-            await member.add_roles(muted_role, reason=reason)
+            if not await self.apply_mute(ctx.guild, member, ctx.author, duration_seconds, reason, ctx.channel):
+                await ctx.send("Failed to create or find Muted role. Please check my permissions.")
+                return
         except discord.errors.Forbidden:
             await ctx.send("I don't have permission to add roles to this member.")
             return
         
-        embed = discord.Embed(
-            title="Member Muted",
-            color=discord.Color.orange(),
-            timestamp=datetime.utcnow()
-        )
-        embed.add_field(name="Member", value=f"{member.mention} ({member.name})", inline=False)
-        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
-        embed.add_field(name="Duration", value=format_duration(duration_seconds) if duration_seconds else "Permanent", inline=False)
-        embed.add_field(name="Reason", value=reason or "No reason provided", inline=False)
-        embed.set_footer(text=f"User ID: {member.id}")
+        duration_text = f" for {duration}" if duration else ""
+        await ctx.send(f"{member.mention} has been muted{duration_text}. Reason: {reason or 'No reason provided'}")
+
+    async def mute_members(self, guild, members, moderator, duration_seconds=None, reason=None, channel=None):
+        """Mute many members at once, logged as one batch without a mod-log entry each
+
+        Like apply_mute(), returns once the Muted role's overwrites are in place.
+        Returns the (muted, failed) member IDs, or None if there is no Muted
+        role and it couldn't be created.
+        """
+        muted_role = await self.ensure_muted_role(guild)
+        if not muted_role:
+            return None
         
-        await self.log_to_modchannel(ctx.guild, embed)
+        muted, failed = await run_bulk(members, lambda member: member.add_roles(muted_role, reason=reason))
+        await self.wait_for_muted_role(guild, muted_role, channel)
+        muted = [member.id for member in muted]
+        failed = [member.id for member in failed]
         
         mute_data = {
             "reason": reason,
-            "moderator": ctx.author.id,
-            "moderator_name": str(ctx.author),
-            "timestamp": str(datetime.utcnow()),
-            "guild_id": ctx.guild.id
+            "moderator": moderator.id,
+            "moderator_name": str(moderator),
+            "guild_id": guild.id
         }
+        if duration_seconds:
+            mute_data["expires_at"] = timestamp_now() + duration_seconds
+        for user_id in muted:
+            if duration_seconds:
+                self.schedule_unmute(guild.id, user_id, mute_data["expires_at"])
+            else:
+                self.bot.scheduler.cancel(('mutes', guild.id, user_id))
+        self.db.log_actions(guild.id, muted, "mute", mute_data)
+        return muted, failed
+
+    @commands.command()
+    @commands.has_permissions(manage_roles=True)
+    async def massmute(self, ctx, *args):
+        """Mute many members at once, e.g. `!massmute @a @b joined:10m for:1h raid`"""
+        try:
+            user_ids, duration_seconds, reason = parse_bulk_args(ctx.guild, args)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        targets, skipped = filter_targets(ctx, user_ids, members_only=True)
+        if not targets:
+            await ctx.send("No one to mute.")
+            return
         
-        if expires_at:
-            mute_data["expires_at"] = str(expires_at)
-            self.temp_mutes[str(member.id)] = {
-                'guild_id': ctx.guild.id,
-                'expires_at': expires_at
-            }
-        
-        self.db.log_action(member.id, "mute", mute_data)
+        result = await self.mute_members(ctx.guild, targets, ctx.author, duration_seconds, reason, ctx.channel)
+        if result is None:
+            await ctx.send("Failed to create or find Muted role. Please check my permissions.")
+            return
+        muted, failed = result
         
-        duration_text = f" for {duration}" if duration else ""
-        await ctx.send(f"{member.mention} has been muted{duration_text}. Reason: {reason or 'No reason provided'}")
+        await self.log_to_modchannel(ctx.guild, bulk_summary(
+            ctx, "Mass Mute", discord.Color.orange(), muted, failed, skipped, reason, duration_seconds
+        ))
+        await ctx.send(f"Muted {len(muted)} members ({len(failed)} failed, {len(skipped)} skipped).")
 
     @commands.command()
     @commands.has_permissions(manage_roles=True)
@@ -183,7 +304,7 @@ class Mute(commands.Cog):
             await ctx.send("nope.")
             return
             
-        muted_role = discord.utils.get(ctx.guild.roles, name="Muted")
+        muted_role = self.bot.settings.muted_role(ctx.guild)
         
         if not muted_role:
             await ctx.send("This fucker ain't muted.")
@@ -211,17 +332,16 @@ class Mute(commands.Cog):
         
         await self.log_to_modchannel(ctx.guild, embed)
         
-        if str(member.id) in self.temp_mutes:
-            del self.temp_mutes[str(member.id)]
+        self.bot.scheduler.cancel(('mutes', ctx.guild.id, member.id))
         
         self.db.log_action(
+            ctx.guild.id,
             member.id,
             "unmute",
             {
                 "reason": reason,
                 "moderator": ctx.author.id,
                 "moderator_name": str(ctx.author),
-                "timestamp": str(datetime.utcnow()),
                 "guild_id": ctx.guild.id
             }
         )
@@ -0,0 +1,419 @@
+from discord.ext import commands
+import discord
+from datetime import datetime
+import asyncio
+import json
+import os
+import time
+import logging
+from utils.raid import JoinTracker, score_account
+from utils.permissions import OverwriteJob
+from utils.atomic_io import SnapshotWriter
+from utils.bulk import parse_bulk_args, run_bulk, summarize_users
+from utils.time_parser import timestamp_now, format_duration, TimeParseError
+
+RESPONSES = ("lockdown", "verification", "quarantine")
+
+DEFAULT_RAID_SETTINGS = {
+    "enabled": True,
+    # A raid is this many joins, or this much summed account score, within `seconds`
+    "joins": 10,
+    "risk": 25,
+    "seconds": 10,
+    # Accounts scoring at least this get quarantined during a raid
+    "min_score": 3,
+    # Raid mode ends after this many seconds without a join
+    "quiet": 300,
+    "responses": ["quarantine"]
+}
+
+# What the Quarantine role loses in every channel
+QUARANTINE_PERMISSIONS = {
+    "view_channel": False
+}
+
+class RaidGuard(commands.Cog):
+    """Detects join floods and responds to them in bulk
+
+    Every join costs a few O(1) counter updates; the slow work (role edits,
+    lockdown, logging) happens in per-guild background tasks in batches,
+    so a flood of thousands of joins a minute doesn't back up the gateway.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = bot.db
+        self.settings_file = 'data/raid_guard.json'
+        # guild_id -> settings that differ from DEFAULT_RAID_SETTINGS
+        self.guild_settings = {}
+        self.settings_writer = SnapshotWriter(
+            self.settings_file,
+            lambda: {guild_id: dict(settings) for guild_id, settings in self.guild_settings.items()}
+        )
+        self.trackers = {}
+        # guild_id -> state of the raid in progress
+        self.raids = {}
+        # guild_id -> member IDs waiting for the Quarantine role
+        self.pending = {}
+        self.workers = {}
+        self.tasks = set()
+        self.quarantine_setup = {}
+
+    def load_settings(self):
+        if not os.path.exists(self.settings_file):
+            return {}
+        try:
+            with open(self.settings_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Failed to load raid settings: {e}")
+            return {}
+
+    async def cog_load(self):
+        self.guild_settings = await asyncio.to_thread(self.load_settings)
+
+    async def cog_unload(self):
+        self.bot.scheduler.cancel_group('raids')
+        for task in [*self.workers.values(), *self.tasks, *self.quarantine_setup.values()]:
+            task.cancel()
+        await self.settings_writer.close()
+
+    async def log_to_modchannel(self, guild, embed):
+        """Queue log message for the mod-logs channel"""
+        self.bot.modlog.enqueue(guild, embed)
+
+    def settings_for(self, guild_id):
+        return {**DEFAULT_RAID_SETTINGS, **self.guild_settings.get(str(guild_id), {})}
+
+    def tracker_for(self, guild_id, seconds):
+        tracker = self.trackers.get(guild_id)
+        if tracker is None or tracker.seconds != seconds:
+            tracker = self.trackers[guild_id] = JoinTracker(seconds)
+        return tracker
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if member.bot:
+            return
+        settings = self.settings_for(member.guild.id)
+        if not settings["enabled"]:
+            return
+        score = score_account(member)
+
+        raid = self.raids.get(member.guild.id)
+        if raid is not None:
+            raid["joins"] += 1
+            raid["last_join"] = time.monotonic()
+            if score >= settings["min_score"]:
+                self.quarantine_later(member.guild, [member.id])
+            return
+
+        joins, risk = self.tracker_for(member.guild.id, settings["seconds"]).add(member.id, score)
+        if joins >= settings["joins"] or risk >= settings["risk"]:
+            self.start_raid(member.guild, settings, joins, risk)
+
+    def start_raid(self, guild, settings, joins, risk):
+        raid = self.raids[guild.id] = {
+            "started": timestamp_now(),
+            "last_join": time.monotonic(),
+            "joins": joins,
+            "quarantined": 0,
+            "responses": list(settings["responses"]),
+            "quiet": settings["quiet"],
+            "verification_level": None
+        }
+        # Suspicious accounts that joined before the threshold was reached
+        suspicious = self.trackers.pop(guild.id).drain(settings["min_score"])
+        self.bot.scheduler.schedule(
+            ('raids', guild.id), timestamp_now() + settings["quiet"], self.check_raid_over, guild.id
+        )
+        logging.warning(f"Raid detected in {guild.name}: {joins} joins, risk {risk} in {settings['seconds']}s")
+        self.spawn(self.respond(guild, raid, suspicious, risk, settings["seconds"]))
+
+    async def respond(self, guild, raid, suspicious, risk, seconds):
+        """Run the guild's configured responses and report them"""
+        results = {}
+        if "verification" in raid["responses"]:
+            results["Verification"] = await self.raise_verification(guild, raid)
+        if "quarantine" in raid["responses"]:
+            self.quarantine_later(guild, suspicious)
+            results["Quarantine"] = f"{len(suspicious)} suspicious accounts so far"
+        if "lockdown" in raid["responses"]:
+            moderation = self.bot.get_cog('Moderation')
+            if moderation is None:
+                results["Lockdown"] = "Moderation cog isn't loaded"
+            else:
+                try:
+                    job = await moderation.lock_guild(guild, "Raid detected")
+                    results["Lockdown"] = job.summary()
+                except Exception as e:
+                    logging.error(f"Raid lockdown failed in {guild.name}: {e}")
+                    results["Lockdown"] = "Failed"
+
+        embed = discord.Embed(
+            title="Raid Detected",
+            description=f"{raid['joins']} joins (account risk {risk}) within {seconds} seconds.",
+            color=discord.Color.dark_red(),
+            timestamp=datetime.utcnow()
+        )
+        for name, result in results.items():
+            embed.add_field(name=name, value=result, inline=False)
+        if not results:
+            embed.add_field(name="Responses", value="None configured, see `!raidconfig`", inline=False)
+        embed.set_footer(text=f"Raid mode ends after {format_duration(raid['quiet'])} without joins")
+        await self.log_to_modchannel(guild, embed)
+
+    async def raise_verification(self, guild, raid):
+        if guild.verification_level >= discord.VerificationLevel.high:
+            return f"Already {guild.verification_level}"
+        try:
+            previous = guild.verification_level
+            await guild.edit(verification_level=discord.VerificationLevel.high, reason="Raid detected")
+            raid["verification_level"] = previous
+            return f"Raised from {previous} to high"
+        except discord.HTTPException as e:
+            logging.error(f"Could not raise verification level in {guild.name}: {e}")
+            return "Failed"
+
+    async def check_raid_over(self, guild_id):
+        raid = self.raids.get(guild_id)
+        if raid is None:
+            return
+        # Joins only bump last_join, the timer is moved here instead of on every join
+        remaining = raid["last_join"] + raid["quiet"] - time.monotonic()
+        if remaining > 1:
+            self.bot.scheduler.schedule(
+                ('raids', guild_id), timestamp_now() + remaining, self.check_raid_over, guild_id
+            )
+            return
+        guild = self.bot.get_guild(guild_id)
+        if guild:
+            await self.end_raid(guild)
+
+    async def end_raid(self, guild, moderator=None):
+        raid = self.raids.pop(guild.id, None)
+        if raid is None:
+            return False
+        self.bot.scheduler.cancel(('raids', guild.id))
+
+        embed = discord.Embed(
+            title="Raid Ended",
+            color=discord.Color.green(),
+            timestamp=datetime.utcnow()
+        )
+        if moderator:
+            embed.add_field(name="Moderator", value=f"{moderator.mention} ({moderator.name})", inline=False)
+        embed.add_field(name="Duration", value=format_duration(timestamp_now() - raid["started"]), inline=True)
+        embed.add_field(name="Joins", value=str(raid["joins"]), inline=True)
+        embed.add_field(name="Quarantined", value=str(raid["quarantined"]), inline=True)
+
+        if raid["verification_level"] is not None:
+            try:
+                await guild.edit(verification_level=raid["verification_level"], reason="Raid ended")
+                embed.add_field(name="Verification", value=f"Restored to {raid['verification_level']}", inline=False)
+            except discord.HTTPException as e:
+                logging.error(f"Could not restore verification level in {guild.name}: {e}")
+        if "lockdown" in raid["responses"]:
+            embed.add_field(name="Lockdown", value="Still active, run `!unlock` when ready", inline=False)
+
+        await self.log_to_modchannel(guild, embed)
+        return True
+
+    def quarantine_later(self, guild, member_ids):
+        raid = self.raids.get(guild.id)
+        if not member_ids or raid is None or "quarantine" not in raid["responses"]:
+            return
+        self.pending.setdefault(guild.id, []).extend(member_ids)
+        worker = self.workers.get(guild.id)
+        if worker is None or worker.done():
+            self.workers[guild.id] = asyncio.create_task(self.quarantine_worker(guild))
+
+    async def quarantine_worker(self, guild):
+        """Hand out the Quarantine role in batches while joins keep coming"""
+        while self.pending.get(guild.id):
+            # Let the batch fill up, one mod-log entry covers all of it
+            await asyncio.sleep(1)
+            member_ids = self.pending.pop(guild.id)
+            role = await self.ensure_quarantine_role(guild)
+            if role is None:
+                logging.error(f"Could not create the Quarantine role in {guild.name}")
+                return
+
+            # Members who left already or have the role, not counted as quarantined
+            skipped = set()
+
+            async def quarantine(member_id):
+                member = guild.get_member(member_id)
+                if member is None or role in member.roles:
+                    skipped.add(member_id)
+                    return
+                await member.add_roles(role, reason="Raid detected, suspicious account")
+
+            done, failed = await run_bulk(list(dict.fromkeys(member_ids)), quarantine)
+            quarantined = [member_id for member_id in done if member_id not in skipped]
+            if not quarantined and not failed:
+                continue
+            raid = self.raids.get(guild.id)
+            if raid is not None:
+                raid["quarantined"] += len(quarantined)
+
+            self.db.log_actions(
+                guild.id,
+                quarantined,
+                "quarantine",
+                {
+                    "reason": "Raid detected, suspicious account",
+                    "moderator": self.bot.user.id,
+                    "moderator_name": str(self.bot.user)
+                }
+            )
+
+            embed = discord.Embed(
+                title="Members Quarantined",
+                description=summarize_users(quarantined) or None,
+                color=discord.Color.orange(),
+                timestamp=datetime.utcnow()
+            )
+            embed.add_field(name="Done", value=str(len(quarantined)), inline=True)
+            embed.add_field(name="Failed", value=str(len(failed)), inline=True)
+            if skipped:
+                embed.add_field(name="Skipped", value=f"{len(skipped)} (left or already quarantined)", inline=True)
+            await self.log_to_modchannel(guild, embed)
+
+    async def ensure_quarantine_role(self, guild):
+        """Ensure the Quarantine role exists, its channel overwrites are applied in the background"""
+        role = self.bot.settings.quarantine_role(guild)
+        if not role:
+            try:
+                role = await guild.create_role(
+                    name="Quarantine",
+                    reason="Created for raid protection",
+                    color=discord.Color.dark_orange()
+                )
+                self.bot.settings.set_quarantine_role(guild, role)
+            except discord.errors.Forbidden:
+                return None
+
+        key = (guild.id, role.id)
+        if key not in self.quarantine_setup:
+            self.quarantine_setup[key] = asyncio.create_task(self.setup_quarantine_role(guild, role))
+
+        return role
+
+    async def setup_quarantine_role(self, guild, role):
+        """Apply the Quarantine role's overwrites to every channel that doesn't have them yet"""
+        try:
+            job = OverwriteJob(guild, role, guild.channels, QUARANTINE_PERMISSIONS, reason="Quarantine role setup")
+            await job.run()
+            logging.info(f"Quarantine role setup in {guild.name}: {job.summary()}")
+        except Exception as e:
+            logging.error(f"Error setting up Quarantine role: {e}")
+            del self.quarantine_setup[(guild.id, role.id)]
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def raidconfig(self, ctx, setting: str = None, *values):
+        """Show or change raid detection, e.g. `!raidconfig joins 15` or `!raidconfig responses lockdown quarantine`"""
+        settings = self.settings_for(ctx.guild.id)
+        if setting is None:
+            embed = discord.Embed(title="Raid Detection", color=discord.Color.blue())
+            for name, value in settings.items():
+                if name == "responses":
+                    value = ", ".join(value) or "none"
+                embed.add_field(name=name, value=str(value), inline=True)
+            await ctx.send(embed=embed)
+            return
+
+        setting = setting.lower()
+        if setting not in DEFAULT_RAID_SETTINGS:
+            await ctx.send(f"Unknown setting, use one of: {', '.join(DEFAULT_RAID_SETTINGS)}")
+            return
+        if not values:
+            await ctx.send(f"`{setting}` is {settings[setting]}.")
+            return
+
+        if setting == "enabled":
+            value = values[0].lower() in ("on", "true", "yes", "1")
+        elif setting == "responses":
+            value = [] if values[0].lower() == "none" else list(dict.fromkeys(v.lower() for v in values))
+            unknown = [v for v in value if v not in RESPONSES]
+            if unknown:
+                await ctx.send(f"Unknown responses: {', '.join(unknown)}. Use {', '.join(RESPONSES)} or none.")
+                return
+        else:
+            try:
+                value = int(values[0])
+            except ValueError:
+                value = 0
+            if value < 1:
+                await ctx.send(f"`{setting}` has to be a positive number.")
+                return
+
+        self.guild_settings.setdefault(str(ctx.guild.id), {})[setting] = value
+        self.settings_writer.request_save()
+        await ctx.send(f"`{setting}` set to {value}.")
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def raidend(self, ctx):
+        """End raid mode now and restore the verification level"""
+        if not await self.end_raid(ctx.guild, ctx.author):
+            await ctx.send("There's no raid going on.")
+            return
+        await ctx.send("Raid mode ended.")
+
+    @commands.command()
+    @commands.has_permissions(manage_roles=True)
+    async def release(self, ctx, *args):
+        """Take the Quarantine role off members, e.g. `!release 1234 @user` or `!release all`"""
+        role = self.bot.settings.quarantine_role(ctx.guild)
+        if role is None:
+            await ctx.send("There's no Quarantine role.")
+            return
+        if [arg.lower() for arg in args] == ["all"]:
+            members = list(role.members)
+        else:
+            try:
+                user_ids, _, _ = parse_bulk_args(ctx.guild, args)
+            except TimeParseError as e:
+                await ctx.send(str(e))
+                return
+            members = [m for m in map(ctx.guild.get_member, user_ids) if m is not None and role in m.roles]
+        if not members:
+            await ctx.send("Nobody to release.")
+            return
+
+        released, failed = await run_bulk(
+            members, lambda member: member.remove_roles(role, reason=f"Released by {ctx.author}")
+        )
+        self.db.log_actions(
+            ctx.guild.id,
+            [member.id for member in released],
+            "release",
+            {
+                "reason": "Released from quarantine",
+                "moderator": ctx.author.id,
+                "moderator_name": str(ctx.author)
+            }
+        )
+
+        embed = discord.Embed(
+            title="Members Released",
+            description=summarize_users([member.id for member in released]) or None,
+            color=discord.Color.green(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+        embed.add_field(name="Done", value=str(len(released)), inline=True)
+        embed.add_field(name="Failed", value=str(len(failed)), inline=True)
+        await self.log_to_modchannel(ctx.guild, embed)
+        await ctx.send(f"Released {len(released)} members." + (f" {len(failed)} failed." if failed else ""))
+
+async def setup(bot):
+    await bot.add_cog(RaidGuard(bot))
@@ -0,0 +1,235 @@
+from discord.ext import commands
+import discord
+from datetime import datetime
+import asyncio
+import json
+import os
+import logging
+from utils.atomic_io import SnapshotWriter
+from utils.simhash import SimHashIndex, simhash
+from utils.bulk import run_bulk, summarize_users
+from utils.time_parser import parse_time, format_duration, TimeParseError
+from utils.pipeline import MODERATION
+
+# Near-duplicates are looked for among the messages of the last 30 seconds
+WINDOW = 30
+# How many different members have to post the same text for it to be spam
+MIN_AUTHORS = 4
+# Text found to be spam is removed on sight for this long
+FLAG_WINDOW = 300
+
+SPAM_ACTIONS = ("delete", "mute")
+
+DEFAULT_SPAM_SETTINGS = {
+    # Members chatting along with each other post the same text too, so
+    # only deleting is the safe default; "mute" is for raid-prone guilds
+    "action": "delete",
+    "mute_duration": 3600
+}
+
+class SpamFilter(commands.Cog):
+    """Catches the same or nearly the same text posted by many accounts
+
+    Every message is fingerprinted with SimHash and looked up in a
+    per-guild index of the last WINDOW seconds. Once MIN_AUTHORS members
+    have posted near-duplicates, the fingerprint is flagged and those
+    messages, plus any matching ones that follow, are deleted in bulk and,
+    if the guild chose so with !spamaction, their authors muted in one batch.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.settings_file = 'data/spam_filter.json'
+        # guild_id -> settings that differ from DEFAULT_SPAM_SETTINGS
+        self.guild_settings = {}
+        self.settings_writer = SnapshotWriter(
+            self.settings_file,
+            lambda: {guild_id: dict(settings) for guild_id, settings in self.guild_settings.items()}
+        )
+        self.recent = {}
+        self.flagged = {}
+        # guild_id -> {channel_id: {message_id: author_id}}
+        self.pending = {}
+        self.workers = {}
+        self.detected = 0
+
+    def load_settings(self):
+        if not os.path.exists(self.settings_file):
+            return {}
+        try:
+            with open(self.settings_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Failed to load spam filter settings: {e}")
+            return {}
+
+    async def cog_load(self):
+        self.guild_settings = await asyncio.to_thread(self.load_settings)
+        self.bot.pipeline.register('spam_filter', MODERATION + 2, self.check_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('spam_filter')
+        for worker in self.workers.values():
+            worker.cancel()
+        await self.settings_writer.close()
+
+    def settings_for(self, guild_id):
+        return {**DEFAULT_SPAM_SETTINGS, **self.guild_settings.get(str(guild_id), {})}
+
+    async def log_to_modchannel(self, guild, embed):
+        """Queue log message for the mod-logs channel"""
+        self.bot.modlog.enqueue(guild, embed)
+
+    def check_message(self, ctx):
+        if not ctx.guild:
+            return False
+        fingerprint = simhash(ctx.content)
+        if fingerprint is None or ctx.author.guild_permissions.manage_messages:
+            # Moderators quoting spam neither count towards a wave nor get removed
+            return False
+        message = ctx.message
+        guild_id = message.guild.id
+        item = (message.channel.id, message.id, message.author.id)
+
+        flagged = self.flagged.get(guild_id)
+        if flagged is not None and flagged.match(fingerprint):
+            self.clean_up(message.guild, [item])
+            return True
+
+        recent = self.recent.get(guild_id)
+        if recent is None:
+            recent = self.recent[guild_id] = SimHashIndex(WINDOW)
+        matches = recent.add(fingerprint, item)
+        if len(matches) + 1 < MIN_AUTHORS:
+            return False
+        if len({author_id for _, _, author_id in matches} | {message.author.id}) < MIN_AUTHORS:
+            return False
+
+        self.detected += 1
+        if flagged is None:
+            flagged = self.flagged[guild_id] = SimHashIndex(FLAG_WINDOW)
+        flagged.add(fingerprint, None)
+        logging.warning(f"Duplicate spam in {message.guild.name}: {len(matches) + 1} messages")
+        self.clean_up(message.guild, matches + [item])
+        return True
+
+    def clean_up(self, guild, items):
+        messages = self.pending.setdefault(guild.id, {})
+        for channel_id, message_id, author_id in items:
+            messages.setdefault(channel_id, {})[message_id] = author_id
+        worker = self.workers.get(guild.id)
+        if worker is None or worker.done():
+            self.workers[guild.id] = asyncio.create_task(self.clean_up_worker(guild))
+
+    async def clean_up_worker(self, guild):
+        """Delete flagged messages and mute their authors, a batch at a time"""
+        while guild.id in self.pending:
+            # Let the rest of the wave arrive, it's all handled together
+            await asyncio.sleep(1)
+            messages = self.pending.pop(guild.id)
+            try:
+                await self.remove_spam(guild, messages)
+            except Exception as e:
+                logging.error(f"Error cleaning up duplicate spam in {guild.name}: {e}")
+
+    async def remove_spam(self, guild, messages):
+        # Members made moderators since posting are left alone
+        exempt = set()
+        members = {}
+        for author_id in {author_id for by_id in messages.values() for author_id in by_id.values()}:
+            member = guild.get_member(author_id)
+            if member is not None and member.guild_permissions.manage_messages:
+                exempt.add(author_id)
+            elif member is not None:
+                members[author_id] = member
+
+        # Bulk deletes take up to 100 messages of one channel
+        chunks = []
+        for channel_id, by_id in messages.items():
+            channel = guild.get_channel(channel_id)
+            if channel is None:
+                continue
+            message_ids = sorted(message_id for message_id, author_id in by_id.items() if author_id not in exempt)
+            for i in range(0, len(message_ids), 100):
+                chunks.append((channel, [discord.Object(id=message_id) for message_id in message_ids[i:i + 100]]))
+        deleted, failed_deletes = await run_bulk(
+            chunks, lambda chunk: chunk[0].delete_messages(chunk[1], reason="Duplicate spam")
+        )
+
+        settings = self.settings_for(guild.id)
+        muted, failed_mutes = [], []
+        mute = self.bot.get_cog('Mute')
+        if settings["action"] == "mute" and mute is not None:
+            muted_role = self.bot.settings.muted_role(guild)
+            members = [member for member in members.values() if muted_role is None or muted_role not in member.roles]
+            if members:
+                result = await mute.mute_members(guild, members, guild.me, settings["mute_duration"], "Duplicate spam")
+                if result is not None:
+                    muted, failed_mutes = result
+
+        embed = discord.Embed(
+            title="Duplicate Spam Removed",
+            description=summarize_users(muted) or None,
+            color=discord.Color.red(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Messages", value=str(sum(len(ids) for _, ids in deleted)), inline=True)
+        embed.add_field(name="Channels", value=str(len({channel.id for channel, _ in deleted})), inline=True)
+        if settings["action"] == "mute":
+            embed.add_field(name=f"Muted ({format_duration(settings['mute_duration'])})", value=str(len(muted)), inline=True)
+        if failed_deletes or failed_mutes:
+            embed.add_field(
+                name="Failed",
+                value=f"{sum(len(ids) for _, ids in failed_deletes)} messages, {len(failed_mutes)} mutes",
+                inline=False
+            )
+        await self.log_to_modchannel(guild, embed)
+
+    @commands.command()
+    @commands.has_permissions(manage_messages=True)
+    async def spamstats(self, ctx):
+        """Show the duplicate spam filter's state in this server"""
+        recent = self.recent.get(ctx.guild.id)
+        flagged = self.flagged.get(ctx.guild.id)
+        embed = discord.Embed(
+            title="Duplicate Spam Filter",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="Recent fingerprints", value=str(len(recent) if recent else 0), inline=True)
+        embed.add_field(name="Flagged texts", value=str(len(flagged) if flagged else 0), inline=True)
+        embed.add_field(name="Waves detected", value=str(self.detected), inline=True)
+        settings = self.settings_for(ctx.guild.id)
+        action = settings["action"]
+        if action == "mute":
+            action = f"mute for {format_duration(settings['mute_duration'])}"
+        embed.add_field(name="Action", value=action, inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def spamaction(self, ctx, action: str, duration: str = None):
+        """Set what duplicate spam does: `delete` or `mute [duration]`"""
+        action = action.lower()
+        if action not in SPAM_ACTIONS:
+            await ctx.send(f"Use one of: {', '.join(SPAM_ACTIONS)}")
+            return
+        changes = {"action": action}
+        if duration and action == "mute":
+            try:
+                changes["mute_duration"] = parse_time(duration)
+            except TimeParseError as e:
+                await ctx.send(str(e))
+                return
+        self.guild_settings.setdefault(str(ctx.guild.id), {}).update(changes)
+        self.settings_writer.request_save()
+
+        settings = self.settings_for(ctx.guild.id)
+        if action == "mute":
+            await ctx.send(f"Duplicate spam is now deleted and its authors muted for "
+                           f"{format_duration(settings['mute_duration'])}.")
+        else:
+            await ctx.send("Duplicate spam is now only deleted.")
+
+async def setup(bot):
+    await bot.add_cog(SpamFilter(bot))
@@ -2,6 +2,13 @@ from discord.ext import commands
 import discord
 from datetime import datetime, timedelta
 import os
+import asyncio
+import itertools
+from collections import Counter
+from typing import Optional
+from utils.records import CATEGORY_MAPPING, CATEGORIES
+from utils.time_parser import timestamp_now, format_timestamp, parse_since, TimeParseError
+from utils.pipeline import ACCOUNTING
 
 class Stats(commands.Cog):
     def __init__(self, bot):
@@ -9,47 +16,43 @@ class Stats(commands.Cog):
         self.db = bot.db
         self.voice_time_tracker = {}
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if not message.author.bot:
-            user_id = str(message.author.id)
-            user_data = self.db.ensure_user_data(user_id)
-            user_data["messages"] += 1
-            user_data["last_seen"] = str(datetime.utcnow())
-            self.db.save_data()
+    async def cog_load(self):
+        self.bot.pipeline.register('stats', ACCOUNTING, self.count_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('stats')
+
+    async def count_message(self, ctx):
+        if ctx.guild:
+            await self.db.ensure_loaded(ctx.guild.id)
+            user_id = str(ctx.author.id)
+            self.db.increment(ctx.guild.id, user_id, "messages")
+            self.db.set_field(ctx.guild.id, user_id, "last_seen", timestamp_now())
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
-        if not message.author.bot:
+        if not message.author.bot and message.guild:
+            await self.db.ensure_loaded(message.guild.id)
             user_id = str(message.author.id)
-            user_data = self.db.ensure_user_data(user_id)
-            user_data["message_deletes"] += 1
-            self.db.save_data()
+            self.db.increment(message.guild.id, user_id, "message_deletes")
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         user_id = str(member.id)
+        key = (member.guild.id, user_id)
         
         if before.channel is None and after.channel is not None:
-            self.voice_time_tracker[user_id] = datetime.utcnow()
+            self.voice_time_tracker[key] = datetime.utcnow()
         
         elif before.channel is not None and after.channel is None:
-            if user_id in self.voice_time_tracker:
-                start_time = self.voice_time_tracker[user_id]
+            if key in self.voice_time_tracker:
+                start_time = self.voice_time_tracker[key]
                 duration = datetime.utcnow() - start_time
                 minutes = duration.total_seconds() / 60
                 
-                user_data = self.db.ensure_user_data(user_id)
-                user_data["voice_time"] += minutes
-                self.db.save_data()
-                del self.voice_time_tracker[user_id]
-
-    def format_datetime(self, date_str):
-        try:
-            dt = datetime.fromisoformat(date_str)
-            return dt.strftime("%d/%m/%Y %H:%M")
-        except (ValueError, TypeError):
-            return "Unknown"
+                await self.db.ensure_loaded(member.guild.id)
+                self.db.increment(member.guild.id, user_id, "voice_time", minutes)
+                del self.voice_time_tracker[key]
 
     @commands.command()
     @commands.has_permissions(kick_members=True)
@@ -57,7 +60,9 @@ class Stats(commands.Cog):
         member = member or ctx.author
         user_id = str(member.id)
         
-        user_data = self.db.ensure_user_data(user_id)
+        await self.db.ensure_loaded(ctx.guild.id)
+        user_data = self.db.get_user(ctx.guild.id, user_id)
+        action_counts = self.db.count_actions(ctx.guild.id, user_id)
         
         embed = discord.Embed(
             title=f"Statistics for {member.display_name}",
@@ -67,31 +72,31 @@ class Stats(commands.Cog):
         
         embed.add_field(
             name="Basic Information",
-            value=f"Join Date: {self.format_datetime(user_data.get('join_date', 'Unknown'))}\n"
-                  f"Last Seen: {self.format_datetime(user_data.get('last_seen', 'Never'))}\n"
-                  f"Messages Sent: {user_data.get('messages', 0)}\n"
-                  f"Messages Deleted: {user_data.get('message_deletes', 0)}\n"
-                  f"Voice Time: {round(user_data.get('voice_time', 0), 2)} minutes",
+            value=f"Join Date: {format_timestamp(user_data.join_date)}\n"
+                  f"Last Seen: {format_timestamp(user_data.last_seen)}\n"
+                  f"Messages Sent: {user_data.messages}\n"
+                  f"Messages Deleted: {user_data.message_deletes}\n"
+                  f"Voice Time: {round(user_data.voice_time, 2)} minutes",
             inline=False
         )
         
         embed.add_field(
             name="Moderation History",
-            value=f"Warnings: {len(user_data.get('warnings', []))}, "
-                  f"Kicks: {len(user_data.get('kicks', []))}, "
-                  f"Bans: {len(user_data.get('bans', []))}, "
-                  f"Mutes: {len(user_data.get('mutes', []))}",
+            value=f"Warnings: {action_counts['warnings']}, "
+                  f"Kicks: {action_counts['kicks']}, "
+                  f"Bans: {action_counts['bans']}, "
+                  f"Mutes: {action_counts['mutes']}",
             inline=False
         )
         
-        recent_actions = user_data.get('action_history', [])[-5:]
+        recent_actions = self.db.get_actions(ctx.guild.id, user_id, limit=5)
         if recent_actions:
             action_text = []
             for action in recent_actions:
-                action_type = action['type'].title()
-                details = action['details']
+                action_type = action.type.title()
+                details = action.details
                 reason = details.get('reason', 'No reason')
-                timestamp = self.format_datetime(action['timestamp'])
+                timestamp = format_timestamp(action.timestamp)
                 action_text.append(f"{action_type}: {reason} ({timestamp})")
             action_text = "\n".join(action_text)
         else:
@@ -109,34 +114,112 @@ class Stats(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def export_logs(self, ctx, member: discord.Member):
         user_id = str(member.id)
-        user_data = self.db.ensure_user_data(user_id)
+        await self.db.ensure_loaded(ctx.guild.id)
+        user_data = self.db.get_user(ctx.guild.id, user_id)
         
         log_text = [
             f"Log Export for {member.display_name} (ID: {member.id})",
             f"Generated at: {datetime.utcnow().strftime('%d/%m/%Y %H:%M')}",
             "\n=== Basic Information ===",
-            f"Join Date: {self.format_datetime(user_data.get('join_date', 'Unknown'))}",
-            f"Last Seen: {self.format_datetime(user_data.get('last_seen', 'Never'))}",
-            f"Total Messages: {user_data.get('messages', 0)}",
-            f"Deleted Messages: {user_data.get('message_deletes', 0)}",
-            f"Voice Time: {round(user_data.get('voice_time', 0), 2)} minutes",
+            f"Join Date: {format_timestamp(user_data.join_date)}",
+            f"Last Seen: {format_timestamp(user_data.last_seen)}",
+            f"Total Messages: {user_data.messages}",
+            f"Deleted Messages: {user_data.message_deletes}",
+            f"Voice Time: {round(user_data.voice_time, 2)} minutes",
             "\n=== Action History ==="
         ]
         
-        for action in user_data.get('action_history', []):
-            log_text.append(
-                f"\n[{self.format_datetime(action['timestamp'])}] {action['type'].upper()}:"
-                f"\nReason: {action['details'].get('reason', 'No reason provided')}"
-                f"\nModerator: {action['details'].get('moderator_name', 'Unknown')}"
-            )
-        
+        # Hot actions are read now, archived ones are streamed from their
+        # compressed segments while the file is written off the event loop
+        recent_actions = self.db.get_actions(ctx.guild.id, user_id)
         filename = f"logs_{member.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(log_text))
+        await asyncio.to_thread(self.write_log_file, filename, log_text, ctx.guild.id, user_id, recent_actions)
             
         await ctx.send(f"Log export for {member.mention}", file=discord.File(filename))
         
         os.remove(filename)
 
+    def write_log_file(self, filename, log_text, guild_id, user_id, recent_actions):
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(log_text))
+            for action in itertools.chain(self.db.iter_archived_actions(guild_id, user_id), recent_actions):
+                f.write(
+                    f"\n\n[{format_timestamp(action.timestamp)}] {action.type.upper()}:"
+                    f"\nReason: {action.details.get('reason', 'No reason provided')}"
+                    f"\nModerator: {action.details.get('moderator_name', 'Unknown')}"
+                )
+
+    def parse_query(self, args):
+        """Split `!actions` arguments into a category and a start time (default: last 7 days)"""
+        category = None
+        period = '7d'
+        for arg in args:
+            # Accept both "bans" and "ban"
+            name = CATEGORY_MAPPING.get(arg.lower(), CATEGORY_MAPPING.get(arg.lower().rstrip('s')))
+            if name:
+                category = name
+            else:
+                period = arg
+        return category, parse_since(period)
+
+    @commands.command()
+    @commands.has_permissions(kick_members=True)
+    async def actions(self, ctx, moderator: Optional[discord.Member] = None, *args):
+        """List recent moderation actions, e.g. `!actions @mod bans 7d` or `!actions mutes week`"""
+        try:
+            category, since = self.parse_query(args)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        
+        await self.db.ensure_loaded(ctx.guild.id)
+        results = self.db.query_actions(
+            ctx.guild.id, category, moderator.id if moderator else None, since, limit=20
+        )
+        if not results:
+            await ctx.send("No matching actions.")
+            return
+        
+        embed = discord.Embed(
+            title=f"{(category or 'actions').capitalize()} since {format_timestamp(since)}",
+            description=f"By {moderator.mention}" if moderator else None,
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        for user_id, action in results:
+            embed.add_field(
+                name=f"{action.type.upper()} - {format_timestamp(action.timestamp)}",
+                value=f"User: <@{user_id}>\n"
+                      f"Reason: {action.details.get('reason', 'No reason provided')}\n"
+                      f"Moderator: {action.details.get('moderator_name', 'Unknown')}",
+                inline=False
+            )
+        embed.set_footer(text=f"Showing the latest {len(results)}")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_permissions(kick_members=True)
+    async def modstats(self, ctx, moderator: Optional[discord.Member] = None, period='week'):
+        """Count actions per category, e.g. `!modstats @mod 30d` or `!modstats today`"""
+        try:
+            since = parse_since(period)
+        except TimeParseError as e:
+            await ctx.send(str(e))
+            return
+        
+        await self.db.ensure_loaded(ctx.guild.id)
+        results = self.db.query_actions(ctx.guild.id, moderator_id=moderator.id if moderator else None, since=since)
+        counts = Counter(action.category for _, action in results)
+        
+        embed = discord.Embed(
+            title=f"Moderation since {format_timestamp(since)}",
+            description=f"By {moderator.mention}" if moderator else None,
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        for category in CATEGORIES:
+            embed.add_field(name=category.capitalize(), value=str(counts[category]), inline=True)
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(Stats(bot))
\ No newline at end of file
@@ -31,9 +31,7 @@ class VivAI(commands.Cog):
         self.model = "deepseek/deepseek-r1-0528:free"
         
     async def log_to_modchannel(self, guild, embed):
-        mod_channel = discord.utils.get(guild.channels, name='mod-logs')
-        if mod_channel:
-            await mod_channel.send(embed=embed)
+        self.bot.modlog.enqueue(guild, embed)
 
     def get_conversation_history(self, user_id: int):
         current_time = datetime.utcnow()
@@ -2,6 +2,7 @@ from discord.ext import commands
 import discord
 from datetime import datetime
 import logging
+from utils.time_parser import format_timestamp
 
 class Warnings(commands.Cog):
     def __init__(self, bot):
@@ -10,28 +11,19 @@ class Warnings(commands.Cog):
         self.logger = logging.getLogger('Warnings')
 
     async def log_to_modchannel(self, guild, embed):
-        """Send log message to mod-logs channel"""
-        mod_channel = discord.utils.get(guild.channels, name='mod-logs')
-        if mod_channel:
-            await mod_channel.send(embed=embed)
-
-    @commands.command()
-    @commands.has_permissions(kick_members=True)
-    async def warn(self, ctx, member: discord.Member, *, reason=None):
-        """Warn a member"""
-        if member.top_role >= ctx.author.top_role:
-            await ctx.send("nope.")
-            return
+        """Queue log message for the mod-logs channel"""
+        self.bot.modlog.enqueue(guild, embed)
 
+    async def apply_warning(self, guild, member, moderator, reason=None):
+        """Log a warning and report it in mod-logs, used by !warn and the word filter"""
         warning_data = {
             "reason": reason or "No reason provided",
-            "moderator": ctx.author.id,
-            "moderator_name": str(ctx.author),
-            "timestamp": str(datetime.utcnow())
+            "moderator": moderator.id,
+            "moderator_name": str(moderator)
         }
         
         # Log to database
-        self.db.log_action(member.id, "warnings", warning_data)
+        self.db.log_action(guild.id, member.id, "warnings", warning_data)
         
         # Create embed for mod-logs
         embed = discord.Embed(
@@ -40,20 +32,30 @@ class Warnings(commands.Cog):
             timestamp=datetime.utcnow()
         )
         embed.add_field(name="Member", value=f"{member.mention} ({member.name})", inline=False)
-        embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+        embed.add_field(name="Moderator", value=f"{moderator.mention} ({moderator.name})", inline=False)
         embed.add_field(name="Reason", value=reason or "No reason provided", inline=False)
         embed.set_footer(text=f"User ID: {member.id}")
         
         # Send to mod-logs
-        await self.log_to_modchannel(ctx.guild, embed)
+        await self.log_to_modchannel(guild, embed)
+
+    @commands.command()
+    @commands.has_permissions(kick_members=True)
+    async def warn(self, ctx, member: discord.Member, *, reason=None):
+        """Warn a member"""
+        if member.top_role >= ctx.author.top_role:
+            await ctx.send("nope.")
+            return
+
+        await self.apply_warning(ctx.guild, member, ctx.author, reason)
         await ctx.send(f"{member.mention} has been warned. Reason: {reason or 'No reason provided'}")
 
     @commands.command()
     @commands.has_permissions(kick_members=True)
     async def warnings(self, ctx, member: discord.Member):
         """Check warnings for a member"""
-        user_data = self.db.ensure_user_data(str(member.id))
-        warnings = user_data.get("warnings", [])
+        await self.db.ensure_loaded(ctx.guild.id)
+        warnings = self.db.get_actions(ctx.guild.id, member.id, "warnings")
         
         if not warnings:
             await ctx.send(f"{member.mention} has no warnings.")
@@ -68,9 +70,9 @@ class Warnings(commands.Cog):
         for i, warning in enumerate(warnings, 1):
             embed.add_field(
                 name=f"Warning {i}",
-                value=f"Reason: {warning.get('reason', 'No reason provided')}\n"
-                      f"Date: {warning['timestamp']}\n"
-                      f"Moderator: {warning['moderator_name']}",
+                value=f"Reason: {warning.details.get('reason', 'No reason provided')}\n"
+                      f"Date: {format_timestamp(warning.timestamp)}\n"
+                      f"Moderator: {warning.details['moderator_name']}",
                 inline=False
             )
         
@@ -0,0 +1,228 @@
+from discord.ext import commands
+import discord
+import io
+import json
+import os
+import asyncio
+import logging
+from utils.atomic_io import SnapshotWriter
+from utils.wordfilter import Automaton, TermFilter
+from utils.time_parser import parse_time, format_duration, timestamp_now, TimeParseError
+from utils.pipeline import MODERATION
+
+FILTER_ACTIONS = ("delete", "warn", "mute")
+
+DEFAULT_FILTER_SETTINGS = {
+    "action": "warn",
+    # With "warn", this many warnings within a day turn into a mute
+    "mute_after": 3,
+    "mute_duration": 3600
+}
+
+class WordFilter(commands.Cog):
+    """Deletes messages containing a guild's banned words and phrases
+
+    Each guild's list is compiled into an Aho-Corasick automaton, so a scan
+    costs the same for ten terms as for thousands. Matches are warned
+    through the Warnings cog or muted through the Mute cog, as configured
+    with !termaction. Members who can manage messages are exempt.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = bot.db
+        self.logger = logging.getLogger('WordFilter')
+        self.terms_file = 'data/banned_terms.json'
+        # guild_id -> settings that differ from DEFAULT_FILTER_SETTINGS, the
+        # terms are only added to the saved file from self.filters
+        self.guild_settings = {}
+        # guild_id -> TermFilter
+        self.filters = {}
+        self.rebuilds = {}
+        self.writer = SnapshotWriter(
+            self.terms_file,
+            lambda: {guild_id: {**settings, "terms": sorted(self.filters[int(guild_id)].terms)}
+                     if int(guild_id) in self.filters else dict(settings)
+                     for guild_id, settings in self.guild_settings.items()},
+            indent=4
+        )
+
+    def load_terms(self):
+        """Read the lists and compile them, done in a worker thread"""
+        if not os.path.exists(self.terms_file):
+            return {}, {}
+        try:
+            with open(self.terms_file, 'r') as f:
+                settings = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Failed to load banned terms: {e}")
+            return {}, {}
+        # The lists live in the filters from here on, settings keep the rest
+        filters = {}
+        for guild_id, data in settings.items():
+            terms = data.pop("terms", None)
+            if terms:
+                filters[int(guild_id)] = TermFilter(terms)
+        return settings, filters
+
+    async def cog_load(self):
+        self.guild_settings, self.filters = await asyncio.to_thread(self.load_terms)
+        self.bot.pipeline.register('word_filter', MODERATION + 1, self.check_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('word_filter')
+        for task in self.rebuilds.values():
+            task.cancel()
+        await self.writer.close()
+
+    def settings_for(self, guild_id):
+        return {**DEFAULT_FILTER_SETTINGS, **self.guild_settings.get(str(guild_id), {})}
+
+    def maybe_rebuild(self, guild_id):
+        """Recompile a guild's whole list off the event loop once enough has changed"""
+        term_filter = self.filters.get(guild_id)
+        if term_filter is None or not term_filter.needs_rebuild:
+            return
+        task = self.rebuilds.get(guild_id)
+        if task is None or task.done():
+            self.rebuilds[guild_id] = asyncio.create_task(self.rebuild(guild_id, term_filter))
+
+    async def rebuild(self, guild_id, term_filter):
+        terms = set(term_filter.terms)
+        try:
+            automaton = await asyncio.to_thread(Automaton, terms)
+        except Exception as e:
+            self.logger.error(f"Failed to compile banned terms of {guild_id}: {e}")
+            return
+        # Changes made while compiling end up in the new delta
+        term_filter.install(automaton, terms)
+
+    async def check_message(self, ctx):
+        term_filter = self.filters.get(ctx.guild.id) if ctx.guild else None
+        if term_filter is None:
+            return False
+        found = term_filter.find(ctx.content)
+        if not found or ctx.author.guild_permissions.manage_messages:
+            return False
+        await self.handle_match(ctx.message, found)
+        return True
+
+    async def handle_match(self, message, found):
+        guild, member = message.guild, message.author
+        settings = self.settings_for(guild.id)
+        reason = f"Banned term: ||{found[0]}||"
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+
+        try:
+            if settings["action"] == "mute":
+                await self.mute(guild, member, settings["mute_duration"], reason)
+            elif settings["action"] == "warn":
+                warnings = self.bot.get_cog('Warnings')
+                if warnings is not None:
+                    await warnings.apply_warning(guild, member, guild.me, reason)
+                    since = timestamp_now() - 86400
+                    await self.db.ensure_loaded(guild.id)
+                    recent = [w for w in self.db.get_actions(guild.id, member.id, "warnings") if w.timestamp >= since]
+                    if len(recent) >= settings["mute_after"]:
+                        await self.mute(guild, member, settings["mute_duration"], f"{len(recent)} warnings today")
+        except discord.HTTPException as e:
+            self.logger.error(f"Could not act on banned term from {member.id} in {guild.id}: {e}")
+
+        await message.channel.send(
+            f"{member.mention}, your message was removed for containing a banned term.", delete_after=10
+        )
+
+    async def mute(self, guild, member, duration, reason):
+        mute = self.bot.get_cog('Mute')
+        muted_role = self.bot.settings.muted_role(guild)
+        if mute is None or (muted_role and muted_role in member.roles):
+            return
+        await mute.apply_mute(guild, member, guild.me, duration, reason)
+
+    def parse_terms(self, terms):
+        return [term.strip() for term in terms.split(',') if term.strip().strip('*')]
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def banterm(self, ctx, *, terms):
+        """Ban words or phrases, comma separated; `word*` also matches longer words"""
+        term_filter = self.filters.get(ctx.guild.id)
+        if term_filter is None:
+            term_filter = self.filters[ctx.guild.id] = TermFilter()
+        added = term_filter.add_many(term.casefold() for term in self.parse_terms(terms))
+        self.guild_settings.setdefault(str(ctx.guild.id), {})
+        self.writer.request_save()
+        self.maybe_rebuild(ctx.guild.id)
+        try:
+            await ctx.message.delete()
+        except discord.HTTPException:
+            pass
+        await ctx.send(f"Added {added} banned terms ({len(term_filter)} in total).")
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def unbanterm(self, ctx, *, terms):
+        """Remove words or phrases from the banned list, comma separated"""
+        term_filter = self.filters.get(ctx.guild.id)
+        if term_filter is None:
+            await ctx.send("This server has no banned terms.")
+            return
+        removed = term_filter.remove_many(term.casefold() for term in self.parse_terms(terms))
+        if not term_filter:
+            del self.filters[ctx.guild.id]
+        self.writer.request_save()
+        self.maybe_rebuild(ctx.guild.id)
+        await ctx.send(f"Removed {removed} banned terms ({len(term_filter)} left).")
+
+    @commands.command()
+    @commands.has_permissions(manage_messages=True)
+    async def bannedterms(self, ctx):
+        """List the banned terms, sent as a file"""
+        term_filter = self.filters.get(ctx.guild.id)
+        if term_filter is None:
+            await ctx.send("This server has no banned terms.")
+            return
+        settings = self.settings_for(ctx.guild.id)
+        data = io.BytesIO('\n'.join(sorted(term_filter.terms)).encode('utf-8'))
+        await ctx.send(
+            f"{len(term_filter)} banned terms, action: {settings['action']}",
+            file=discord.File(data, filename='banned_terms.txt')
+        )
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def termaction(self, ctx, action: str, value: str = None):
+        """Set what a banned term does: `delete`, `warn [mutes after N]` or `mute [duration]`"""
+        action = action.lower()
+        if action not in FILTER_ACTIONS:
+            await ctx.send(f"Use one of: {', '.join(FILTER_ACTIONS)}")
+            return
+        changes = {"action": action}
+        if value and action == "warn":
+            if not value.isdigit() or int(value) < 1:
+                await ctx.send("The number of warnings before a mute has to be a positive number.")
+                return
+            changes["mute_after"] = int(value)
+        elif value and action == "mute":
+            try:
+                changes["mute_duration"] = parse_time(value)
+            except TimeParseError as e:
+                await ctx.send(str(e))
+                return
+        self.guild_settings.setdefault(str(ctx.guild.id), {}).update(changes)
+        self.writer.request_save()
+
+        settings = self.settings_for(ctx.guild.id)
+        if action == "warn":
+            await ctx.send(f"Banned terms now warn, {settings['mute_after']} warnings in a day mute "
+                           f"for {format_duration(settings['mute_duration'])}.")
+        elif action == "mute":
+            await ctx.send(f"Banned terms now mute for {format_duration(settings['mute_duration'])}.")
+        else:
+            await ctx.send("Banned terms are now only deleted.")
+
+async def setup(bot):
+    await bot.add_cog(WordFilter(bot))
@@ -6,6 +6,15 @@ import asyncio
 import logging
 from datetime import datetime
 from utils.database import Database
+from utils.storage import JsonStorage, split_legacy_file
+from utils.sqlite_storage import SQLiteStorage
+from utils.archive import ActionArchive
+from utils.loop_monitor import LoopMonitor
+from utils.scheduler import ExpiryScheduler
+from utils.guild_settings import GuildSettings
+from utils.modlog import ModLogOutbox
+from utils.pipeline import MessagePipeline, PARSE, COMMANDS
+from utils.http_client import HTTPClient
 
 logging.basicConfig(
     level=logging.INFO,
@@ -36,7 +45,37 @@ class AdminBot(commands.Bot):
         
         self.start_time = datetime.utcnow()
         self.logger = logging.getLogger('AdminBot')
-        self.db = Database('data/user_logs.json')
+        self.db = None
+        self.loop_monitor = LoopMonitor()
+        # Shared timers for expiring sanctions
+        self.scheduler = ExpiryScheduler()
+        # Mod-log channel and Muted role IDs per guild, shared by all cogs
+        self.settings = GuildSettings(self)
+        # Mod-log embeds are queued and sent in batches, by webhook unless MODLOG_WEBHOOKS="false"
+        self.modlog = ModLogOutbox(self, use_webhooks=os.getenv('MODLOG_WEBHOOKS', 'true').lower() != 'false')
+        # Every message goes through the cogs' stages in order, commands near the end
+        self.pipeline = MessagePipeline(prefix=self.command_prefix)
+        self.pipeline.register('parse', PARSE, self.parse_command)
+        self.pipeline.register('commands', COMMANDS, self.run_commands)
+        # Shared by every cog calling an external API (self.http is discord.py's own)
+        self.http_client = HTTPClient()
+    
+    def open_storage(self):
+        """Open the storage engine selected by STORAGE_BACKEND (sqlite or json)"""
+        # Data logged before storage was split per guild has no guild of its own
+        default_guild_id = os.getenv('DEFAULT_GUILD_ID', '0')
+        
+        if os.getenv('STORAGE_BACKEND', 'sqlite').lower() == 'json':
+            if os.path.exists('data/user_logs.json') and not os.path.exists('data/guilds'):
+                self.logger.info("Splitting data/user_logs.json into data/guilds/...")
+                split_legacy_file('data/user_logs.json', 'data/guilds', default_guild_id)
+            return JsonStorage('data/guilds')
+        
+        storage = SQLiteStorage('data/user_logs.db', default_guild_id)
+        if storage.is_empty() and os.path.exists('data/user_logs.json'):
+            self.logger.info("Importing data/user_logs.json into data/user_logs.db...")
+            storage.import_json('data/user_logs.json')
+        return storage
     
     async def setup_hook(self):
         try:
@@ -47,6 +86,17 @@ class AdminBot(commands.Bot):
             open('utils/__init__.py', 'a').close()
             open('cogs/__init__.py', 'a').close()
             
+            self.loop_monitor.start()
+            await asyncio.to_thread(self.settings.load)
+            # Opening the store reads (and may import) files, keep it off the event loop
+            self.db = Database(
+                await asyncio.to_thread(self.open_storage),
+                archive=ActionArchive('data/archive'),
+                retention_days=int(os.getenv('RETENTION_DAYS', 90))
+            )
+            await self.db.start()
+            self.scheduler.start()
+            await self.http_client.start()
             await self.load_cogs()
             
         except Exception as e:
@@ -58,9 +108,14 @@ class AdminBot(commands.Bot):
         cogs = [
             'moderation',
             'mute',
+            'raid_guard',
+            'automod',
+            'spam_filter',
+            'word_filter',
             'warnings',
             'error_handler',
             'stats',
+            'diagnostics',
             'anime_commands',
             'custom_commands',
             'viv_ai'
@@ -73,6 +128,17 @@ class AdminBot(commands.Bot):
             except Exception as e:
                 self.logger.error(f'Failed to load {cog}: {str(e)}')
     
+    async def close(self):
+        # Logs still queued need the connection, deliver them first
+        await self.modlog.close()
+        await super().close()
+        await self.scheduler.stop()
+        await self.settings.close()
+        await self.http_client.close()
+        if self.db:
+            await self.db.close()
+        self.loop_monitor.stop()
+    
     async def on_ready(self):
         self.logger.info(f'{self.user} has connected to Discord!')
         self.logger.info(f'Connected to {len(self.guilds)} guilds')
@@ -85,12 +151,26 @@ class AdminBot(commands.Bot):
             )
         )
     
+    async def on_message(self, message):
+        # Replaces the default handler, command processing is a pipeline stage
+        await self.pipeline.dispatch(message)
+    
+    async def parse_command(self, ctx):
+        # Parsed once here, custom commands and the command framework share it
+        if ctx.command is not None:
+            ctx.invocation = await self.get_context(ctx.message)
+    
+    async def run_commands(self, ctx):
+        if ctx.invocation is not None:
+            await self.invoke(ctx.invocation)
+    
     async def on_guild_join(self, guild):
         self.logger.info(f'Joined new guild: {guild.name} (id: {guild.id})')
         
         try:
-            if not discord.utils.get(guild.channels, name='mod-logs'):
-                await guild.create_text_channel('mod-logs')
+            if not self.settings.mod_log_channel(guild):
+                channel = await guild.create_text_channel('mod-logs')
+                self.settings.set_mod_log_channel(guild, channel)
             
             await self.tree.sync(guild=guild)
             self.logger.info(f"Synced slash commands to new guild: {guild.name}")
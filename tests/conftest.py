@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The bot runs from the repository root, import utils/ and cogs/ the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
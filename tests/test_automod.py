@@ -0,0 +1,33 @@
+from utils.automod import TokenBuckets, StrikeCounter, RateLimits
+
+def test_bucket_allows_capacity_then_refills():
+    buckets = TokenBuckets(3, 3)
+    assert [buckets.take("a", now=0) for _ in range(4)] == [True, True, True, False]
+    assert buckets.take("a", now=1.0)
+    assert not buckets.take("a", now=1.0)
+
+def test_idle_buckets_are_evicted():
+    buckets = TokenBuckets(3, 3)
+    buckets.take("a", now=0)
+    buckets.take("b", now=10)
+    assert len(buckets) == 1
+
+def test_rate_limits_report_the_broken_kind():
+    limits = RateLimits({"messages": (2, 5), "mentions": (3, 30), "attachments": (1, 30)})
+    assert limits.check("k", now=0) is None
+    assert limits.check("k", mentions=5, now=0) == "mentions"
+    assert limits.check("k", now=0) == "messages"
+    assert limits.check("j", attachments=2, now=0) == "attachments"
+
+def test_one_strike_per_burst():
+    strikes = StrikeCounter(3600)
+    assert strikes.add("k", now=0, cooldown=5) == 1
+    assert strikes.add("k", now=0.1, cooldown=5) == 0
+    assert strikes.add("k", now=4.9, cooldown=5) == 0
+    assert strikes.add("k", now=5, cooldown=5) == 2
+
+def test_strikes_are_forgotten():
+    strikes = StrikeCounter(60)
+    strikes.add("k", now=0)
+    strikes.add("k", now=1)
+    assert strikes.add("k", now=100) == 1
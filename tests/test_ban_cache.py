@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+from utils.ban_cache import BanCache, normalize_name
+
+def user(user_id, name, global_name=None):
+    return SimpleNamespace(id=user_id, name=name, global_name=global_name)
+
+class Guild:
+    id = 1
+
+    def __init__(self, users, cache=None):
+        self.users = users
+        self.cache = cache
+        self.downloads = 0
+
+    async def bans(self, limit=None):
+        self.downloads += 1
+        for banned in self.users:
+            # A ban coming in while the list downloads must not get lost
+            if self.cache is not None and banned.id == 2:
+                self.cache.add(self.id, user(4, "latecomer"))
+            yield SimpleNamespace(user=banned)
+            await asyncio.sleep(0)
+
+def test_names_are_normalized():
+    assert normalize_name(" @Viv#1234 ") == "viv"
+    assert normalize_name("Viv#test") == "viv#test"
+
+def test_lookup_by_id_mention_and_name():
+    async def run():
+        cache = BanCache()
+        guild = Guild([user(111111111111111111, "troll", "The Troll"), user(2, "other")])
+        by_id = await cache.find(guild, "111111111111111111")
+        by_mention = await cache.find(guild, "<@!111111111111111111>")
+        by_display_name = await cache.find(guild, "the troll")
+        return guild, by_id, by_mention, by_display_name
+
+    guild, by_id, by_mention, by_display_name = asyncio.run(run())
+    assert by_id == by_mention == by_display_name
+    assert by_id[0].name == "troll"
+    assert guild.downloads == 1
+
+def test_events_during_the_download_are_applied_after_it():
+    async def run():
+        cache = BanCache()
+        guild = Guild([user(1, "first"), user(2, "second")], cache)
+        cache.remove(guild.id, user(9, "never cached"))
+        await asyncio.gather(cache.load(guild), cache.load(guild))
+        cache.remove(guild.id, user(1, "first"))
+        return cache, guild
+
+    cache, guild = asyncio.run(run())
+    assert guild.downloads == 1
+    assert set(cache.bans[guild.id]) == {2, 4}
+    assert "first" not in cache.names[guild.id]
+    assert cache.names[guild.id]["latecomer"] == {4}
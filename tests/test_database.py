@@ -0,0 +1,47 @@
+import asyncio
+from utils.database import Database
+from utils.storage import JsonStorage
+
+class FailingMaintenance(JsonStorage):
+    def maintain(self):
+        raise OSError("disk on fire")
+
+def test_changes_are_written_behind(tmp_path):
+    async def run():
+        db = Database(JsonStorage(str(tmp_path)), flush_interval=60)
+        await db.start()
+        db.increment(1, 2, "messages")
+        db.log_action(1, 2, "warning", {"reason": "test", "moderator": 3, "moderator_name": "mod"})
+        # Not written yet, but visible to reads
+        assert not db.storage.loaded("1")
+        assert [a.type for a in db.get_actions(1, 2)] == ["warning"]
+        await db.close()
+        return Database(JsonStorage(str(tmp_path)))
+
+    reopened = asyncio.run(run())
+    assert reopened.get_user(1, 2).messages == 1
+    assert reopened.count_actions(1, 2)["warnings"] == 1
+
+def test_flusher_survives_storage_errors(tmp_path):
+    async def run():
+        db = Database(FailingMaintenance(str(tmp_path)), flush_interval=0.01)
+        await db.start()
+        await asyncio.sleep(0.05)
+        assert not db._flush_task.done()
+        db.increment(1, 2, "messages")
+        await asyncio.sleep(0.05)
+        assert db.pending_changes == 0
+        await db.close()
+
+    asyncio.run(run())
+
+def test_ensure_loaded_reads_in_a_worker_thread(tmp_path):
+    async def run():
+        db = Database(JsonStorage(str(tmp_path)))
+        db.increment(1, 2, "messages")
+        db.storage.partitions.clear()
+        assert not db.storage.loaded("1")
+        await asyncio.gather(db.ensure_loaded(1), db.ensure_loaded("1"))
+        assert db.storage.loaded("1")
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from utils.guild_settings import GuildSettings
+
+class Bot:
+    def add_listener(self, callback, name):
+        pass
+
+def make_guild(roles=(), channels=()):
+    roles = list(roles)
+    return SimpleNamespace(
+        id=1, roles=roles, channels=list(channels),
+        get_role=lambda role_id: next((r for r in roles if r.id == role_id), None),
+        get_channel=lambda channel_id: None
+    )
+
+def test_lookup_by_name_then_by_id(tmp_path):
+    async def run():
+        settings = GuildSettings(Bot(), str(tmp_path / "settings.json"))
+        role = SimpleNamespace(id=10, name="Muted")
+        guild = make_guild([role])
+        assert settings.muted_role(guild) is role
+        role.name = "Silenced"
+        assert settings.muted_role(guild) is role
+        await settings.close()
+
+    asyncio.run(run())
+
+def test_misses_are_not_saved(tmp_path):
+    filename = tmp_path / "settings.json"
+    filename.write_text(json.dumps({"1": {"muted_role": None, "mod_log_channel": 5}}))
+
+    async def run():
+        settings = GuildSettings(Bot(), str(filename))
+        settings.load()
+        assert settings.guilds == {1: {"mod_log_channel": 5}}
+
+        # A role created while the bot was offline is found after the restart
+        role = SimpleNamespace(id=10, name="Muted")
+        assert settings.muted_role(make_guild([role])) is role
+        # A miss stays in memory only
+        assert settings.quarantine_role(make_guild([role])) is None
+        await settings.close()
+
+    asyncio.run(run())
+    assert json.loads(filename.read_text()) == {"1": {"mod_log_channel": 5, "muted_role": 10}}
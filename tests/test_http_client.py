@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+import aiohttp
+import pytest
+from utils.http_client import CircuitBreaker, CircuitOpenError, HTTPClient, HTTPStatusError, HostStats
+
+class Response:
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+        self.headers = {}
+
+    async def json(self, content_type=None):
+        return self.data
+
+class Request:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def __aenter__(self):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+    async def __aexit__(self, *exc):
+        return False
+
+class Session:
+    """Plays back one outcome per request: a Response or an exception to raise"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return Request(self.outcomes.pop(0))
+
+def make_client(outcomes, **options):
+    client = HTTPClient(backoff=0, **options)
+    client.session = Session(outcomes)
+    return client
+
+def test_breaker_opens_and_probes_once():
+    breaker = CircuitBreaker(threshold=2, reset_after=10)
+    breaker.failure(0)
+    assert breaker.allow(1)
+    breaker.failure(1)
+    assert not breaker.allow(5)
+    assert breaker.allow(11)
+    # Only one probe at a time
+    assert not breaker.allow(11)
+    breaker.success()
+    assert breaker.state() == "closed"
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(threshold=1, reset_after=10)
+    breaker.failure(0)
+    assert breaker.allow(10)
+    breaker.failure(10)
+    assert not breaker.allow(15)
+
+def test_latency_histogram_percentiles():
+    stats = HostStats()
+    for seconds in (0.01, 0.02, 0.3, 20):
+        stats.observe(seconds)
+    assert stats.percentile(0.5) == 0.05
+    assert stats.percentile(0.75) == 0.5
+    assert stats.percentile(1.0) is None
+
+def test_retries_server_errors():
+    client = make_client([Response(503), Response(200, {"ok": True})])
+    assert asyncio.run(client.get_json("https://api.test/x")) == {"ok": True}
+    assert client.stats["api.test"].retries == 1
+
+def test_client_errors_are_not_retried():
+    client = make_client([Response(404)])
+    with pytest.raises(HTTPStatusError):
+        asyncio.run(client.get_json("https://api.test/x"))
+    assert client.session.requests == 1
+
+def test_open_circuit_fails_fast():
+    client = make_client([Response(502)] * 3, retries=2, failure_threshold=3)
+    with pytest.raises(HTTPStatusError):
+        asyncio.run(client.get_json("https://api.test/x"))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.get_json("https://api.test/x"))
+    assert client.session.requests == 3
+
+def test_unexpected_error_releases_the_probe():
+    redirects = aiohttp.TooManyRedirects(SimpleNamespace(real_url="https://api.test/x"), ())
+    client = make_client([redirects, Response(200, {})], retries=0, failure_threshold=1, reset_after=0)
+    breaker = client.breaker_for("api.test")
+    breaker.failure(0)
+    with pytest.raises(aiohttp.TooManyRedirects):
+        asyncio.run(client.get_json("https://api.test/x"))
+    assert not breaker.probing
+    assert asyncio.run(client.get_json("https://api.test/x")) == {}
+    assert breaker.state() == "closed"
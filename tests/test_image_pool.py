@@ -0,0 +1,82 @@
+import asyncio
+from collections import deque
+from utils.image_pool import ImagePool
+
+class HTTP:
+    """Hands out numbered images, `fail` requests raise first"""
+
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.requests = 0
+        self.next = 0
+
+    async def get_json(self, url, params=None):
+        self.requests += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            self.fail -= 1
+            raise OSError("unreachable")
+        results = [{"url": f"{url}/{self.next + i}.gif"} for i in range(params["amount"])]
+        self.next += params["amount"]
+        return {"results": results}
+
+def test_commands_are_served_from_the_buffer():
+    async def run():
+        http = HTTP()
+        pool = ImagePool(http, "https://api.test/", size=10, low=3)
+        images = [await pool.get("hug") for _ in range(8)]
+        await asyncio.sleep(0.01)
+        pool.close()
+        return http, pool, images
+
+    http, pool, images = asyncio.run(run())
+    assert len({image["url"] for image in images}) == 8
+    assert pool.misses == 1 and pool.hits == 7
+    # The first fill, then one top-up once the buffer ran low
+    assert http.requests == 2
+    assert len(pool.buffers["hug"]) == 10
+
+def test_waiting_commands_share_one_request():
+    async def run():
+        http = HTTP()
+        pool = ImagePool(http, "https://api.test/", size=5, low=0)
+        images = await asyncio.gather(*(pool.get("pat") for _ in range(4)))
+        pool.close()
+        return http, images
+
+    http, images = asyncio.run(run())
+    assert http.requests == 1
+    assert len({image["url"] for image in images}) == 4
+
+def test_failed_refills_are_not_retried_right_away():
+    async def run():
+        http = HTTP(fail=1)
+        pool = ImagePool(http, "https://api.test/", size=5, retry_after=30)
+        try:
+            await pool.get("wave")
+        except OSError:
+            pass
+        pool.top_up("wave")
+        await asyncio.sleep(0)
+        requests = http.requests
+        # A command finding the buffer empty still tries again
+        image = await pool.get("wave")
+        pool.close()
+        return requests, image
+
+    requests, image = asyncio.run(run())
+    assert requests == 1
+    assert image is not None
+
+def test_recently_served_images_are_skipped():
+    pool = ImagePool(None, "", size=3, recent=2)
+    pool.buffers["hug"] = deque([{"url": "a"}, {"url": "b"}])
+    pool.take("hug")
+    pool.take("hug")
+
+    async def fetch(endpoint, amount):
+        return [{"url": "a"}, {"url": "b"}, {"url": "c"}]
+
+    pool.fetch = fetch
+    asyncio.run(pool.refill("hug"))
+    assert [image["url"] for image in pool.buffers["hug"]] == ["c"]
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from utils.modlog import ModLogOutbox
+
+def http_error(cls, status):
+    return cls(SimpleNamespace(status=status, reason="error"), "error")
+
+class Channel:
+    id = 1
+
+    def __init__(self, webhook_errors=()):
+        self.webhook_errors = list(webhook_errors)
+        self.sent = []
+
+    async def webhooks(self):
+        if self.webhook_errors:
+            raise self.webhook_errors.pop(0)
+        return []
+
+    async def create_webhook(self, name):
+        return "webhook"
+
+    async def send(self, embeds):
+        if len(embeds) > 10 or sum(len(embed) for embed in embeds) > 6000:
+            raise http_error(discord.HTTPException, 400)
+        self.sent.append(len(embeds))
+
+def make_outbox(channel):
+    bot = SimpleNamespace(settings=SimpleNamespace(mod_log_channel=lambda guild: channel))
+    return ModLogOutbox(bot, window=0, use_webhooks=False)
+
+def test_batches_stay_under_the_size_limit():
+    async def run():
+        channel = Channel()
+        outbox = make_outbox(channel)
+        guild = SimpleNamespace(id=1)
+        for i in range(12):
+            outbox.enqueue(guild, discord.Embed(description="x" * (3500 if i % 3 == 0 else 100)))
+        await outbox.close()
+        return channel, outbox
+
+    channel, outbox = asyncio.run(run())
+    assert sum(channel.sent) == 12
+    assert outbox.failed == 0
+
+def test_rejected_batch_is_split_and_sent():
+    async def run():
+        channel = Channel()
+        outbox = make_outbox(channel)
+        batch = [(0, discord.Embed(description="y" * 3000)) for _ in range(3)]
+        await outbox.send_batch(SimpleNamespace(id=1), batch)
+        return channel, outbox
+
+    channel, outbox = asyncio.run(run())
+    assert sum(channel.sent) == 3 and outbox.failed == 0
+
+def test_without_a_channel_nothing_counts_as_sent():
+    async def run():
+        outbox = make_outbox(None)
+        await outbox.send_batch(SimpleNamespace(id=1), [(0, discord.Embed(title="t"))])
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.embeds == 0 and outbox.unrouted == 1
+
+def test_webhook_errors_are_only_cached_when_forbidden():
+    async def run():
+        outbox = make_outbox(None)
+        outbox.use_webhooks = True
+        channel = Channel([http_error(discord.HTTPException, 503)])
+        first = await outbox.webhook_for(channel)
+        second = await outbox.webhook_for(channel)
+        forbidden = Channel([http_error(discord.Forbidden, 403)])
+        forbidden.id = 2
+        await outbox.webhook_for(forbidden)
+        return first, second, outbox.webhooks
+
+    first, second, webhooks = asyncio.run(run())
+    assert first is None and second == "webhook"
+    assert webhooks == {1: "webhook", 2: None}
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+from utils.pipeline import ACCOUNTING, MODERATION, MessageContext, MessagePipeline
+
+def message(content, bot=False):
+    return SimpleNamespace(author=SimpleNamespace(bot=bot), guild=None, channel=None, content=content)
+
+def test_stages_run_in_order_and_stop_early():
+    seen = []
+    pipeline = MessagePipeline()
+
+    async def moderate(ctx):
+        seen.append("moderation")
+        return "spam" in ctx.words
+
+    def count(ctx):
+        seen.append("accounting")
+
+    pipeline.register('accounting', ACCOUNTING, count)
+    pipeline.register('moderation', MODERATION, moderate)
+    asyncio.run(pipeline.dispatch(message("Hello there")))
+    asyncio.run(pipeline.dispatch(message("SPAM spam")))
+    asyncio.run(pipeline.dispatch(message("beep", bot=True)))
+    assert seen == ["moderation", "accounting", "moderation"]
+    stats = {stage["stage"]: stage for stage in pipeline.report()}
+    assert stats["moderation"]["stops"] == 1
+    assert stats["bot_filter"]["stops"] == 1
+    assert pipeline.messages == 3
+
+def test_failing_stage_does_not_stop_the_rest():
+    seen = []
+    pipeline = MessagePipeline()
+    pipeline.register('broken', MODERATION, lambda ctx: 1 / 0)
+    pipeline.register('accounting', ACCOUNTING, lambda ctx: seen.append(ctx.content))
+    asyncio.run(pipeline.dispatch(message("hi")))
+    assert seen == ["hi"]
+    assert pipeline.stats['broken'].errors == 1
+
+def test_command_parsing():
+    ctx = MessageContext(message("!Hug  @viv please"), '!')
+    assert ctx.command == "Hug"
+    assert ctx.arguments == "@viv please"
+    assert MessageContext(message("hug"), '!').command is None
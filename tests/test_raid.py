@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from utils.raid import JoinTracker, SlidingWindowCounter, score_account
+
+def test_counter_forgets_values_outside_the_window():
+    counter = SlidingWindowCounter(10)
+    assert counter.add(1, now=0) == 1
+    assert counter.add(2, now=5.5) == 3
+    assert counter.count(now=9.9) == 3
+    # The second-0 bucket fell out, the one from 5 seconds later is still in
+    assert counter.count(now=10) == 2
+    assert counter.count(now=100) == 0
+    assert counter.add(1, now=101) == 1
+
+def test_tracker_drains_risky_joins_still_in_the_window():
+    tracker = JoinTracker(10)
+    tracker.add(1, 4, now=0)
+    tracker.add(2, 0, now=5)
+    assert tracker.add(3, 3, now=12) == (2, 3)
+    assert tracker.drain(min_score=3) == [3]
+    assert tracker.drain(min_score=0) == []
+
+def test_young_accounts_without_avatars_score_highest():
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def member(age, avatar=None):
+        return SimpleNamespace(created_at=now - age, avatar=avatar)
+
+    assert score_account(member(timedelta(minutes=5)), now) == 5
+    assert score_account(member(timedelta(days=1, hours=1), avatar="a"), now) == 2
+    assert score_account(member(timedelta(days=400), avatar="a"), now) == 0
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from utils.scheduler import ExpiryScheduler
+
+def test_timers_fire_in_due_order():
+    async def run():
+        scheduler = ExpiryScheduler()
+        scheduler.start()
+        fired = []
+
+        async def expire(name):
+            fired.append(name)
+
+        now = time.time()
+        scheduler.schedule(('mutes', 1, 2), now + 0.06, expire, "late")
+        scheduler.schedule(('mutes', 1, 3), now + 0.02, expire, "early")
+        # Scheduled after the runner went to sleep, but due first
+        await asyncio.sleep(0.005)
+        scheduler.schedule(('bans', 1, 4), now, expire, "now")
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        return fired, scheduler
+
+    fired, scheduler = asyncio.run(run())
+    assert fired == ["now", "early", "late"]
+    assert len(scheduler) == 0
+
+def test_replaced_and_cancelled_timers_do_not_fire():
+    async def run():
+        scheduler = ExpiryScheduler()
+        scheduler.start()
+        fired = []
+
+        async def expire(name):
+            fired.append(name)
+
+        now = time.time()
+        scheduler.schedule(('mutes', 1, 2), now + 0.01, expire, "replaced")
+        scheduler.schedule(('mutes', 1, 2), now + 0.03, expire, "replacement")
+        scheduler.schedule(('mutes', 1, 3), now + 0.01, expire, "cancelled")
+        assert scheduler.cancel(('mutes', 1, 3))
+        scheduler.schedule(('raids', 1), now + 0.01, expire, "group")
+        scheduler.cancel_group('raids')
+        await asyncio.sleep(0.06)
+        await scheduler.stop()
+        return fired
+
+    assert asyncio.run(run()) == ["replacement"]
+
+def test_failing_callback_does_not_stop_the_runner():
+    async def run():
+        scheduler = ExpiryScheduler()
+        scheduler.start()
+        fired = []
+
+        async def fail():
+            raise RuntimeError("gone")
+
+        async def expire():
+            fired.append(True)
+
+        scheduler.schedule(('mutes', 1), time.time(), fail)
+        scheduler.schedule(('mutes', 2), time.time() + 0.01, expire)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return fired
+
+    assert asyncio.run(run()) == [True]
+
+def test_heap_is_compacted_under_churn():
+    scheduler = ExpiryScheduler()
+    for i in range(1000):
+        scheduler.schedule(('mutes', 1), 10_000 + i, None)
+    scheduler.cancel(('mutes', 1))
+    assert len(scheduler.heap) <= 64
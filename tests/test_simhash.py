@@ -0,0 +1,82 @@
+import asyncio
+import random
+from types import SimpleNamespace
+from cogs.spam_filter import SpamFilter
+from utils.simhash import MASK, SHINGLE, SimHashIndex, normalize, simhash
+
+def reference_simhash(text):
+    """The textbook version: one counter per bit"""
+    text = normalize(text)
+    features = {hash(text[i:i + SHINGLE]) & MASK for i in range(len(text) - SHINGLE + 1)}
+    counts = [sum(feature >> bit & 1 for feature in features) for bit in range(64)]
+    return sum(1 << bit for bit, count in enumerate(counts) if count > len(features) // 2)
+
+def test_matches_the_per_bit_majority():
+    rng = random.Random(4)
+    for _ in range(200):
+        text = "".join(rng.choice("abcdefgh ") for _ in range(rng.randint(16, 300)))
+        if simhash(text) is not None:
+            assert simhash(text) == reference_simhash(text)
+
+def test_short_messages_are_not_fingerprinted():
+    assert simhash("good morning!!") is None
+    assert simhash("Good morning, everyone!!") == simhash("good morning everyone")
+
+def test_index_finds_near_duplicates_only():
+    index = SimHashIndex(window=30, distance=3)
+    fingerprint = 0x0123456789ABCDEF
+    assert index.add(fingerprint, "first", now=0) == []
+    # Three flipped bits, spread over different bands
+    assert index.add(fingerprint ^ (1 | 1 << 20 | 1 << 63), "close", now=1) == ["first"]
+    assert index.add(fingerprint ^ 0xF, "far", now=2) == []
+    assert index.match(fingerprint, now=3)
+    assert not index.match(fingerprint ^ 0xFF00, now=3)
+
+def test_index_expires_old_entries():
+    index = SimHashIndex(window=30)
+    index.add(42, "old", now=0)
+    assert index.add(42, "new", now=31) == []
+    assert len(index) == 1
+
+class Channel:
+    id = 10
+
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_messages(self, messages, reason=None):
+        self.deleted.extend(message.id for message in messages)
+
+class Mute:
+    def __init__(self):
+        self.muted = []
+
+    async def mute_members(self, guild, members, moderator, duration, reason):
+        self.muted.extend(member.id for member in members)
+        return [member.id for member in members], []
+
+def remove_spam(guild_settings):
+    channel = Channel()
+    mute = Mute()
+    members = {user_id: SimpleNamespace(id=user_id, roles=[], guild_permissions=SimpleNamespace(manage_messages=False))
+               for user_id in (1, 2, 3, 4)}
+    guild = SimpleNamespace(id=5, name="guild", me=None, get_member=members.get, get_channel=lambda _: channel)
+    bot = SimpleNamespace(
+        get_cog=lambda name: mute,
+        settings=SimpleNamespace(muted_role=lambda guild: None),
+        modlog=SimpleNamespace(enqueue=lambda guild, embed: None)
+    )
+    cog = SpamFilter(bot)
+    cog.guild_settings = guild_settings
+    asyncio.run(cog.remove_spam(guild, {channel.id: {100 + user_id: user_id for user_id in members}}))
+    return channel, mute
+
+def test_spam_is_only_deleted_by_default():
+    channel, mute = remove_spam({})
+    assert sorted(channel.deleted) == [101, 102, 103, 104]
+    assert mute.muted == []
+
+def test_spam_authors_are_muted_when_configured():
+    channel, mute = remove_spam({"5": {"action": "mute"}})
+    assert len(channel.deleted) == 4
+    assert sorted(mute.muted) == [1, 2, 3, 4]
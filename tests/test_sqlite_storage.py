@@ -0,0 +1,70 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from utils.sqlite_storage import SCHEMA_VERSION, SQLiteStorage
+from utils.storage import JsonStorage
+from utils.time_parser import to_timestamp
+
+# The first schema: users and counters keyed by user only, str(datetime) dates
+VERSION_1 = """
+CREATE TABLE users (user_id TEXT PRIMARY KEY, join_date TEXT, last_seen TEXT);
+CREATE TABLE counters (user_id TEXT, name TEXT, value NUMERIC, PRIMARY KEY (user_id, name));
+CREATE TABLE actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id TEXT, user_id TEXT, type TEXT,
+    category TEXT, moderator_id INTEGER, timestamp TEXT, details TEXT
+);
+CREATE INDEX idx_actions_user ON actions (user_id);
+"""
+
+def test_version_1_database_is_upgraded(tmp_path):
+    filename = str(tmp_path / "user_logs.db")
+    joined = datetime(2024, 1, 2, 3, 4, 5)
+    expires = datetime.now() + timedelta(days=1)
+    conn = sqlite3.connect(filename)
+    conn.executescript(VERSION_1)
+    conn.execute("INSERT INTO users VALUES ('5', ?, ?)", (str(joined), str(joined)))
+    conn.execute("INSERT INTO counters VALUES ('5', 'messages', 12)")
+    conn.execute(
+        "INSERT INTO actions (guild_id, user_id, type, category, moderator_id, timestamp, details) "
+        "VALUES (NULL, '5', 'mute', 'mutes', 7, ?, ?)",
+        (str(joined), json.dumps({"moderator": 7, "expires_at": str(expires)}))
+    )
+    conn.commit()
+    conn.close()
+
+    storage = SQLiteStorage(filename, default_guild_id=99)
+    assert storage.write_conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    user = storage.load_user("99", "5")
+    assert user.join_date == to_timestamp(str(joined))
+    assert user.messages == 12
+    [action] = storage.get_actions("99", "5")
+    assert action.timestamp == to_timestamp(str(joined))
+    assert action.details["expires_at"] == to_timestamp(str(expires))
+    # There was no sanctions table, it's rebuilt from the log
+    assert storage.active_sanctions() == [("99", "5", "mutes", to_timestamp(str(expires)))]
+    storage.close()
+
+    # Opening an up to date database changes nothing
+    storage = SQLiteStorage(filename, default_guild_id=99)
+    assert storage.load_user("99", "5").messages == 12
+    storage.close()
+
+def test_json_guild_directory_is_imported(tmp_path):
+    source = JsonStorage(str(tmp_path / "guilds"))
+    expires = to_timestamp(str(datetime.now() + timedelta(hours=1)))
+    source.apply([
+        {"op": "incr", "guild": "1", "user": "5", "at": 100, "field": "messages", "amount": 3},
+        {"op": "action", "guild": "1", "user": "5", "at": 200, "type": "warning", "details": {"moderator": 7}},
+        {"op": "action", "guild": "2", "user": "6", "at": 300, "type": "mute",
+         "details": {"moderator": 7, "expires_at": expires}}
+    ])
+    source.close()
+
+    storage = SQLiteStorage(str(tmp_path / "user_logs.db"))
+    assert storage.is_empty()
+    assert storage.import_json(str(tmp_path / "guilds")) == 2
+    assert storage.load_user("1", "5").messages == 3
+    assert storage.count_actions("1", "5")["warnings"] == 1
+    assert [user_id for user_id, _ in storage.query_actions("2", moderator_id=7)] == ["6"]
+    assert storage.active_sanctions() == [("2", "6", "mutes", expires)]
+    storage.close()
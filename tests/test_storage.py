@@ -0,0 +1,83 @@
+import random
+from utils.records import ActionRecord
+from utils.storage import ActionIndex, JsonPartition
+
+TYPES = ("warning", "kick", "ban", "mute", "note")
+
+def make_actions(count=2000, seed=9):
+    rng = random.Random(seed)
+    actions = {}
+    for i in range(count):
+        action = ActionRecord(rng.choice(TYPES), i * 3600 + rng.randrange(60), {"moderator": rng.randrange(5)})
+        actions.setdefault(str(rng.randrange(50)), []).append(action)
+    return actions
+
+def brute_force(actions, category=None, moderator_id=None, since=None, limit=None):
+    entries = sorted(
+        ((user_id, action) for user_id, user_actions in actions.items() for action in user_actions),
+        key=lambda entry: entry[1].timestamp, reverse=True
+    )
+    results = [
+        entry for entry in entries
+        if (category is None or entry[1].category == category)
+        and (moderator_id is None or entry[1].details['moderator'] == moderator_id)
+        and (since is None or entry[1].timestamp >= since)
+    ]
+    return results[:limit] if limit else results
+
+def test_index_queries_match_a_scan():
+    actions = make_actions()
+    index = ActionIndex.build(actions)
+    for category in (None, "bans"):
+        for moderator_id in (None, 2):
+            for since in (None, 500 * 3600 + 30, 1999 * 3600):
+                for limit in (None, 1, 25):
+                    assert index.query(category, moderator_id, since, limit) == \
+                        brute_force(actions, category, moderator_id, since, limit)
+
+def test_unfiltered_query_only_touches_recent_days():
+    index = ActionIndex.build(make_actions())
+    newest_day = max(index.by_day)
+    # Days that the limit doesn't reach can't be read at all
+    for day in list(index.by_day):
+        if day < newest_day - 1:
+            index.by_day[day] = None
+    assert len(index.query(limit=10)) == 10
+
+def action_record(user_id, kind, at):
+    return {"op": "action", "user": user_id, "at": at, "type": kind, "details": {"moderator": 7}}
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    filename = str(tmp_path / "1.json")
+    partition = JsonPartition(filename)
+    partition.apply([{"op": "incr", "user": "5", "at": 100, "field": "messages", "amount": 3}])
+    partition.apply([action_record("5", "warning", 200)])
+    # No close(), the snapshot was never written
+    reopened = JsonPartition(filename)
+    assert reopened.load_user("5").messages == 3
+    assert [a.type for a in reopened.get_actions("5")] == ["warning"]
+    assert reopened.query_actions(moderator_id=7) == [("5", reopened.get_actions("5")[0])]
+
+def test_torn_journal_line_is_dropped(tmp_path):
+    filename = str(tmp_path / "1.json")
+    partition = JsonPartition(filename)
+    partition.apply([action_record("5", "warning", 200)])
+    with open(partition.journal_filename, 'a') as f:
+        f.write('{"seq": 2, "op": "act')
+    reopened = JsonPartition(filename)
+    assert len(reopened.get_actions("5")) == 1
+    reopened.apply([action_record("5", "kick", 300)])
+    assert [a.type for a in JsonPartition(filename).get_actions("5")] == ["warning", "kick"]
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path):
+    filename = str(tmp_path / "1.json")
+    partition = JsonPartition(filename, compact_every=3)
+    for i in range(4):
+        partition.apply([action_record("5", "warning", 100 + i)])
+    # The fourth record went to a fresh journal after the compaction
+    assert partition.journal_records == 1
+    with open(partition.journal_filename) as f:
+        assert len(f.readlines()) == 1
+    reopened = JsonPartition(filename)
+    assert len(reopened.get_actions("5")) == 4
+    assert reopened.seq == 4
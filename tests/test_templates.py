@@ -0,0 +1,28 @@
+from utils.templates import Template, case_conflicts, compile_commands
+
+def test_placeholders_and_arguments_are_filled_in():
+    template = Template("{user} hugs {mention} in {channel} ({count}) {1}/{3}")
+    values = {"user": "<@1>", "mention": "<@2>", "channel": "#general", "count": "7"}
+    assert template.render(values, ["a", "b"]) == "<@1> hugs <@2> in #general (7) a/"
+    assert template.needs_target and template.needs_count
+
+def test_unknown_braces_are_kept():
+    template = Template("{\"json\": {nope}} {user.name}")
+    assert template.render({"user.name": "viv"}, []) == "{\"json\": {nope}} viv"
+    assert not template.needs_target and not template.needs_count
+
+def test_aliases_and_names_dispatch_case_insensitively():
+    table = compile_commands({"Hello": {"response": "hi", "aliases": ["hey"]}})
+    assert table["hello"] is table["hey"]
+    assert table["hello"].name == "Hello"
+
+def test_recompiling_keeps_running_cooldowns():
+    commands = {"hug": {"response": "{user}", "cooldown": 10}}
+    table = compile_commands(commands)
+    assert table["hug"].use_cooldown(1, now=100) == 0
+    table = compile_commands(commands, previous=table)
+    assert table["hug"].use_cooldown(1, now=104) == 6
+    assert table["hug"].use_cooldown(1, now=110) == 0
+
+def test_case_conflicts():
+    assert case_conflicts({"Hug": {}, "hug": {}, "pat": {}}) == [["Hug", "hug"]]
@@ -0,0 +1,50 @@
+import json
+from types import SimpleNamespace
+from utils.wordfilter import Automaton, TermFilter, fold, parse_term
+from cogs.word_filter import WordFilter
+
+def test_fold_undoes_accents_fullwidth_and_leetspeak():
+    assert fold("Héllo") == "hello"
+    assert fold("ｈｅｌｌｏ") == "hello"
+    assert fold("h3ll0") == "hello"
+
+def test_parse_term_wildcards():
+    assert parse_term("word*") == ("word", False, True)
+    assert parse_term("*word") == ("word", True, False)
+
+def test_automaton_respects_word_boundaries():
+    automaton = Automaton({"ass", "bad word", "scam*"})
+    assert automaton.scan(fold("class is fine")) == []
+    assert automaton.scan(fold("what an ass")) == ["ass"]
+    assert automaton.scan(fold("a bad word here")) == ["bad word"]
+    assert automaton.scan(fold("scammers everywhere")) == ["scam*"]
+
+def test_term_filter_tracks_additions_and_removals():
+    term_filter = TermFilter(["foo", "bar"], max_delta=4)
+    assert term_filter.add("baz")
+    assert not term_filter.add("baz")
+    assert term_filter.remove("foo")
+    assert term_filter.find("foo bar baz") == ["bar", "baz"]
+
+def test_large_batch_waits_for_rebuild_then_matches():
+    term_filter = TermFilter(max_delta=4)
+    terms = [f"term{i}x" for i in range(10)]
+    assert term_filter.add_many(terms) == 10
+    assert term_filter.needs_rebuild
+    # Removing an added term before the rebuild must not leave it matching
+    term_filter.remove_many(["term0x"])
+    assert "term0x" not in term_filter.find("term0x")
+    term_filter.install(Automaton(set(term_filter.terms)), set(term_filter.terms))
+    assert not term_filter.needs_rebuild
+    assert term_filter.find("term5x term0x") == ["term5x"]
+
+def test_removing_the_last_term_is_saved(tmp_path):
+    terms_file = tmp_path / "banned_terms.json"
+    terms_file.write_text(json.dumps({"1": {"terms": ["foo"], "action": "mute"}}))
+    cog = WordFilter(SimpleNamespace(db=None))
+    cog.terms_file = str(terms_file)
+    cog.guild_settings, cog.filters = cog.load_terms()
+
+    cog.filters[1].remove("foo")
+    del cog.filters[1]
+    assert cog.writer.snapshot() == {"1": {"action": "mute"}}
@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import logging
+import threading
+from datetime import datetime, timezone
+from utils.atomic_io import atomic_write_json
+from utils.records import ActionRecord, CATEGORIES
+
+class ActionArchive:
+    """Cold storage for old actions: append-only gzip segments per guild
+
+    Each guild has a directory of monthly segments (YYYY-MM.jsonl.gz, named
+    after when the actions were archived) holding one [user_id, type,
+    timestamp, details] row per line. Every append adds a new gzip member,
+    so existing data is never rewritten. A small counts.json per guild keeps
+    per-user category totals so statistics don't need to read segments.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.logger = logging.getLogger('ActionArchive')
+        self.counts = {}
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def guild_directory(self, guild_id):
+        return os.path.join(self.directory, str(guild_id))
+
+    def segments(self, guild_id):
+        directory = self.guild_directory(guild_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.jsonl.gz')
+        )
+
+    def append(self, guild_id, entries):
+        """Append (user_id, ActionRecord) pairs to the guild's current segment"""
+        if not entries:
+            return
+        directory = self.guild_directory(guild_id)
+        os.makedirs(directory, exist_ok=True)
+        segment = os.path.join(directory, datetime.now(timezone.utc).strftime('%Y-%m') + '.jsonl.gz')
+        lines = ''.join(
+            json.dumps([user_id, *action.to_row()], separators=(',', ':')) + '\n'
+            for user_id, action in entries
+        )
+        with open(segment, 'ab') as f:
+            f.write(gzip.compress(lines.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            counts = self.guild_counts(guild_id)
+            for user_id, action in entries:
+                if action.category:
+                    user_counts = counts.setdefault(user_id, {})
+                    user_counts[action.category] = user_counts.get(action.category, 0) + 1
+            atomic_write_json(os.path.join(directory, 'counts.json'), counts)
+        self.logger.info(f"Archived {len(entries)} actions for guild {guild_id}")
+
+    def guild_counts(self, guild_id):
+        guild_id = str(guild_id)
+        with self._lock:
+            if guild_id not in self.counts:
+                filename = os.path.join(self.guild_directory(guild_id), 'counts.json')
+                counts = {}
+                if os.path.exists(filename):
+                    with open(filename, 'r') as f:
+                        counts = json.load(f)
+                self.counts[guild_id] = counts
+            return self.counts[guild_id]
+
+    def count_actions(self, guild_id, user_id):
+        """Return the number of archived actions per category for a user"""
+        user_counts = self.guild_counts(guild_id).get(str(user_id), {})
+        return {category: user_counts.get(category, 0) for category in CATEGORIES}
+
+    def iter_actions(self, guild_id, user_id):
+        """Stream a user's archived ActionRecords, oldest segment first"""
+        user_id = str(user_id)
+        for segment in self.segments(guild_id):
+            with gzip.open(segment, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row[0] == user_id:
+                        yield ActionRecord.from_row(row[1:])
@@ -0,0 +1,73 @@
+import json
+import os
+import asyncio
+import logging
+
+def atomic_write(filename, data):
+    """Write to a temp file, fsync it and rename it over the target
+
+    Readers (and a restart after a crash) see either the old or the new
+    file, never a half-written one.
+    """
+    directory = os.path.dirname(filename) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_filename = filename + '.tmp'
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with open(tmp_filename, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def atomic_write_json(filename, obj, indent=None):
+    """Write JSON atomically, minified unless an indent is given"""
+    separators = (',', ':') if indent is None else None
+    atomic_write(filename, json.dumps(obj, indent=indent, separators=separators))
+
+class SnapshotWriter:
+    """Saves the latest state of an object from a worker thread
+
+    request_save() returns immediately. While a write is running, further
+    requests are folded into a single follow-up write of whatever the state
+    is by then, so bursts of changes cost at most two writes.
+    """
+
+    def __init__(self, filename, snapshot, indent=None):
+        self.filename = filename
+        # Called on the event loop, must return a copy that is safe to
+        # serialize while the original keeps changing
+        self.snapshot = snapshot
+        self.indent = indent
+        self.logger = logging.getLogger('SnapshotWriter')
+        self._dirty = False
+        self._task = None
+
+    def request_save(self):
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while self._dirty:
+            self._dirty = False
+            state = self.snapshot()
+            try:
+                await asyncio.to_thread(atomic_write_json, self.filename, state, self.indent)
+            except Exception as e:
+                self.logger.error(f"Failed to write {self.filename}: {str(e)}")
+
+    async def close(self):
+        """Wait for outstanding writes to finish"""
+        if self._task is not None:
+            await self._task
+            self._task = None
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import re
+
+MENTION_PATTERN = re.compile(r'^(?:<@!?(\d+)>|(\d{15,20}))$')
+
+def normalize_name(name):
+    """Case-insensitive form of a user name, without a legacy #discriminator"""
+    name = name.strip().lstrip('@')
+    if re.search(r'#\d{1,4}$', name):
+        name = name.rsplit('#', 1)[0]
+    return name.casefold()
+
+class BanCache:
+    """Per-guild ban lists indexed by user ID and by normalized name
+
+    A guild's list is downloaded once, on first use, and then kept current
+    from on_member_ban / on_member_unban, so lookups never hit the API.
+    Both the username and the display name are indexed.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('BanCache')
+        # guild_id -> {user_id: User}
+        self.bans = {}
+        # guild_id -> {normalized name: {user_id}}
+        self.names = {}
+        self._loading = {}
+        # guild_id -> bans and unbans seen while the guild's list downloads
+        self._events = {}
+
+    async def load(self, guild):
+        """Make sure the guild's ban list is cached"""
+        task = self._loading.get(guild.id)
+        if task is None:
+            if guild.id in self.bans:
+                return
+            task = self._loading[guild.id] = asyncio.create_task(self._fetch(guild))
+        try:
+            await asyncio.shield(task)
+        finally:
+            if task.done() and self._loading.get(guild.id) is task:
+                del self._loading[guild.id]
+
+    async def _fetch(self, guild):
+        bans, names = {}, {}
+        self._events[guild.id] = []
+        try:
+            async for entry in guild.bans(limit=None):
+                self.index(bans, names, entry.user)
+        finally:
+            # A half-read list would hide bans, nothing is kept if this fails
+            events = self._events.pop(guild.id)
+        # Only the complete list is published, then what happened meanwhile
+        self.bans[guild.id] = bans
+        self.names[guild.id] = names
+        for event, user in events:
+            event(guild.id, user)
+        self.logger.info(f"Cached {len(bans)} bans for {guild.id}")
+
+    def names_of(self, user):
+        return {normalize_name(name) for name in (user.name, user.global_name) if name}
+
+    def index(self, bans, names, user):
+        bans[user.id] = user
+        for name in self.names_of(user):
+            names.setdefault(name, set()).add(user.id)
+
+    def add(self, guild_id, user):
+        events = self._events.get(guild_id)
+        if events is not None:
+            events.append((self.add, user))
+            return
+        if guild_id not in self.bans:
+            return
+        self.index(self.bans[guild_id], self.names[guild_id], user)
+
+    def remove(self, guild_id, user):
+        events = self._events.get(guild_id)
+        if events is not None:
+            events.append((self.remove, user))
+            return
+        if guild_id not in self.bans:
+            return
+        cached = self.bans[guild_id].pop(user.id, None)
+        for name in self.names_of(cached or user):
+            ids = self.names[guild_id].get(name)
+            if ids:
+                ids.discard(user.id)
+                if not ids:
+                    del self.names[guild_id][name]
+
+    async def find(self, guild, query):
+        """Return the banned users matching an ID, mention or name"""
+        await self.load(guild)
+        match = MENTION_PATTERN.match(query.strip())
+        if match:
+            user = self.bans[guild.id].get(int(match.group(1) or match.group(2)))
+            return [user] if user else []
+        ids = self.names[guild.id].get(normalize_name(query), ())
+        return [self.bans[guild.id][user_id] for user_id in ids]
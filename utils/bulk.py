@@ -0,0 +1,103 @@
+import asyncio
+import re
+import discord
+from datetime import datetime, timedelta, timezone
+from utils.time_parser import parse_time, format_duration
+
+USER_PATTERN = re.compile(r'^(?:<@!?(\d+)>|(\d{15,20}))$')
+
+def parse_bulk_args(guild, args):
+    """Split bulk command arguments into (user_ids, duration_seconds, reason)
+
+    Targets come first: mentions, raw user IDs and `joined:<time>`, which
+    selects every member who joined within that time (e.g. joined:10m).
+    `for:<time>` sets a duration. Everything from the first other word on
+    is the reason.
+    """
+    user_ids = []
+    duration = None
+    reason = []
+    for i, arg in enumerate(args):
+        match = USER_PATTERN.match(arg)
+        if match:
+            user_ids.append(int(match.group(1) or match.group(2)))
+        elif arg.lower().startswith('joined:'):
+            since = datetime.now(timezone.utc) - timedelta(seconds=parse_time(arg[7:]))
+            user_ids.extend(
+                member.id for member in guild.members
+                if member.joined_at and member.joined_at >= since and not member.bot
+            )
+        elif arg.lower().startswith('for:'):
+            duration = parse_time(arg[4:])
+        else:
+            reason = args[i:]
+            break
+    # Keep the order, drop repeats
+    return list(dict.fromkeys(user_ids)), duration, ' '.join(reason) or None
+
+async def run_bulk(items, action, concurrency=5):
+    """Await `action(item)` for every item, `concurrency` at a time
+
+    Returns (succeeded, failed) lists of items; a Discord error fails only
+    its own item.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    succeeded, failed = [], []
+
+    async def run(item):
+        async with semaphore:
+            try:
+                await action(item)
+                succeeded.append(item)
+            except discord.HTTPException:
+                failed.append(item)
+
+    await asyncio.gather(*(run(item) for item in items))
+    return succeeded, failed
+
+def summarize_users(user_ids, limit=4000):
+    """Mentions for an embed description, cut off to stay under Discord's limit"""
+    text = ""
+    for i, user_id in enumerate(user_ids):
+        mention = f"<@{user_id}> "
+        if len(text) + len(mention) > limit:
+            return text + f"and {len(user_ids) - i} more"
+        text += mention
+    return text
+
+def filter_targets(ctx, user_ids, members_only=False):
+    """Drop targets the command's author can't act on
+
+    Returns (targets, skipped): members, or discord.Object for users who
+    aren't in the guild unless `members_only`, and the skipped IDs.
+    """
+    targets, skipped = [], []
+    for user_id in user_ids:
+        member = ctx.guild.get_member(user_id)
+        if member is None:
+            if members_only:
+                skipped.append(user_id)
+            else:
+                targets.append(discord.Object(id=user_id))
+        elif member == ctx.author or member == ctx.guild.me or member.top_role >= ctx.author.top_role:
+            skipped.append(user_id)
+        else:
+            targets.append(member)
+    return targets, skipped
+
+def bulk_summary(ctx, title, color, succeeded, failed, skipped, reason, duration=None):
+    """One mod-log embed for a whole bulk action"""
+    embed = discord.Embed(
+        title=title,
+        description=summarize_users(succeeded) or None,
+        color=color,
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="Moderator", value=f"{ctx.author.mention} ({ctx.author.name})", inline=False)
+    if duration is not None:
+        embed.add_field(name="Duration", value=format_duration(duration), inline=False)
+    embed.add_field(name="Reason", value=reason or "No reason provided", inline=False)
+    embed.add_field(name="Done", value=str(len(succeeded)), inline=True)
+    embed.add_field(name="Failed", value=str(len(failed)), inline=True)
+    embed.add_field(name="Skipped", value=str(len(skipped)), inline=True)
+    return embed
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+class WriteBackCache:
+    """Size-bounded LRU cache that tracks modified entries
+
+    Entries marked dirty are handed to `write_back(key, value)` when they
+    are evicted, or when flush_dirty() is called, so changes made while an
+    entry was cached are never lost.
+    """
+
+    def __init__(self, capacity, write_back):
+        self.capacity = capacity
+        self.write_back = write_back
+        self.entries = OrderedDict()
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_backs = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return a cached value (marking it recently used) or None"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, dirty=False):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if dirty:
+            self.dirty.add(key)
+        while len(self.entries) > self.capacity:
+            old_key, old_value = self.entries.popitem(last=False)
+            self.evictions += 1
+            if old_key in self.dirty:
+                self.dirty.discard(old_key)
+                self._write_back(old_key, old_value)
+
+    def mark_dirty(self, key):
+        self.dirty.add(key)
+
+    def flush_dirty(self):
+        """Write back every dirty entry, keeping them cached"""
+        for key in self.dirty:
+            self._write_back(key, self.entries[key])
+        self.dirty.clear()
+
+    def _write_back(self, key, value):
+        self.write_backs += 1
+        self.write_back(key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "dirty": len(self.dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "write_backs": self.write_backs
+        }
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import discord
+from datetime import datetime
+from utils.bulk import summarize_users
+
+LIFTED, ALREADY_LIFTED, FAILED = "lifted", "already lifted", "failed"
+
+async def catch_up_sanctions(bot, overdue, lift, category, action_type, title, send_log, concurrency=5):
+    """Lift sanctions that expired while the bot was offline
+
+    `overdue` holds (guild_id, user_id) pairs and `lift(guild, user_id)` is
+    the cog's coroutine doing the Discord side, returning True once lifted
+    or False if there was nothing left to lift. All guilds share one
+    semaphore so a large backlog doesn't flood Discord's rate limits; the
+    results are written to the database in one batch and every guild gets
+    a single summary in its mod-log instead of one embed per user.
+    """
+    await bot.wait_until_ready()
+    logger = logging.getLogger('CatchUp')
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(guild, user_id):
+        async with semaphore:
+            try:
+                return guild, user_id, LIFTED if await lift(guild, user_id) else ALREADY_LIFTED
+            except discord.HTTPException as e:
+                logger.error(f"Failed to lift {category} of {user_id} in {guild.id}: {e}")
+                return guild, user_id, FAILED
+
+    jobs = []
+    for guild_id, user_id in overdue:
+        guild = bot.get_guild(guild_id)
+        if guild:
+            jobs.append(run(guild, user_id))
+    if not jobs:
+        return
+
+    by_guild = {}
+    for guild, user_id, outcome in await asyncio.gather(*jobs):
+        by_guild.setdefault(guild, {}).setdefault(outcome, []).append(user_id)
+
+    # No awaits between these calls, so the flusher picks them all up as one write
+    for guild, outcomes in by_guild.items():
+        for user_id in outcomes.get(LIFTED, []):
+            bot.db.log_action(
+                guild.id,
+                user_id,
+                action_type,
+                {
+                    "reason": "Temporary sanction expired while offline",
+                    "moderator": bot.user.id,
+                    "moderator_name": str(bot.user)
+                }
+            )
+        for user_id in outcomes.get(ALREADY_LIFTED, []):
+            bot.db.lift_sanction(guild.id, user_id, category)
+    await bot.db.flush()
+
+    for guild, outcomes in by_guild.items():
+        lifted = outcomes.get(LIFTED, [])
+        embed = discord.Embed(
+            title=f"{title} (Catch-up)",
+            description=summarize_users(lifted) if lifted else None,
+            color=discord.Color.green(),
+            timestamp=datetime.utcnow()
+        )
+        for outcome in (LIFTED, ALREADY_LIFTED, FAILED):
+            embed.add_field(name=outcome.capitalize(), value=str(len(outcomes.get(outcome, []))), inline=True)
+        await send_log(guild, embed)
+        logger.info(f"Caught up on {sum(map(len, outcomes.values()))} expired {category} in {guild.id}")
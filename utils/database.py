@@ -1,77 +1,310 @@
-import json
-import os
-from datetime import datetime
+import asyncio
 import logging
+import time
+from utils.records import UserRecord, ActionRecord, CATEGORY_MAPPING
+from utils.cache import WriteBackCache
+from utils.storage import update_sanctions
+from utils.time_parser import timestamp_now
 
 class Database:
-    def __init__(self, filename):
-        self.filename = filename
+    def __init__(self, storage, flush_interval=5.0, max_pending=500, cache_size=10000,
+                 archive=None, retention_days=90, archive_interval=6 * 3600):
+        self.storage = storage
         self.logger = logging.getLogger('Database')
-        # Create the directory if it doesn't exist
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        self.data = self.load_data()
-    
-    def load_data(self):
-        try:
-            if os.path.exists(self.filename):
-                with open(self.filename, 'r') as f:
-                    return json.load(f)
-        except json.JSONDecodeError:
-            self.logger.error(f"Failed to parse {self.filename}")
-            pass
-        return {}
-    
-    def save_data(self):
+        # Write-behind settings: persist at most once per flush_interval
+        # seconds, or sooner once max_pending changes have piled up
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending_records = []
+        self.flushing_records = []
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self._flush_event = None
+        self._flush_task = None
+        # Hot user profiles keyed by (guild_id, user_id); counter updates only
+        # touch the cached copy and are written back on eviction or flush
+        self.users = WriteBackCache(cache_size, self.write_back_user)
+        # Latest written-back profile per key until the storage engine has it
+        self.unsaved_users = {}
+        # Retention: actions older than retention_days move to the archive,
+        # checked every archive_interval seconds by the flusher
+        self.archive = archive
+        self.retention_days = retention_days
+        self.archive_interval = archive_interval
+        self.last_archived = time.monotonic()
+        # guild_id -> task loading the guild's data in a worker thread
+        self._loading = {}
+
+    @property
+    def pending_changes(self):
+        return len(self.pending_records) + len(self.users.dirty)
+
+    @property
+    def unsaved_records(self):
+        # Records being written by the flusher stay visible to reads until the write lands
+        return self.flushing_records + self.pending_records
+
+    def queue(self, op, guild_id, user_id, **fields):
+        self.pending_records.append({
+            "op": op,
+            "guild": str(guild_id),
+            "user": str(user_id),
+            "at": timestamp_now(),
+            **fields
+        })
+
+    def changed(self):
+        if self._flush_task is None:
+            # No flusher running (e.g. used outside the bot), write straight away
+            self.flush_now()
+        elif self.pending_changes >= self.max_pending:
+            self._flush_event.set()
+
+    def record(self, op, guild_id, user_id, **fields):
+        """Queue a change for the storage engine"""
+        self.queue(op, guild_id, user_id, **fields)
+        self.changed()
+
+    def write_back_user(self, key, user_data):
+        row = user_data.to_row()
+        self.unsaved_users[key] = row
+        self.queue("put", *key, data=row)
+
+    def saved(self, records):
+        for record in records:
+            key = (record['guild'], record['user'])
+            if record['op'] == 'put' and self.unsaved_users.get(key) is record['data']:
+                del self.unsaved_users[key]
+
+    def take_pending(self):
+        self.users.flush_dirty()
+        records, self.pending_records = self.pending_records, []
+        return records
+
+    def flush_now(self):
+        """Hand queued changes to the storage engine on the calling thread"""
+        records = self.take_pending()
+        if not records:
+            return
         try:
-            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
-            with open(self.filename, 'w') as f:
-                json.dump(self.data, f, indent=4)
+            self.storage.apply(records)
+            self.saved(records)
         except Exception as e:
+            self.pending_records[:0] = records
             self.logger.error(f"Failed to save data: {str(e)}")
-    
-    def ensure_user_data(self, user_id):
-        """Ensure user entry exists with all required fields"""
-        user_id = str(user_id)
-        if user_id not in self.data:
-            self.data[user_id] = {
-                "warnings": [],
-                "kicks": [],
-                "bans": [],
-                "mutes": [],
-                "messages": 0,
-                "message_deletes": 0,
-                "voice_time": 0,
-                "join_date": str(datetime.utcnow()),
-                "last_seen": str(datetime.utcnow()),
-                "action_history": []
-            }
-        return self.data[user_id]
-    
-    def log_action(self, user_id, action_type, details):
-        """Log an action with proper user data initialization"""
-        user_data = self.ensure_user_data(user_id)
-        
-        # Add to specific category array
-        category_mapping = {
-            "warnings": "warnings",
-            "warning": "warnings",
-            "kick": "kicks",
-            "ban": "bans",
-            "mute": "mutes"
-        }
-        
-        if action_type in category_mapping:
-            category = category_mapping[action_type]
-            if category not in user_data:
-                user_data[category] = []
-            user_data[category].append(details.copy())
-        
-        # Add to general action history
-        action_entry = {
-            "type": action_type,
-            "details": details.copy(),
-            "timestamp": str(datetime.utcnow())
-        }
-        user_data["action_history"].append(action_entry)
-        
-        self.save_data()
\ No newline at end of file
+
+    async def flush(self):
+        """Hand queued changes to the storage engine from a worker thread"""
+        async with self._flush_lock:
+            self.flushing_records = self.take_pending()
+            if not self.flushing_records:
+                return
+            try:
+                await asyncio.to_thread(self.storage.apply, self.flushing_records)
+                self.saved(self.flushing_records)
+            except Exception as e:
+                self.pending_records[:0] = self.flushing_records
+                self.logger.error(f"Failed to save data: {str(e)}")
+            finally:
+                self.flushing_records = []
+
+    async def start(self):
+        """Start the background flusher"""
+        if self._flush_task is None:
+            self._closing = False
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            # One failing round is logged, the flusher has to keep running
+            try:
+                await self.flush()
+                async with self._flush_lock:
+                    await asyncio.to_thread(self.storage.maintain)
+                    if self.archive and time.monotonic() - self.last_archived >= self.archive_interval:
+                        self.last_archived = time.monotonic()
+                        try:
+                            await asyncio.to_thread(self.archive_old_actions)
+                        except Exception as e:
+                            self.logger.error(f"Failed to archive actions: {str(e)}")
+            except Exception as e:
+                self.logger.error(f"Background flush failed: {str(e)}")
+
+    def archive_old_actions(self):
+        """Move actions past the retention period into the archive
+
+        Runs in the flusher thread. Sanctions that have not expired yet stay
+        in the hot store so the Mute and Moderation cogs still see them.
+        """
+        now = timestamp_now()
+        cutoff = now - self.retention_days * 86400
+        for guild_id in self.storage.guild_ids():
+            entries = self.storage.archivable_actions(guild_id, cutoff, now)
+            if not entries:
+                continue
+            self.archive.append(guild_id, entries)
+            self.storage.apply([{"op": "trim", "guild": guild_id, "user": None, "at": now, "before": cutoff}])
+
+    async def close(self):
+        """Stop the background flusher and write any outstanding changes"""
+        if self._flush_task is not None:
+            # Let a write that is already running in its thread finish
+            # rather than cancelling it halfway through
+            self._closing = True
+            self._flush_event.set()
+            try:
+                await self._flush_task
+            except Exception as e:
+                # Whatever stopped it, the final flush below still has to run
+                self.logger.error(f"Background flusher failed: {str(e)}")
+            self._flush_task = None
+            self._flush_event = None
+        await self.flush()
+        await asyncio.to_thread(self.storage.close)
+
+    async def ensure_loaded(self, guild_id):
+        """Load a guild's stored data in a worker thread unless it's in memory already
+
+        Await this before reading or counting for a guild on the event loop,
+        otherwise a guild the storage engine unloaded is read from disk
+        right there.
+        """
+        guild_id = str(guild_id)
+        if self.storage.loaded(guild_id):
+            return
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(asyncio.to_thread(self.storage.load_guild, guild_id))
+            task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        await asyncio.shield(task)
+
+    def pending_for(self, guild_id, user_id, op=None):
+        return [
+            r for r in self.unsaved_records
+            if r['guild'] == guild_id and r['user'] == user_id and (op is None or r['op'] == op)
+        ]
+
+    def cached_user(self, guild_id, user_id, create=False):
+        """Return the live cached profile of a user, loading it on a miss"""
+        key = (guild_id, user_id)
+        user_data = self.users.get(key)
+        if user_data is not None:
+            return user_data
+
+        user_data = self.storage.load_user(guild_id, user_id)
+        # A profile evicted since the last flush is newer than the stored one
+        if key in self.unsaved_users:
+            user_data = UserRecord.from_row(self.unsaved_users[key])
+        if user_data is None:
+            if not create:
+                return None
+            self.users.put(key, UserRecord.new(timestamp_now()), dirty=True)
+        else:
+            self.users.put(key, user_data)
+        return self.users.entries[key]
+
+    def pending_action(self, record):
+        return ActionRecord(record['type'], record['at'], record['details'])
+
+    def get_user(self, guild_id, user_id):
+        """Return a copy of a user's UserRecord in a guild"""
+        user_data = self.cached_user(str(guild_id), str(user_id))
+        return user_data.copy() if user_data else UserRecord()
+
+    def get_actions(self, guild_id, user_id, category=None, limit=None):
+        """Return a user's ActionRecords in a guild, oldest first"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        actions = self.storage.get_actions(guild_id, user_id, category, limit)
+        for record in self.pending_for(guild_id, user_id, 'action'):
+            if category is None or CATEGORY_MAPPING.get(record['type']) == category:
+                actions.append(self.pending_action(record))
+        return actions[-limit:] if limit else actions
+
+    def count_actions(self, guild_id, user_id):
+        """Return the number of warnings, kicks, bans and mutes of a user in a guild"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        counts = self.storage.count_actions(guild_id, user_id)
+        if self.archive:
+            for category, count in self.archive.count_actions(guild_id, user_id).items():
+                counts[category] += count
+        for record in self.pending_for(guild_id, user_id, 'action'):
+            category = CATEGORY_MAPPING.get(record['type'])
+            if category:
+                counts[category] += 1
+        return counts
+
+    def query_actions(self, guild_id, category=None, moderator_id=None, since=None, limit=None):
+        """Return (user_id, ActionRecord) for a guild's actions, newest first
+
+        Filters by category, moderator and time through the storage engine's
+        secondary indexes. Archived actions are not included.
+        """
+        guild_id = str(guild_id)
+        results = []
+        for record in reversed(self.unsaved_records):
+            if (
+                record['op'] == 'action' and record['guild'] == guild_id
+                and (not category or CATEGORY_MAPPING.get(record['type']) == category)
+                and (moderator_id is None or record['details'].get('moderator') == moderator_id)
+                and (since is None or record['at'] >= since)
+            ):
+                results.append((record['user'], self.pending_action(record)))
+        results.extend(self.storage.query_actions(guild_id, category, moderator_id, since, limit))
+        return results[:limit] if limit else results
+
+    def active_sanctions(self):
+        """Return {(guild_id, user_id, category): expires_at} for every running timed sanction"""
+        sanctions = {(g, u, category): expires_at for g, u, category, expires_at in self.storage.active_sanctions()}
+        for record in self.unsaved_records:
+            update_sanctions(sanctions, record)
+        return sanctions
+
+    def lift_sanction(self, guild_id, user_id, category):
+        """Drop a timed sanction from the index without logging an action"""
+        self.record("lift", guild_id, user_id, category=category)
+
+    def iter_archived_actions(self, guild_id, user_id):
+        """Stream a user's archived ActionRecords, oldest first
+
+        Reads compressed segments from disk, call it from a worker thread.
+        """
+        if self.archive:
+            yield from self.archive.iter_actions(guild_id, user_id)
+
+    def iter_actions(self, category):
+        """Yield (guild_id, user_id, ActionRecord) for every stored action in a category"""
+        yield from self.storage.iter_actions(category)
+        for record in self.unsaved_records:
+            if record['op'] == 'action' and CATEGORY_MAPPING.get(record['type']) == category:
+                yield record['guild'], record['user'], self.pending_action(record)
+
+    def increment(self, guild_id, user_id, field, amount=1):
+        """Add to a counter of a user's record"""
+        key = (str(guild_id), str(user_id))
+        user_data = self.cached_user(*key, create=True)
+        setattr(user_data, field, getattr(user_data, field) + amount)
+        self.users.mark_dirty(key)
+        self.changed()
+
+    def set_field(self, guild_id, user_id, field, value):
+        """Overwrite a single field of a user's record"""
+        key = (str(guild_id), str(user_id))
+        setattr(self.cached_user(*key, create=True), field, value)
+        self.users.mark_dirty(key)
+        self.changed()
+
+    def log_action(self, guild_id, user_id, action_type, details):
+        """Log a moderation action against a user"""
+        self.record("action", guild_id, user_id, type=action_type, details=details.copy())
+
+    def log_actions(self, guild_id, user_ids, action_type, details):
+        """Log the same action against many users, written as one batch"""
+        for user_id in user_ids:
+            self.queue("action", guild_id, user_id, type=action_type, details=details.copy())
+        self.changed()
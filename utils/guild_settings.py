@@ -0,0 +1,129 @@
+import json
+import os
+import logging
+import discord
+from utils.atomic_io import SnapshotWriter
+
+MOD_LOG_CHANNEL = 'mod-logs'
+MUTED_ROLE = 'Muted'
+QUARANTINE_ROLE = 'Quarantine'
+
+class GuildSettings:
+    """Per-guild IDs of the mod-log channel, the Muted and Quarantine roles
+
+    Each is looked up by name once and then fetched by ID, so lookups are
+    O(1) and survive renames. The bot's channel and role events keep the
+    IDs current: a new or renamed object with the default name fills an
+    empty slot, and deleting the stored one falls back to another with the
+    default name. A stored None means "looked, found nothing" until such an
+    event or an explicit set_*() changes it. Persisted to a JSON file
+    without the Nones, so objects created while the bot was offline are
+    looked up by name again after a restart.
+    """
+
+    SLOTS = {
+        'mod_log_channel': (MOD_LOG_CHANNEL, 'channels', 'get_channel'),
+        'muted_role': (MUTED_ROLE, 'roles', 'get_role'),
+        'quarantine_role': (QUARANTINE_ROLE, 'roles', 'get_role')
+    }
+
+    def __init__(self, bot, filename='data/guild_settings.json'):
+        self.bot = bot
+        self.filename = filename
+        self.logger = logging.getLogger('GuildSettings')
+        # guild_id -> {slot: id or None}
+        self.guilds = {}
+        self.writer = SnapshotWriter(
+            filename,
+            lambda: {str(guild_id): {slot: object_id for slot, object_id in slots.items() if object_id is not None}
+                     for guild_id, slots in self.guilds.items()}
+        )
+        for event in (
+            'on_guild_channel_create', 'on_guild_channel_update', 'on_guild_channel_delete',
+            'on_guild_role_create', 'on_guild_role_update', 'on_guild_role_delete'
+        ):
+            bot.add_listener(getattr(self, event), event)
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, 'r') as f:
+                # Older files stored misses too, they're looked up again
+                self.guilds = {
+                    int(guild_id): {slot: object_id for slot, object_id in slots.items() if object_id is not None}
+                    for guild_id, slots in json.load(f).items()
+                }
+        except Exception as e:
+            self.logger.error(f"Failed to load guild settings: {e}")
+
+    async def close(self):
+        await self.writer.close()
+
+    def lookup(self, guild, slot):
+        name, collection, getter = self.SLOTS[slot]
+        slots = self.guilds.setdefault(guild.id, {})
+        if slot in slots:
+            object_id = slots[slot]
+            found = getattr(guild, getter)(object_id) if object_id else None
+            if found is not None or object_id is None:
+                return found
+        # First use in this guild, or the stored object vanished while offline
+        found = discord.utils.get(getattr(guild, collection), name=name)
+        self.store(guild.id, slot, found.id if found else None)
+        return found
+
+    def store(self, guild_id, slot, object_id):
+        slots = self.guilds.setdefault(guild_id, {})
+        if slot not in slots or slots[slot] != object_id:
+            slots[slot] = object_id
+            self.writer.request_save()
+
+    def mod_log_channel(self, guild):
+        return self.lookup(guild, 'mod_log_channel')
+
+    def muted_role(self, guild):
+        return self.lookup(guild, 'muted_role')
+
+    def quarantine_role(self, guild):
+        return self.lookup(guild, 'quarantine_role')
+
+    def set_mod_log_channel(self, guild, channel):
+        self.store(guild.id, 'mod_log_channel', channel.id)
+
+    def set_muted_role(self, guild, role):
+        self.store(guild.id, 'muted_role', role.id)
+
+    def set_quarantine_role(self, guild, role):
+        self.store(guild.id, 'quarantine_role', role.id)
+
+    def created(self, slot, obj):
+        # Only fills a slot that is known to be empty
+        if obj.name == self.SLOTS[slot][0] and self.guilds.get(obj.guild.id, {}).get(slot, 0) is None:
+            self.store(obj.guild.id, slot, obj.id)
+
+    def deleted(self, slot, obj):
+        if self.guilds.get(obj.guild.id, {}).get(slot) == obj.id:
+            del self.guilds[obj.guild.id][slot]
+            self.lookup(obj.guild, slot)
+
+    async def on_guild_channel_create(self, channel):
+        self.created('mod_log_channel', channel)
+
+    async def on_guild_channel_update(self, before, after):
+        self.created('mod_log_channel', after)
+
+    async def on_guild_channel_delete(self, channel):
+        self.deleted('mod_log_channel', channel)
+
+    async def on_guild_role_create(self, role):
+        self.created('muted_role', role)
+        self.created('quarantine_role', role)
+
+    async def on_guild_role_update(self, before, after):
+        self.created('muted_role', after)
+        self.created('quarantine_role', after)
+
+    async def on_guild_role_delete(self, role):
+        self.deleted('muted_role', role)
+        self.deleted('quarantine_role', role)
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_left
+from collections import Counter
+from urllib.parse import urlsplit
+import aiohttp
+
+# Upper bounds of the latency histogram buckets, in seconds; the last bucket is everything slower
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Statuses worth another try, the host is overloaded or briefly down
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+class HTTPStatusError(Exception):
+    def __init__(self, host, status):
+        super().__init__(f"{host} returned status {status}")
+        self.host = host
+        self.status = status
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} is failing, not trying again for {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Stops calling a host after `threshold` failures in a row
+
+    Once open, requests fail straight away for `reset_after` seconds. Then
+    a single request is let through: if it works the circuit closes again,
+    otherwise it stays open for another `reset_after`.
+    """
+
+    __slots__ = ('threshold', 'reset_after', 'failures', 'opened_at', 'probing')
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def state(self, now=None):
+        if self.opened_at is None:
+            return "closed"
+        now = time.monotonic() if now is None else now
+        return "open" if now - self.opened_at < self.reset_after or self.probing else "half-open"
+
+    def retry_in(self, now):
+        return max(0.0, self.reset_after - (now - self.opened_at)) if self.opened_at is not None else 0.0
+
+    def allow(self, now):
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at < self.reset_after or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self, now):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = now
+
+    def release(self):
+        """Give up a probe that never finished, so the next request can try"""
+        self.probing = False
+
+class HostStats:
+    __slots__ = ('requests', 'retries', 'latency', 'errors')
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        # Request count per LATENCY_BUCKETS bucket, plus one for slower ones
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        # Error kind ("timeout", "connection", "HTTP 503", "circuit open") -> count
+        self.errors = Counter()
+
+    def observe(self, seconds):
+        self.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of requests, None if slower than all"""
+        total = sum(self.latency)
+        if not total:
+            return 0.0
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency):
+            seen += count
+            if seen >= total * fraction:
+                return bound
+        return None
+
+class HTTPClient:
+    """The bot's one HTTP client for external APIs
+
+    A single pooled session with a cap on connections per host, so a slow
+    API can't tie up every connection. GETs that time out, fail to connect
+    or get a 429/5xx are retried with jittered exponential backoff. Each host
+    has a circuit breaker, so while an API is down callers get a
+    CircuitOpenError immediately instead of waiting out the timeout.
+    Latency and error histograms are kept per host.
+    """
+
+    def __init__(self, limit=100, limit_per_host=10, timeout=10, connect_timeout=3,
+                 retries=2, backoff=0.5, max_backoff=5, failure_threshold=5, reset_after=30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.logger = logging.getLogger('HTTPClient')
+        self.session = None
+        # host -> CircuitBreaker
+        self.breakers = {}
+        # host -> HostStats
+        self.stats = {}
+
+    async def start(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def breaker_for(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_after)
+        return breaker
+
+    def stats_for(self, host):
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = self.stats[host] = HostStats()
+        return stats
+
+    def delay(self, attempt, retry_after=None):
+        """Full jitter: anywhere up to backoff * 2^attempt, so callers don't retry in step"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        return delay
+
+    async def get_json(self, url, params=None, headers=None, timeout=None):
+        """GET a JSON document, retrying what's worth retrying
+
+        Raises HTTPStatusError for error statuses, CircuitOpenError while the
+        host is failing, and aiohttp.ClientError or asyncio.TimeoutError if
+        it still couldn't connect after the retries.
+        """
+        if self.session is None:
+            await self.start()
+        host = urlsplit(url).hostname
+        breaker = self.breaker_for(host)
+        stats = self.stats_for(host)
+        # Passing timeout=None would turn the session's timeout off
+        options = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+
+        for attempt in range(self.retries + 1):
+            now = time.monotonic()
+            if not breaker.allow(now):
+                stats.errors["circuit open"] += 1
+                raise CircuitOpenError(host, breaker.retry_in(now))
+            if attempt:
+                stats.retries += 1
+            stats.requests += 1
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                async with self.session.get(url, params=params, headers=headers, **options) as response:
+                    if response.status in RETRY_STATUSES:
+                        retry_after = response.headers.get('Retry-After')
+                        raise HTTPStatusError(host, response.status)
+                    if response.status >= 400:
+                        # The host is up, the request was wrong: no retry, no strike
+                        stats.errors[f"HTTP {response.status}"] += 1
+                        breaker.success()
+                        raise HTTPStatusError(host, response.status)
+                    data = await response.json(content_type=None)
+                breaker.success()
+                return data
+            except HTTPStatusError as e:
+                if e.status not in RETRY_STATUSES:
+                    raise
+                error = e
+                stats.errors[f"HTTP {e.status}"] += 1
+            except asyncio.TimeoutError as e:
+                error = e
+                stats.errors["timeout"] += 1
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+                error = e
+                stats.errors["connection"] += 1
+            except ValueError:
+                # Not JSON, but the host did answer
+                stats.errors["invalid response"] += 1
+                breaker.success()
+                raise
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                # Anything else (too many redirects, other response errors)
+                # isn't retried, but mustn't leave a probe hanging either
+                stats.errors[type(e).__name__] += 1
+                breaker.release()
+                raise
+            finally:
+                stats.observe(time.perf_counter() - started)
+
+            breaker.failure(time.monotonic())
+            if attempt == self.retries:
+                break
+            delay = self.delay(attempt, retry_after)
+            self.logger.warning(f"GET {host} failed ({str(error) or type(error).__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        raise error
+
+    def report(self):
+        """Per-host request counts, latency percentiles (ms) and errors"""
+        now = time.monotonic()
+        report = []
+        for host, stats in sorted(self.stats.items()):
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            report.append({
+                "host": host,
+                "requests": stats.requests,
+                "retries": stats.retries,
+                "p50_ms": p50 * 1000 if p50 is not None else None,
+                "p95_ms": p95 * 1000 if p95 is not None else None,
+                "latency": list(stats.latency),
+                "errors": dict(stats.errors),
+                "circuit": self.breaker_for(host).state(now)
+            })
+        return report
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+# nekos.best hands out at most this many results per request
+MAX_AMOUNT = 20
+
+class ImagePool:
+    """Images fetched ahead of time, per nekos.best endpoint
+
+    Each endpoint keeps a buffer filled with one `?amount=` request, so a
+    command is answered from memory. Taking from a buffer that's running
+    low tops it up in the background; an empty buffer is filled while the
+    command waits, which is the only time a command hits the network.
+    The last `recent` URLs served per endpoint are skipped when refilling,
+    so the same image doesn't come up twice in a row.
+    """
+
+    def __init__(self, http, base_url, size=MAX_AMOUNT, low=5, recent=40, retry_after=30):
+        # The bot's HTTPClient
+        self.http = http
+        self.base_url = base_url
+        self.size = min(size, MAX_AMOUNT)
+        self.low = low
+        self.recent_size = recent
+        self.retry_after = retry_after
+        self.logger = logging.getLogger('ImagePool')
+        # endpoint -> deque of result dicts ({"url": ..., "artist_name": ...})
+        self.buffers = {}
+        # endpoint -> (deque of recently served URLs, set of the same URLs)
+        self.recent = {}
+        # endpoint -> running refill task
+        self.refills = {}
+        # endpoint -> monotonic time of the last failed refill
+        self.failed = {}
+        self.warming = None
+        self.hits = 0
+        self.misses = 0
+        self.refill_count = 0
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    async def fetch(self, endpoint, amount):
+        data = await self.http.get_json(f"{self.base_url}{endpoint}", params={"amount": amount})
+        return [result for result in data.get('results', []) if result.get('url')]
+
+    async def refill(self, endpoint):
+        """Top the endpoint's buffer up to size, raises if the request fails"""
+        buffer = self.buffers.setdefault(endpoint, deque())
+        if len(buffer) >= self.size:
+            return
+        results = await self.fetch(endpoint, self.size)
+        self.refill_count += 1
+        recent = self.recent.get(endpoint, ((), set()))[1]
+        queued = {result['url'] for result in buffer}
+        fresh = [result for result in results if result['url'] not in recent and result['url'] not in queued]
+        if not fresh and not buffer:
+            # Everything was served lately, a repeat beats no image
+            fresh = results
+        buffer.extend(fresh[:self.size - len(buffer)])
+
+    def take(self, endpoint):
+        """Next buffered image of the endpoint, or None if there isn't one"""
+        buffer = self.buffers.get(endpoint)
+        if not buffer:
+            return None
+        image = buffer.popleft()
+        served, urls = self.recent.setdefault(endpoint, (deque(), set()))
+        if len(served) >= self.recent_size:
+            urls.discard(served.popleft())
+        served.append(image['url'])
+        urls.add(image['url'])
+        return image
+
+    async def get(self, endpoint):
+        """An image of the endpoint, from the buffer if possible
+
+        Returns None if the API had no images; request errors are raised.
+        """
+        image = self.take(endpoint)
+        if image is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # Commands finding the buffer empty together wait on one request;
+            # if the others took everything it brought, try once more
+            for _ in range(2):
+                await asyncio.shield(self.start_refill(endpoint))
+                image = self.take(endpoint)
+                if image is not None:
+                    break
+        if len(self.buffers.get(endpoint, ())) <= self.low:
+            self.top_up(endpoint)
+        return image
+
+    def start_refill(self, endpoint):
+        """The endpoint's running refill task, started if there is none"""
+        task = self.refills.get(endpoint)
+        if task is None or task.done():
+            task = self.refills[endpoint] = asyncio.create_task(self.refill(endpoint))
+            task.add_done_callback(lambda task: self.refilled(endpoint, task))
+        return task
+
+    def refilled(self, endpoint, task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            self.failed.pop(endpoint, None)
+        else:
+            self.failed[endpoint] = time.monotonic()
+            self.logger.error(f"Failed to prefetch {endpoint} images: {error}")
+
+    def top_up(self, endpoint):
+        """Refill the endpoint in the background, unless it failed lately"""
+        failed = self.failed.get(endpoint)
+        if failed is not None and time.monotonic() - failed < self.retry_after:
+            return
+        self.start_refill(endpoint)
+
+    def warm(self, endpoints, delay=0.5):
+        """Fill every endpoint in the background, one request at a time"""
+        self.warming = asyncio.create_task(self._warm(list(endpoints), delay))
+
+    async def _warm(self, endpoints, delay):
+        for endpoint in endpoints:
+            try:
+                await asyncio.shield(self.start_refill(endpoint))
+            except Exception:
+                # Already logged by refilled()
+                pass
+            # Spread the requests out instead of bursting the API at startup
+            await asyncio.sleep(delay)
+        self.logger.info(f"Prefetched {len(self)} images for {len(endpoints)} endpoints")
+
+    def close(self):
+        if self.warming is not None:
+            self.warming.cancel()
+        for task in self.refills.values():
+            task.cancel()
@@ -3,19 +3,25 @@ import discord
 from discord.ext import commands
 from datetime import datetime
 import logging
+from utils.pipeline import LOGGING
 
 class Logging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = logging.getLogger('Logging')
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def cog_load(self):
+        self.bot.pipeline.register('logging', LOGGING, self.log_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister('logging')
+
+    def log_message(self, ctx):
         """Log message events"""
-        if not message.author.bot:
+        if ctx.guild:
             self.logger.info(
-                f"Message sent by {message.author} (ID: {message.author.id}) "
-                f"in #{message.channel.name} ({message.guild.name})"
+                f"Message sent by {ctx.author} (ID: {ctx.author.id}) "
+                f"in #{ctx.channel.name} ({ctx.guild.name})"
             )
 
     @commands.Cog.listener()
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+import time
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up, i.e. how long it was blocked"""
+
+    def __init__(self, interval=0.5, warn_threshold=0.1):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.logger = logging.getLogger('LoopMonitor')
+        self.max_stall = 0.0
+        self.total_stall = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            stall = time.perf_counter() - started - self.interval
+            if stall <= 0:
+                continue
+            self.total_stall += stall
+            self.max_stall = max(self.max_stall, stall)
+            if stall >= self.warn_threshold:
+                self.logger.warning(f"Event loop was blocked for {stall * 1000:.0f}ms")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
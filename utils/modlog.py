@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import discord
+
+WEBHOOK_NAME = "Mod Logs"
+
+class ModLogOutbox:
+    """Per-guild queue of mod-log embeds, delivered in the background
+
+    enqueue() returns immediately. Each guild has a worker that waits up to
+    `window` seconds for more embeds and sends up to 10 per message, within
+    6000 characters in total (the Discord limits), optionally through a webhook on the mod-log channel so
+    logs don't share the channel's message rate limit with the bot. If a
+    guild's queue reaches `max_queue`, the oldest embeds are dropped and
+    counted.
+    """
+
+    MAX_EMBEDS = 10
+    MAX_CHARS = 6000
+
+    def __init__(self, bot, window=1.0, max_queue=500, use_webhooks=True):
+        self.bot = bot
+        self.window = window
+        self.max_queue = max_queue
+        self.use_webhooks = use_webhooks
+        self.logger = logging.getLogger('ModLogOutbox')
+        # guild_id -> deque of (enqueued at, embed)
+        self.queues = {}
+        self.workers = {}
+        # channel_id -> Webhook, or None where webhooks can't be used
+        self.webhooks = {}
+        self.enqueued = 0
+        self.dropped = 0
+        self.failed = 0
+        # Embeds for guilds without a mod-log channel
+        self.unrouted = 0
+        self.messages = 0
+        self.embeds = 0
+        self.max_depth = 0
+        self.total_delay = 0.0
+
+    def enqueue(self, guild, embed):
+        """Queue an embed for the guild's mod-log channel without waiting"""
+        queue = self.queues.setdefault(guild.id, deque())
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+        queue.append((time.monotonic(), embed))
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(queue))
+
+        worker = self.workers.get(guild.id)
+        if worker is None or worker.done():
+            self.workers[guild.id] = asyncio.create_task(self._deliver(guild))
+
+    async def _deliver(self, guild):
+        queue = self.queues[guild.id]
+        while queue:
+            # Give a burst a moment to gather unless a full message is waiting
+            if len(queue) < self.MAX_EMBEDS:
+                await asyncio.sleep(self.window)
+            await self.send_batch(guild, self.take_batch(queue))
+
+    def take_batch(self, queue):
+        """As many queued embeds as fit in one message"""
+        batch = []
+        chars = 0
+        while queue and len(batch) < self.MAX_EMBEDS:
+            length = len(queue[0][1])
+            if batch and chars + length > self.MAX_CHARS:
+                break
+            batch.append(queue.popleft())
+            chars += length
+        return batch
+
+    async def send_batch(self, guild, batch):
+        try:
+            delivered = await self.send(guild, [embed for _, embed in batch])
+        except Exception as e:
+            if isinstance(e, discord.HTTPException) and e.status == 400 and len(batch) > 1:
+                # Rejected as too large, send it in halves rather than lose all of it
+                half = len(batch) // 2
+                await self.send_batch(guild, batch[:half])
+                await self.send_batch(guild, batch[half:])
+                return
+            self.failed += len(batch)
+            self.logger.error(f"Failed to deliver {len(batch)} mod-log embeds in {guild.id}: {e}")
+            return
+        if not delivered:
+            self.unrouted += len(batch)
+            return
+        now = time.monotonic()
+        self.total_delay += sum(now - queued_at for queued_at, _ in batch)
+        self.messages += 1
+        self.embeds += len(batch)
+
+    async def send(self, guild, embeds):
+        """Post embeds in the guild's mod-log channel, False if it has none"""
+        channel = self.bot.settings.mod_log_channel(guild)
+        if channel is None:
+            return False
+        webhook = await self.webhook_for(channel)
+        if webhook is not None:
+            try:
+                await webhook.send(
+                    embeds=embeds,
+                    username=self.bot.user.name,
+                    avatar_url=self.bot.user.display_avatar.url
+                )
+                return True
+            except discord.NotFound:
+                # Deleted by someone, look for or create a new one next time
+                del self.webhooks[channel.id]
+        await channel.send(embeds=embeds)
+        return True
+
+    async def webhook_for(self, channel):
+        if not self.use_webhooks:
+            return None
+        if channel.id not in self.webhooks:
+            try:
+                self.webhooks[channel.id] = discord.utils.find(
+                    lambda w: w.name == WEBHOOK_NAME and w.user == self.bot.user,
+                    await channel.webhooks()
+                ) or await channel.create_webhook(name=WEBHOOK_NAME)
+            except discord.Forbidden:
+                # No Manage Webhooks permission, post as the bot instead
+                self.webhooks[channel.id] = None
+            except discord.HTTPException as e:
+                # Probably temporary, post as the bot and try again next batch
+                self.logger.warning(f"Could not get the mod-log webhook in {channel.id}: {e}")
+                return None
+        return self.webhooks[channel.id]
+
+    def stats(self):
+        sent = self.embeds
+        return {
+            "queued": sum(len(queue) for queue in self.queues.values()),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": sent,
+            "messages": self.messages,
+            "embeds_per_message": sent / self.messages if self.messages else 0.0,
+            "avg_delay": self.total_delay / sent if sent else 0.0,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "unrouted": self.unrouted
+        }
+
+    async def close(self, timeout=10.0):
+        """Deliver what is still queued, giving up after `timeout` seconds"""
+        workers = [worker for worker in self.workers.values() if not worker.done()]
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        if pending:
+            self.logger.warning(f"Dropped mod-logs of {len(pending)} guilds at shutdown")
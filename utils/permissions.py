@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import discord
+
+class OverwriteJob:
+    """Set one role's or member's permission overwrite across many channels
+
+    Channels whose overwrite already has the wanted values are skipped
+    without an API call, and the edits run with bounded concurrency (each
+    channel is its own rate-limit bucket, discord.py waits out 429s). The
+    job keeps the channels it hasn't finished, so calling run() again after
+    it was interrupted picks up where it stopped; running a fresh job after
+    a restart costs nothing for the channels that were already done.
+    `previous` holds the values each changed channel had before, so a job
+    can be undone.
+    """
+
+    def __init__(self, guild, target, channels, permissions, reason=None, concurrency=8):
+        self.guild = guild
+        self.target = target
+        # A dict of permission -> True/False/None, or a function of the
+        # channel returning one
+        self.permissions = permissions
+        self.reason = reason
+        self.concurrency = concurrency
+        self.logger = logging.getLogger('OverwriteJob')
+        self.total = len(channels)
+        self.pending = [channel.id for channel in channels]
+        self.updated = 0
+        self.skipped = 0
+        self.failed = []
+        self.previous = {}
+
+    @property
+    def done(self):
+        return self.total - len(self.pending)
+
+    @property
+    def finished(self):
+        return not self.pending
+
+    def wanted(self, channel):
+        return self.permissions(channel) if callable(self.permissions) else self.permissions
+
+    async def apply(self, channel_id, semaphore):
+        channel = self.guild.get_channel(channel_id)
+        if channel is not None:
+            wanted = self.wanted(channel)
+            overwrite = channel.overwrites_for(self.target)
+            if all(getattr(overwrite, name) == value for name, value in wanted.items()):
+                self.skipped += 1
+            else:
+                previous = {name: getattr(overwrite, name) for name in wanted}
+                overwrite.update(**wanted)
+                try:
+                    async with semaphore:
+                        await channel.set_permissions(
+                            self.target,
+                            # An empty overwrite is removed rather than left behind
+                            overwrite=None if overwrite.is_empty() else overwrite,
+                            reason=self.reason
+                        )
+                    self.previous[channel_id] = previous
+                    self.updated += 1
+                except discord.HTTPException as e:
+                    self.logger.warning(f"Could not update #{channel.name} in {self.guild.id}: {e}")
+                    self.failed.append(channel_id)
+        self.pending.remove(channel_id)
+
+    async def run(self, progress=None, progress_interval=3.0):
+        """Process the remaining channels, awaiting `progress(job)` every few seconds and at the end"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        work = asyncio.gather(*(self.apply(channel_id, semaphore) for channel_id in list(self.pending)))
+        try:
+            while progress is not None:
+                done, _ = await asyncio.wait({work}, timeout=progress_interval)
+                if done:
+                    break
+                await progress(self)
+            await work
+        except asyncio.CancelledError:
+            # Unfinished channels stay in pending for the next run()
+            work.cancel()
+            raise
+        if progress is not None:
+            await progress(self)
+        return self
+
+    def summary(self):
+        text = f"{self.done}/{self.total} channels, {self.updated} updated, {self.skipped} already set"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
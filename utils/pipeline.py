@@ -0,0 +1,133 @@
+import inspect
+import logging
+import time
+from functools import cached_property
+
+# Stage order, lower runs first
+FILTER = 0
+MODERATION = 10
+ACCOUNTING = 20
+PARSE = 25
+CUSTOM_COMMANDS = 30
+COMMANDS = 35
+LOGGING = 40
+
+class MessageContext:
+    """One message as seen by the pipeline stages
+
+    Derived forms of the content are computed on first use and shared by
+    every stage, instead of each listener lower-casing and splitting the
+    message again.
+    """
+
+    def __init__(self, message, prefix):
+        self.message = message
+        self.author = message.author
+        self.guild = message.guild
+        self.channel = message.channel
+        self.content = message.content
+        self.prefix = prefix
+        # The commands.Context from the bot's own prefix parsing, set by the
+        # parse stage for messages that start with the prefix
+        self.invocation = None
+
+    @cached_property
+    def lower(self):
+        return self.content.lower().strip()
+
+    @cached_property
+    def words(self):
+        return self.lower.split()
+
+    @cached_property
+    def command(self):
+        """The word after the prefix (as typed), or None if this isn't a command"""
+        if not self.content.startswith(self.prefix):
+            return None
+        parts = self.content[len(self.prefix):].split(maxsplit=1)
+        return parts[0] if parts else None
+
+    @cached_property
+    def arguments(self):
+        parts = self.content[len(self.prefix):].split(maxsplit=1)
+        return parts[1] if len(parts) > 1 else ""
+
+class StageStats:
+    __slots__ = ('calls', 'stops', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.stops = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+class MessagePipeline:
+    """Runs every message through registered stages, in order, with early exit
+
+    A stage is a function of a MessageContext, plain or async, returning
+    True to stop the message there (e.g. automod deleted it). Each stage is
+    timed; for async stages that includes the time spent waiting on
+    Discord. One failing stage is logged and the next one still runs.
+    """
+
+    def __init__(self, prefix='!'):
+        self.prefix = prefix
+        self.logger = logging.getLogger('MessagePipeline')
+        # (order, name, callback, is async), kept sorted
+        self.stages = []
+        self.stats = {}
+        self.messages = 0
+        self.total = 0.0
+        self.register('bot_filter', FILTER, lambda ctx: ctx.author.bot)
+
+    def register(self, name, order, callback):
+        """Add a stage, replacing any stage with the same name"""
+        self.unregister(name)
+        self.stages.append((order, name, callback, inspect.iscoroutinefunction(callback)))
+        self.stages.sort(key=lambda stage: stage[:2])
+        self.stats.setdefault(name, StageStats())
+
+    def unregister(self, name):
+        self.stages = [stage for stage in self.stages if stage[1] != name]
+
+    async def dispatch(self, message):
+        start = time.perf_counter()
+        ctx = MessageContext(message, self.prefix)
+        for _, name, callback, is_async in self.stages:
+            stats = self.stats[name]
+            stage_start = time.perf_counter()
+            try:
+                stop = await callback(ctx) if is_async else callback(ctx)
+            except Exception as e:
+                stop = False
+                stats.errors += 1
+                self.logger.error(f"Message stage {name} failed: {e}")
+            elapsed = time.perf_counter() - stage_start
+            stats.calls += 1
+            stats.total += elapsed
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if stop:
+                stats.stops += 1
+                break
+        self.messages += 1
+        self.total += time.perf_counter() - start
+
+    def report(self):
+        """Per-stage timings in microseconds, in stage order"""
+        return [
+            {
+                "stage": name,
+                "calls": self.stats[name].calls,
+                "stops": self.stats[name].stops,
+                "errors": self.stats[name].errors,
+                "avg_us": self.stats[name].total / self.stats[name].calls * 1e6 if self.stats[name].calls else 0.0,
+                "max_us": self.stats[name].max * 1e6
+            }
+            for _, name, _, _ in self.stages
+        ]
+
+    def average(self):
+        """Average time per message over all stages, in microseconds"""
+        return self.total / self.messages * 1e6 if self.messages else 0.0
@@ -0,0 +1,88 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+# Account age (seconds) -> points, youngest first
+AGE_SCORES = (
+    (3600, 4),
+    (86400, 3),
+    (7 * 86400, 2),
+    (30 * 86400, 1)
+)
+
+def score_account(member, now=None):
+    """How raid-like a new account looks, 0 for an established one
+
+    Young accounts score up to 4 points by age, accounts without an avatar
+    one more, so a day-old account with the default avatar scores 4.
+    """
+    now = now or datetime.now(timezone.utc)
+    age = (now - member.created_at).total_seconds()
+    score = next((points for limit, points in AGE_SCORES if age < limit), 0)
+    if member.avatar is None:
+        score += 1
+    return score
+
+class SlidingWindowCounter:
+    """Sum of the values added during the last `seconds`, in O(1)
+
+    Values go into a ring of one-second buckets with a running total;
+    moving forward clears only the buckets that fell out of the window, so
+    add() and count() are constant time however many joins come in.
+    """
+
+    def __init__(self, seconds):
+        self.size = max(1, int(seconds))
+        self.buckets = [0] * self.size
+        self.total = 0
+        self.current = None
+
+    def advance(self, now):
+        second = int(now)
+        if self.current is None or second - self.current >= self.size:
+            self.buckets = [0] * self.size
+            self.total = 0
+        elif second > self.current:
+            for s in range(self.current + 1, second + 1):
+                self.total -= self.buckets[s % self.size]
+                self.buckets[s % self.size] = 0
+        if self.current is None or second > self.current:
+            self.current = second
+
+    def add(self, value=1, now=None):
+        self.advance(time.monotonic() if now is None else now)
+        self.buckets[self.current % self.size] += value
+        self.total += value
+        return self.total
+
+    def count(self, now=None):
+        self.advance(time.monotonic() if now is None else now)
+        return self.total
+
+class JoinTracker:
+    """Join rate and risk of one guild over a sliding window
+
+    Also remembers the scored joins still inside the window, so the ones
+    that arrived before a raid was detected can be acted on too.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.joins = SlidingWindowCounter(seconds)
+        self.risk = SlidingWindowCounter(seconds)
+        # (monotonic time, member_id, score)
+        self.recent = deque()
+
+    def add(self, member_id, score, now=None):
+        """Count a join, returns (joins, risk) in the window"""
+        now = time.monotonic() if now is None else now
+        self.recent.append((now, member_id, score))
+        while self.recent[0][0] <= now - self.seconds:
+            self.recent.popleft()
+        return self.joins.add(1, now), self.risk.add(score, now)
+
+    def drain(self, min_score):
+        """Take the remembered joins scoring at least `min_score`"""
+        members = [member_id for _, member_id, score in self.recent if score >= min_score]
+        self.recent.clear()
+        return members
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Optional
+from utils.time_parser import to_timestamp
+
+# Action types that are also counted per category
+CATEGORY_MAPPING = {
+    "warnings": "warnings",
+    "warning": "warnings",
+    "kick": "kicks",
+    "ban": "bans",
+    "mute": "mutes"
+}
+
+CATEGORIES = ("warnings", "kicks", "bans", "mutes")
+
+COUNTER_FIELDS = ("messages", "message_deletes", "voice_time")
+
+DATE_FIELDS = ("join_date", "last_seen")
+
+# Detail fields that hold dates
+DETAIL_DATE_FIELDS = ("timestamp", "expires_at")
+
+# Categories whose actions can carry an expires_at, and the action types that lift them
+SANCTION_CATEGORIES = ("mutes", "bans")
+LIFT_MAPPING = {
+    "unmute": "mutes",
+    "unban": "bans"
+}
+
+@dataclass(slots=True)
+class UserRecord:
+    """A user's profile in one guild, dates in epoch seconds"""
+    messages: int = 0
+    message_deletes: int = 0
+    voice_time: float = 0
+    join_date: Optional[int] = None
+    last_seen: Optional[int] = None
+
+    @classmethod
+    def new(cls, timestamp):
+        return cls(join_date=timestamp, last_seen=timestamp)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def from_legacy(cls, data):
+        """Build a record from the old dict format with str(datetime) dates"""
+        return cls(
+            data.get("messages", 0),
+            data.get("message_deletes", 0),
+            data.get("voice_time", 0),
+            to_timestamp(data.get("join_date")),
+            to_timestamp(data.get("last_seen"))
+        )
+
+    def to_row(self):
+        return [self.messages, self.message_deletes, self.voice_time, self.join_date, self.last_seen]
+
+    def copy(self):
+        return UserRecord(*self.to_row())
+
+@dataclass(slots=True)
+class ActionRecord:
+    """A logged action, timestamp in epoch seconds"""
+    type: str
+    timestamp: int
+    details: dict
+
+    @property
+    def category(self):
+        return CATEGORY_MAPPING.get(self.type)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def from_legacy(cls, data):
+        return cls(data["type"], to_timestamp(data["timestamp"]), convert_details(data["details"]))
+
+    def to_row(self):
+        return [self.type, self.timestamp, self.details]
+
+    def archivable(self, cutoff, now):
+        """Older than cutoff and not a sanction that is still running"""
+        expires_at = self.details.get('expires_at')
+        return self.timestamp < cutoff and not (expires_at and expires_at > now)
+
+def convert_details(details):
+    """Turn date strings in action details into epoch seconds"""
+    details = dict(details)
+    for field in DETAIL_DATE_FIELDS:
+        if isinstance(details.get(field), str):
+            details[field] = to_timestamp(details[field])
+    return details
+
+def sanction_change(action_type, details):
+    """How an action changes a user's running sanctions
+
+    Returns (category, expires_at) where expires_at None means any timed
+    sanction of that category ends (a lift, or a permanent one replacing
+    it), or None when the action doesn't affect sanctions.
+    """
+    category = CATEGORY_MAPPING.get(action_type)
+    if category in SANCTION_CATEGORIES:
+        return category, details.get('expires_at')
+    if action_type in LIFT_MAPPING:
+        return LIFT_MAPPING[action_type], None
+    return None
@@ -0,0 +1,112 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+class ExpiryScheduler:
+    """Runs callbacks at epoch timestamps, kept in a min-heap
+
+    The runner sleeps until the earliest due entry (or until an earlier one
+    is scheduled), so nothing is done while no timer is due. Keys are tuples
+    starting with a group name, e.g. ('mutes', guild_id, user_id); scheduling
+    an existing key replaces it. Cancelled and replaced entries stay in the
+    heap and are skipped when they come up.
+    """
+
+    def __init__(self, max_sleep=3600):
+        # Re-read the wall clock at least this often, expiries are epoch based
+        self.max_sleep = max_sleep
+        self.logger = logging.getLogger('ExpiryScheduler')
+        self.heap = []
+        self.entries = {}
+        self._counter = itertools.count()
+        self._wake = None
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def schedule(self, key, when, callback, *args):
+        """Call `await callback(*args)` at epoch time `when`, replacing any timer under `key`"""
+        seq = next(self._counter)
+        self.entries[key] = (when, seq, callback, args)
+        heapq.heappush(self.heap, (when, seq, key))
+        if self._wake is not None and self.heap[0][1] == seq:
+            self._wake.set()
+
+    def cancel(self, key):
+        """Drop the timer under `key`, returns whether there was one"""
+        cancelled = self.entries.pop(key, None) is not None
+        self._compact()
+        return cancelled
+
+    def cancel_group(self, group):
+        """Drop every timer whose key starts with `group`"""
+        for key in [key for key in self.entries if key[0] == group]:
+            del self.entries[key]
+        self._compact()
+
+    def _compact(self):
+        # Rebuild once dead entries outnumber live ones, so churn can't grow the heap
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(when, seq, key) for key, (when, seq, _, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _discard_stale(self):
+        while self.heap:
+            when, seq, key = self.heap[0]
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self.heap)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            self._discard_stale()
+            if not self.heap:
+                await self._wake.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=min(delay, self.max_sleep))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            when, seq, key = heapq.heappop(self.heap)
+            _, _, callback, args = self.entries.pop(key)
+            # Callbacks start in due order but run side by side, so a slow
+            # Discord call doesn't hold up the timers behind it
+            task = asyncio.create_task(self._fire(key, callback, args))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key, callback, args):
+        try:
+            await callback(*args)
+        except Exception as e:
+            self.logger.error(f"Timer {key} failed: {e}")
@@ -0,0 +1,164 @@
+import re
+import time
+from collections import deque
+
+MASK = (1 << 64) - 1
+
+# Messages shorter than this (after normalizing) are too common to fingerprint
+MIN_LENGTH = 16
+
+SHINGLE = 4
+
+_STRIP = re.compile(r'[\W_]+')
+
+def normalize(text):
+    return _STRIP.sub(' ', text.casefold()).strip()
+
+def simhash(text):
+    """64-bit SimHash of a message's character 4-grams, None if it is too short
+
+    Each output bit is set where most of the shingles' hashes have it set.
+    The per-bit tallies are kept as a binary counter of 64-bit planes
+    (bit i of plane j is bit j of counter i), so adding a hash and the
+    final majority vote take a handful of integer operations instead of a
+    loop over 64 counters.
+    """
+    text = normalize(text)
+    if len(text) < MIN_LENGTH:
+        return None
+    features = {hash(text[i:i + SHINGLE]) & MASK for i in range(len(text) - SHINGLE + 1)}
+
+    planes = []
+    for carry in features:
+        for i, plane in enumerate(planes):
+            planes[i] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        else:
+            planes.append(carry)
+
+    # Bits whose counter is at least len(features) // 2 + 1
+    threshold = len(features) // 2 + 1
+    greater, equal = 0, MASK
+    for j in range(max(len(planes), threshold.bit_length()) - 1, -1, -1):
+        plane = planes[j] if j < len(planes) else 0
+        if threshold >> j & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane & MASK
+    return greater | equal
+
+class SimHashIndex:
+    """Recent fingerprints, searchable for near-duplicates without comparing all pairs
+
+    Fingerprints within `distance` bits of each other agree exactly on at
+    least one of `distance + 1` bands (pigeonhole), so each band value keys
+    a bucket and a lookup only compares the few entries sharing a band.
+    Entries expire after `window` seconds; they are appended in time order,
+    so expiry pops from the front of the buckets. Buckets are capped at
+    `bucket_size` entries, which bounds the cost of a lookup even while the
+    same text is posted thousands of times, and the index at `max_entries`.
+    """
+
+    def __init__(self, window=30, distance=3, bucket_size=256, max_entries=100_000):
+        self.window = window
+        self.distance = distance
+        self.bucket_size = bucket_size
+        self.max_entries = max_entries
+        self.bands = distance + 1
+        self.band_bits = 64 // self.bands
+        self.band_mask = (1 << self.band_bits) - 1
+        # (band, band value) -> deque of entries
+        self.buckets = {}
+        # Every entry in time order: (time, fingerprint, item)
+        self.entries = deque()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self, fingerprint):
+        # The last band also takes the bits left over when 64 doesn't divide evenly
+        keys = [
+            (band, fingerprint >> (band * self.band_bits) & self.band_mask)
+            for band in range(self.bands - 1)
+        ]
+        keys.append((self.bands - 1, fingerprint >> ((self.bands - 1) * self.band_bits)))
+        return keys
+
+    def drop_oldest(self):
+        entry = self.entries.popleft()
+        for key in self.keys(entry[1]):
+            bucket = self.buckets.get(key)
+            # Not there if the capped bucket already pushed it out
+            if bucket and bucket[0] is entry:
+                bucket.popleft()
+                if not bucket:
+                    del self.buckets[key]
+
+    def expire(self, now):
+        cutoff = now - self.window
+        entries = self.entries
+        while entries and (entries[0][0] <= cutoff or len(entries) >= self.max_entries):
+            self.drop_oldest()
+
+    def add(self, fingerprint, item, now=None):
+        """Index an item, returns the items of earlier near-duplicates still in the window"""
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        entry = (now, fingerprint, item)
+        matches = {}
+        for key in self.keys(fingerprint):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = deque(maxlen=self.bucket_size)
+            for other in bucket:
+                if id(other) not in matches and (fingerprint ^ other[1]).bit_count() <= self.distance:
+                    matches[id(other)] = other[2]
+            bucket.append(entry)
+        self.entries.append(entry)
+        return list(matches.values())
+
+    def match(self, fingerprint, now=None):
+        """Whether a near-duplicate is in the window, without indexing anything"""
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        for key in self.keys(fingerprint):
+            for other in self.buckets.get(key, ()):
+                if (fingerprint ^ other[1]).bit_count() <= self.distance:
+                    return True
+        return False
+
+def benchmark(messages=200_000, spam_every=20):
+    """Time fingerprinting and indexing a message stream with a spam wave in it"""
+    import random
+    rng = random.Random(0)
+    words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 8))) for _ in range(5000)]
+    spam = "join my server for free nitro giveaway discord gg"
+    stream = [
+        f"{spam} {rng.randrange(1000)}" if i % spam_every == 0
+        else ' '.join(rng.choice(words) for _ in range(rng.randint(3, 20)))
+        for i in range(messages)
+    ]
+    index = SimHashIndex()
+    flagged = 0
+    # About 2000 messages a second
+    step = 1 / 2000
+    start = time.perf_counter()
+    for i, text in enumerate(stream):
+        fingerprint = simhash(text)
+        if fingerprint is not None and index.add(fingerprint, i, i * step):
+            flagged += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": messages,
+        "us_per_message": elapsed / messages * 1e6,
+        "flagged": flagged,
+        "spam_sent": messages // spam_every,
+        "indexed": len(index)
+    }
+
+if __name__ == '__main__':
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
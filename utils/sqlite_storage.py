@@ -0,0 +1,391 @@
+import json
+import os
+import sqlite3
+import logging
+from utils.storage import Storage, JsonPartition, JsonStorage, partition_legacy_data, sanctions_from_actions
+from utils.records import (
+    UserRecord, ActionRecord, convert_details, sanction_change,
+    CATEGORY_MAPPING, CATEGORIES, SANCTION_CATEGORIES, LIFT_MAPPING
+)
+from utils.time_parser import to_timestamp
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    join_date INTEGER,
+    last_seen INTEGER,
+    PRIMARY KEY (guild_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT,
+    moderator_id INTEGER,
+    timestamp INTEGER NOT NULL,
+    details TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_actions_guild_user ON actions (guild_id, user_id, category);
+CREATE INDEX IF NOT EXISTS idx_actions_user ON actions (user_id);
+CREATE INDEX IF NOT EXISTS idx_actions_type ON actions (type);
+CREATE INDEX IF NOT EXISTS idx_actions_category ON actions (category);
+CREATE INDEX IF NOT EXISTS idx_actions_timestamp ON actions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_actions_guild_time ON actions (guild_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_actions_guild_category_time ON actions (guild_id, category, timestamp);
+CREATE INDEX IF NOT EXISTS idx_actions_guild_moderator_time ON actions (guild_id, moderator_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS sanctions (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id, category)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# SQL version of ActionRecord.archivable(), parameters are (cutoff, now)
+ARCHIVABLE = "timestamp < ? AND COALESCE(json_extract(details, '$.expires_at'), 0) <= ?"
+
+class SQLiteStorage(Storage):
+    """Users, counters and actions in SQLite tables keyed by guild, nothing kept in memory"""
+
+    def __init__(self, filename, default_guild_id=0):
+        self.filename = filename
+        # Guild that data from before per-guild storage is filed under
+        self.default_guild_id = str(default_guild_id)
+        self.logger = logging.getLogger('SQLiteStorage')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Writes come from the Database flusher thread on their own connection,
+        # WAL mode lets reads on the event loop run alongside them
+        self.write_conn = sqlite3.connect(filename, check_same_thread=False)
+        self.write_conn.execute("PRAGMA journal_mode=WAL")
+        self.write_conn.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    def migrate(self):
+        """Create the schema, upgrading databases written by older versions"""
+        conn = self.write_conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        has_tables = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone() is not None
+
+        has_sanctions = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sanctions'"
+        ).fetchone() is not None
+
+        if has_tables and version < SCHEMA_VERSION:
+            self.rebuild_tables()
+        else:
+            conn.executescript(SCHEMA)
+        if has_tables and not has_sanctions:
+            self.rebuild_sanctions()
+
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+
+    def rebuild_sanctions(self):
+        """Fill the sanctions table from the mutes, bans and lifts in the action log"""
+        conn = self.write_conn
+        rows = conn.execute(
+            "SELECT guild_id, user_id, type, details FROM actions "
+            f"WHERE category IN ({', '.join('?' * len(SANCTION_CATEGORIES))}) "
+            f"OR type IN ({', '.join('?' * len(LIFT_MAPPING))}) ORDER BY id",
+            (*SANCTION_CATEGORIES, *LIFT_MAPPING)
+        ).fetchall()
+        sanctions = sanctions_from_actions(
+            (guild_id, user_id, ActionRecord(action_type, None, json.loads(details)))
+            for guild_id, user_id, action_type, details in rows
+        )
+        with conn:
+            conn.execute("DELETE FROM sanctions")
+            conn.executemany(
+                "INSERT INTO sanctions (guild_id, user_id, category, expires_at) VALUES (?, ?, ?, ?)",
+                [(*key, expires_at) for key, expires_at in sanctions.items()]
+            )
+        self.logger.info(f"Indexed {len(sanctions)} running sanctions")
+
+    def rebuild_tables(self):
+        """Copy data from an older schema into freshly created tables
+
+        Version 1 keyed users and counters by user only, their rows go to
+        default_guild_id. Versions 1 and 2 stored dates as str(datetime).
+        """
+        conn = self.write_conn
+        self.logger.info("Upgrading user log database schema...")
+        with conn:
+            for table in ('users', 'counters', 'actions'):
+                conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            for (index,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'actions_old' "
+                "AND sql IS NOT NULL"
+            ).fetchall():
+                conn.execute(f"DROP INDEX {index}")
+        conn.executescript(SCHEMA)
+
+        has_guild = any(
+            column[1] == 'guild_id' for column in conn.execute("PRAGMA table_info(users_old)")
+        )
+        guild_column = "guild_id" if has_guild else "?"
+        guild_params = () if has_guild else (self.default_guild_id,)
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (guild_id, user_id, join_date, last_seen) VALUES (?, ?, ?, ?)",
+                [
+                    (guild_id, user_id, to_timestamp(join_date), to_timestamp(last_seen))
+                    for guild_id, user_id, join_date, last_seen in conn.execute(
+                        f"SELECT {guild_column}, user_id, join_date, last_seen FROM users_old", guild_params
+                    ).fetchall()
+                ]
+            )
+            conn.execute(
+                f"INSERT INTO counters SELECT {guild_column}, user_id, name, value FROM counters_old",
+                guild_params
+            )
+            conn.executemany(
+                "INSERT INTO actions (id, guild_id, user_id, type, category, moderator_id, timestamp, details) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        row[0], str(row[1]) if row[1] is not None else self.default_guild_id,
+                        *row[2:6], to_timestamp(row[6]),
+                        json.dumps(convert_details(json.loads(row[7])), separators=(',', ':'))
+                    )
+                    for row in conn.execute(
+                        "SELECT id, guild_id, user_id, type, category, moderator_id, timestamp, details "
+                        "FROM actions_old"
+                    ).fetchall()
+                ]
+            )
+            for table in ('users', 'counters', 'actions'):
+                conn.execute(f"DROP TABLE {table}_old")
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def apply(self, records):
+        with self.write_conn:
+            for record in records:
+                self.apply_record(record)
+
+    def apply_record(self, record):
+        op = record['op']
+        if op == 'lift':
+            self.set_sanction(record['guild'], record['user'], record['category'], None)
+            return
+        if op == 'trim':
+            self.write_conn.execute(
+                f"DELETE FROM actions WHERE guild_id = ? AND {ARCHIVABLE}",
+                (record['guild'], record['before'], record['at'])
+            )
+            return
+
+        key = (record['guild'], record['user'])
+        self.write_conn.execute(
+            "INSERT OR IGNORE INTO users (guild_id, user_id, join_date, last_seen) VALUES (?, ?, ?, ?)",
+            (*key, record['at'], record['at'])
+        )
+        if op == 'put':
+            self.put_user(*key, UserRecord.from_row(record['data']))
+        elif op == 'action':
+            self.insert_action(*key, record['type'], record['details'], record['at'])
+            change = sanction_change(record['type'], record['details'])
+            if change:
+                self.set_sanction(*key, *change)
+
+    def set_sanction(self, guild_id, user_id, category, expires_at):
+        if expires_at:
+            self.write_conn.execute(
+                "INSERT OR REPLACE INTO sanctions (guild_id, user_id, category, expires_at) VALUES (?, ?, ?, ?)",
+                (guild_id, user_id, category, expires_at)
+            )
+        else:
+            self.write_conn.execute(
+                "DELETE FROM sanctions WHERE guild_id = ? AND user_id = ? AND category = ?",
+                (guild_id, user_id, category)
+            )
+
+    def put_user(self, guild_id, user_id, user_data):
+        self.write_conn.execute(
+            "UPDATE users SET join_date = ?, last_seen = ? WHERE guild_id = ? AND user_id = ?",
+            (user_data.join_date, user_data.last_seen, guild_id, user_id)
+        )
+        self.write_conn.executemany(
+            "INSERT OR REPLACE INTO counters (guild_id, user_id, name, value) VALUES (?, ?, ?, ?)",
+            [
+                (guild_id, user_id, "messages", user_data.messages),
+                (guild_id, user_id, "message_deletes", user_data.message_deletes),
+                (guild_id, user_id, "voice_time", user_data.voice_time)
+            ]
+        )
+
+    def insert_action(self, guild_id, user_id, action_type, details, timestamp):
+        self.write_conn.execute(
+            "INSERT INTO actions (guild_id, user_id, type, category, moderator_id, timestamp, details) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                guild_id,
+                user_id,
+                action_type,
+                CATEGORY_MAPPING.get(action_type),
+                details.get('moderator'),
+                timestamp,
+                json.dumps(details, separators=(',', ':'))
+            )
+        )
+
+    def load_user(self, guild_id, user_id):
+        row = self.conn.execute(
+            "SELECT join_date, last_seen FROM users WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        user_data = UserRecord(join_date=row['join_date'], last_seen=row['last_seen'])
+        for counter in self.conn.execute(
+            "SELECT name, value FROM counters WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ):
+            setattr(user_data, counter['name'], counter['value'])
+        return user_data
+
+    def row_to_action(self, row):
+        return ActionRecord(row['type'], row['timestamp'], json.loads(row['details']))
+
+    def get_actions(self, guild_id, user_id, category=None, limit=None):
+        query = "SELECT type, details, timestamp FROM actions WHERE guild_id = ? AND user_id = ?"
+        params = [guild_id, user_id]
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self.conn.execute(query, params).fetchall()
+        return [self.row_to_action(row) for row in reversed(rows)]
+
+    def count_actions(self, guild_id, user_id):
+        counts = {category: 0 for category in CATEGORIES}
+        for row in self.conn.execute(
+            "SELECT category, COUNT(*) AS n FROM actions "
+            "WHERE guild_id = ? AND user_id = ? AND category IS NOT NULL GROUP BY category",
+            (guild_id, user_id)
+        ):
+            counts[row['category']] = row['n']
+        return counts
+
+    def query_actions(self, guild_id, category=None, moderator_id=None, since=None, limit=None):
+        query = "SELECT user_id, type, details, timestamp FROM actions WHERE guild_id = ?"
+        params = [guild_id]
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        if moderator_id is not None:
+            query += " AND moderator_id = ?"
+            params.append(int(moderator_id))
+        if since is not None:
+            query += " AND timestamp >= ?"
+            params.append(since)
+        query += " ORDER BY timestamp DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [(row['user_id'], self.row_to_action(row)) for row in self.conn.execute(query, params)]
+
+    def active_sanctions(self):
+        return [
+            tuple(row) for row in self.conn.execute(
+                "SELECT guild_id, user_id, category, expires_at FROM sanctions"
+            )
+        ]
+
+    def guild_ids(self):
+        return [row[0] for row in self.write_conn.execute("SELECT DISTINCT guild_id FROM users")]
+
+    def archivable_actions(self, guild_id, cutoff, now):
+        # Runs in the flusher thread, so it uses that thread's connection
+        rows = self.write_conn.execute(
+            f"SELECT user_id, type, timestamp, details FROM actions WHERE guild_id = ? AND {ARCHIVABLE} "
+            "ORDER BY id",
+            (guild_id, cutoff, now)
+        ).fetchall()
+        return [
+            (user_id, ActionRecord(action_type, timestamp, json.loads(details)))
+            for user_id, action_type, timestamp, details in rows
+        ]
+
+    def iter_actions(self, category):
+        for row in self.conn.execute(
+            "SELECT guild_id, user_id, type, details, timestamp FROM actions WHERE category = ? ORDER BY id",
+            (category,)
+        ).fetchall():
+            yield row['guild_id'], row['user_id'], self.row_to_action(row)
+
+    def import_json(self, path):
+        """One-shot import of JSON user logs
+
+        `path` is either a JsonStorage directory with one file per guild, or
+        a user_logs.json from before per-guild storage.
+        """
+        if os.path.isdir(path):
+            source = JsonStorage(path)
+            guilds = {}
+            for guild_id in source.guild_ids():
+                partition = source.partition(guild_id)
+                guilds[guild_id] = (partition.users, partition.actions)
+        else:
+            guilds = partition_legacy_data(JsonPartition(path), self.default_guild_id)
+
+        users = 0
+        with self.write_conn:
+            for guild_id, (guild_users, guild_actions) in guilds.items():
+                for user_id, user_data in guild_users.items():
+                    self.write_conn.execute(
+                        "INSERT OR IGNORE INTO users (guild_id, user_id) VALUES (?, ?)", (guild_id, user_id)
+                    )
+                    self.put_user(guild_id, user_id, user_data)
+                    for action in guild_actions.get(user_id, []):
+                        self.insert_action(guild_id, user_id, action.type, action.details, action.timestamp)
+                    users += 1
+            self.write_conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_from', ?)",
+                (os.path.abspath(path),)
+            )
+        self.rebuild_sanctions()
+        self.logger.info(f"Imported {users} user records from {path}")
+        return users
+
+    def close(self):
+        self.conn.close()
+        self.write_conn.close()
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m utils.sqlite_storage <user_logs.json or guild directory> <user_logs.db> [default guild id]")
+        sys.exit(1)
+    storage = SQLiteStorage(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else 0)
+    storage.import_json(sys.argv[1])
+    storage.close()
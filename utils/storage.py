@@ -0,0 +1,586 @@
+import bisect
+import json
+import os
+import logging
+import threading
+import time
+from utils.atomic_io import atomic_write_json
+from utils.records import (
+    UserRecord, ActionRecord, convert_details, sanction_change,
+    CATEGORY_MAPPING, CATEGORIES, COUNTER_FIELDS, DATE_FIELDS
+)
+from utils.time_parser import to_timestamp, timestamp_now
+
+# On-disk format of JsonPartition snapshots, files without a version are
+# the original one-dict-per-user layout
+SNAPSHOT_VERSION = 2
+
+class Storage:
+    """Interface every storage engine behind Database implements.
+
+    Data is partitioned by guild: every user record and action belongs to
+    one (guild_id, user_id) pair, with both ids passed as strings.
+
+    Changes arrive as batches of records, each a dict with an "op", the
+    "guild" and "user" ids and the time the change was made in "at" (epoch
+    seconds): "put" replaces the profile with the UserRecord row in "data"
+    and "action" logs an action. A user that does not exist yet is created
+    by the first record that mentions them. "trim" has no user and drops
+    every action of the guild that ActionRecord.archivable(before, at).
+
+    Engines also keep an index of running timed sanctions, updated by the
+    mute/ban/unmute/unban actions they store (see sanction_change) and by
+    "lift" records, which end a sanction of a "category" without an action.
+    """
+
+    def load_user(self, guild_id, user_id):
+        """Return the UserRecord of a user, or None"""
+        raise NotImplementedError
+
+    def get_actions(self, guild_id, user_id, category=None, limit=None):
+        """Return a user's ActionRecords, oldest first, optionally only the last `limit`"""
+        raise NotImplementedError
+
+    def count_actions(self, guild_id, user_id):
+        """Return the number of actions per category for a user"""
+        raise NotImplementedError
+
+    def iter_actions(self, category):
+        """Yield (guild_id, user_id, ActionRecord) for every action in a category"""
+        raise NotImplementedError
+
+    def query_actions(self, guild_id, category=None, moderator_id=None, since=None, limit=None):
+        """Return (user_id, ActionRecord) for a guild's actions, newest first
+
+        Optionally only one category, only actions by one moderator and only
+        actions at or after `since` (epoch seconds).
+        """
+        raise NotImplementedError
+
+    def active_sanctions(self):
+        """Return (guild_id, user_id, category, expires_at) for every running timed sanction"""
+        raise NotImplementedError
+
+    def guild_ids(self):
+        """Return the ids of all guilds with stored data"""
+        raise NotImplementedError
+
+    def archivable_actions(self, guild_id, cutoff, now):
+        """Return (user_id, ActionRecord) for the actions a trim(cutoff, now) would drop
+
+        Called from the Database flusher thread.
+        """
+        raise NotImplementedError
+
+    def apply(self, records):
+        """Persist a batch of change records"""
+        raise NotImplementedError
+
+    def loaded(self, guild_id):
+        """Whether a guild's data can be read without touching the disk much"""
+        return True
+
+    def load_guild(self, guild_id):
+        """Bring a guild's data into memory, called from a worker thread"""
+        pass
+
+    def maintain(self):
+        """Periodic housekeeping, called from the Database flusher thread"""
+        pass
+
+    def close(self):
+        pass
+
+def update_sanctions(sanctions, record):
+    """Apply a change record to a {(guild_id, user_id, category): expires_at} dict
+
+    Returns True if the record changed it.
+    """
+    if record['op'] == 'lift':
+        change = (record['category'], None)
+    elif record['op'] == 'action':
+        change = sanction_change(record['type'], record['details'])
+    else:
+        return False
+    if change is None:
+        return False
+    category, expires_at = change
+    key = (record['guild'], record['user'], category)
+    if expires_at:
+        sanctions[key] = to_timestamp(expires_at)
+        return True
+    return sanctions.pop(key, None) is not None
+
+def sanctions_from_actions(actions, now=None):
+    """Rebuild the running sanctions from (guild_id, user_id, ActionRecord) in log order
+
+    Used once to fill the index from data written before it existed.
+    """
+    now = now or timestamp_now()
+    sanctions = {}
+    for guild_id, user_id, action in actions:
+        update_sanctions(sanctions, {
+            "op": "action", "guild": guild_id, "user": user_id,
+            "type": action.type, "details": action.details
+        })
+    return {key: expires_at for key, expires_at in sanctions.items() if expires_at > now}
+
+def action_time(entry):
+    return entry[1].timestamp
+
+class ActionIndex:
+    """Secondary indexes over one guild's actions: by moderator, category and day
+
+    Every posting list holds (user_id, ActionRecord) pairs in timestamp order,
+    so a time range is found by bisection instead of a scan.
+    """
+
+    def __init__(self):
+        self.by_moderator = {}
+        self.by_category = {}
+        self.by_day = {}
+
+    @classmethod
+    def build(cls, actions):
+        index = cls()
+        entries = [(user_id, action) for user_id, user_actions in actions.items() for action in user_actions]
+        entries.sort(key=action_time)
+        for user_id, action in entries:
+            index.add(user_id, action)
+        return index
+
+    def add(self, user_id, action):
+        entry = (user_id, action)
+        moderator = action.details.get('moderator')
+        if moderator is not None:
+            self.by_moderator.setdefault(int(moderator), []).append(entry)
+        if action.category:
+            self.by_category.setdefault(action.category, []).append(entry)
+        self.by_day.setdefault(action.timestamp // 86400, []).append(entry)
+
+    def query(self, category=None, moderator_id=None, since=None, limit=None):
+        """Newest matching (user_id, ActionRecord) first, at most `limit` of them"""
+        # Start from the most selective posting list and filter the rest
+        if moderator_id is not None:
+            lists = [self.by_moderator.get(int(moderator_id), [])]
+        elif category:
+            lists = [self.by_category.get(category, [])]
+        else:
+            # Walk the days newest first, so only the days that make up
+            # `limit` results are touched instead of the whole range
+            first_day = since // 86400 if since is not None else None
+            lists = (
+                self.by_day[day]
+                for day in sorted(self.by_day, reverse=True)
+                if first_day is None or day >= first_day
+            )
+
+        results = []
+        for entries in lists:
+            start = bisect.bisect_left(entries, since, key=action_time) if since is not None else 0
+            for i in range(len(entries) - 1, start - 1, -1):
+                entry = entries[i]
+                if category and entry[1].category != category:
+                    continue
+                results.append(entry)
+                if limit and len(results) >= limit:
+                    return results
+        return results
+
+class JsonPartition:
+    """One guild's users in memory, persisted as a JSON snapshot plus an append-only journal
+
+    apply() runs in the Database flusher thread and is the only writer;
+    the read methods run on the event loop and only ever read.
+    """
+
+    def __init__(self, filename, compact_every=10000):
+        self.filename = filename
+        self.journal_filename = os.path.splitext(filename)[0] + '.journal'
+        self.logger = logging.getLogger('JsonStorage')
+        self.last_used = time.monotonic()
+        # Fold the journal into a fresh snapshot after this many records
+        self.compact_every = compact_every
+        self.journal_records = 0
+        self.seq = 0
+        self.users = {}
+        self.actions = {}
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.load_data()
+        self.index = ActionIndex.build(self.actions)
+        self.replay_journal()
+
+    def load_data(self):
+        try:
+            if os.path.exists(self.filename):
+                with open(self.filename, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == SNAPSHOT_VERSION:
+                    self.seq = data['seq']
+                    self.users = {uid: UserRecord.from_row(row) for uid, row in data['users'].items()}
+                    self.actions = {
+                        uid: [ActionRecord.from_row(row) for row in rows]
+                        for uid, rows in data['actions'].items()
+                    }
+                else:
+                    self.load_legacy(data)
+        except json.JSONDecodeError:
+            self.logger.error(f"Failed to parse {self.filename}")
+            pass
+
+    def load_legacy(self, data):
+        """Read the original layout: one dict per user with str(datetime) dates"""
+        self.seq = data.pop('_journal_seq', 0)
+        for user_id, user_data in data.items():
+            self.users[user_id] = UserRecord.from_legacy(user_data)
+            # action_history holds every action, the per-category lists were copies of it
+            actions = [ActionRecord.from_legacy(a) for a in user_data.get("action_history", [])]
+            if actions:
+                self.actions[user_id] = actions
+
+    def replay_journal(self):
+        """Apply journal records written after the snapshot was taken"""
+        if not os.path.exists(self.journal_filename):
+            return
+        replayed = 0
+        valid_bytes = 0
+        with open(self.journal_filename, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # A crash mid-append leaves a torn last line, everything before it is intact
+                    self.logger.warning(f"Dropping truncated record at the end of {self.journal_filename}")
+                    break
+                valid_bytes += len(line)
+                self.journal_records += 1
+                if record['seq'] <= self.seq:
+                    continue
+                self.apply_record(record)
+                self.seq = record['seq']
+                replayed += 1
+        if valid_bytes != os.path.getsize(self.journal_filename):
+            # Cut the torn tail off so new appends start on a clean line
+            with open(self.journal_filename, 'r+b') as f:
+                f.truncate(valid_bytes)
+        if replayed:
+            self.logger.info(f"Replayed {replayed} journal records")
+
+    def ensure_user(self, user_id, timestamp):
+        user_data = self.users.get(user_id)
+        if user_data is None:
+            user_data = self.users[user_id] = UserRecord.new(timestamp)
+        return user_data
+
+    def apply_record(self, record):
+        """Apply a single journal record to the in-memory data"""
+        op = record['op']
+        user_id = record['user']
+        # Journals written before dates were stored as epoch seconds hold strings
+        at = to_timestamp(record.get('at', record.get('timestamp')))
+        if op == 'create':
+            self.users.setdefault(user_id, UserRecord.from_legacy(record['data']))
+            return
+        if op == 'trim':
+            for user_id, actions in list(self.actions.items()):
+                kept = [a for a in actions if not a.archivable(record['before'], at)]
+                if kept:
+                    self.actions[user_id] = kept
+                else:
+                    del self.actions[user_id]
+            self.index = ActionIndex.build(self.actions)
+            return
+
+        user_data = self.ensure_user(user_id, at)
+        if op == 'put':
+            data = record['data']
+            self.users[user_id] = UserRecord.from_row(data) if isinstance(data, list) else UserRecord.from_legacy(data)
+        elif op in ('incr', 'set'):
+            field = record['field']
+            if op == 'incr':
+                value = getattr(user_data, field) + record['amount']
+            else:
+                value = to_timestamp(record['value']) if field in DATE_FIELDS else record['value']
+            setattr(user_data, field, value)
+        elif op == 'action':
+            action = ActionRecord(record['type'], at, convert_details(record['details']))
+            self.actions.setdefault(user_id, []).append(action)
+            self.index.add(user_id, action)
+
+    def apply(self, records):
+        """Apply records and append them to the journal, compacting it when it grows large"""
+        start_seq = self.seq
+        records = [{"seq": start_seq + i, **record} for i, record in enumerate(records, 1)]
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+
+        journal_size = os.path.getsize(self.journal_filename) if os.path.exists(self.journal_filename) else 0
+        try:
+            with open(self.journal_filename, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            # Drop a partial append so the caller can retry the whole batch
+            if os.path.exists(self.journal_filename):
+                with open(self.journal_filename, 'r+b') as f:
+                    f.truncate(journal_size)
+            raise
+
+        for record in records:
+            self.apply_record(record)
+        self.seq += len(records)
+        self.journal_records += len(records)
+
+        if self.journal_records >= self.compact_every:
+            self.compact()
+
+    def snapshot(self):
+        return {
+            "version": SNAPSHOT_VERSION,
+            "seq": self.seq,
+            # list() copies atomically, the event loop never writes but may be mid-read
+            "users": {uid: user.to_row() for uid, user in list(self.users.items())},
+            "actions": {
+                uid: [action.to_row() for action in actions]
+                for uid, actions in list(self.actions.items())
+            }
+        }
+
+    def compact(self):
+        """Write a fresh snapshot and start an empty journal"""
+        try:
+            atomic_write_json(self.filename, self.snapshot())
+            # Records up to the snapshot's seq are skipped on replay, so a crash
+            # before this truncation cannot apply them twice
+            open(self.journal_filename, 'w').close()
+            self.journal_records = 0
+        except Exception as e:
+            self.logger.error(f"Failed to save data: {str(e)}")
+
+    def close(self):
+        if self.journal_records:
+            self.compact()
+
+    def load_user(self, user_id):
+        user_data = self.users.get(user_id)
+        return user_data.copy() if user_data else None
+
+    def get_actions(self, user_id, category=None, limit=None):
+        actions = self.actions.get(user_id, [])
+        if category:
+            actions = [a for a in actions if a.category == category]
+        return actions[-limit:] if limit else list(actions)
+
+    def count_actions(self, user_id):
+        counts = {category: 0 for category in CATEGORIES}
+        for action in self.actions.get(user_id, []):
+            if action.category:
+                counts[action.category] += 1
+        return counts
+
+    def query_actions(self, category=None, moderator_id=None, since=None, limit=None):
+        return self.index.query(category, moderator_id, since, limit)
+
+    def archivable_actions(self, cutoff, now):
+        return [
+            (user_id, action)
+            for user_id, actions in list(self.actions.items())
+            for action in actions
+            if action.archivable(cutoff, now)
+        ]
+
+    def iter_actions(self, category):
+        # list() copies the items atomically, apply() may add users meanwhile
+        for user_id, actions in list(self.actions.items()):
+            for action in actions:
+                if action.category == category:
+                    yield user_id, action
+
+class JsonStorage(Storage):
+    """One JsonPartition file pair per guild, loaded on first use and dropped when idle"""
+
+    def __init__(self, directory, compact_every=10000, idle_timeout=1800):
+        self.directory = directory
+        self.compact_every = compact_every
+        # Seconds without reads or writes before a guild is dropped from memory
+        self.idle_timeout = idle_timeout
+        self.logger = logging.getLogger('JsonStorage')
+        self.partitions = {}
+        # Guards loading and evicting partitions, which both the event loop
+        # (reads) and the flusher thread (writes) can trigger
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Running timed sanctions of every guild, kept in one small file so
+        # the cogs can load them without reading any partition
+        self.sanctions_filename = os.path.join(directory, 'sanctions.index')
+        self.sanctions = self.load_sanctions()
+
+    def load_sanctions(self):
+        if os.path.exists(self.sanctions_filename):
+            with open(self.sanctions_filename, 'r') as f:
+                return {(g, u, category): expires_at for g, u, category, expires_at in json.load(f)}
+        sanctions = sanctions_from_actions(
+            (guild_id, user_id, action)
+            for guild_id in self.guild_ids()
+            for user_id, actions in self.partition(guild_id).actions.items()
+            for action in actions
+        )
+        self.save_sanctions(sanctions)
+        return sanctions
+
+    def save_sanctions(self, sanctions):
+        atomic_write_json(self.sanctions_filename, [[*key, expires_at] for key, expires_at in sanctions.items()])
+
+    def partition_filename(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.json")
+
+    def partition(self, guild_id):
+        # Loaded partitions are handed out without the lock, so a read on the
+        # event loop never waits for the flusher thread loading another guild
+        partition = self.partitions.get(guild_id)
+        if partition is not None:
+            partition.last_used = time.monotonic()
+            return partition
+        with self._lock:
+            partition = self.partitions.get(guild_id)
+            if partition is None:
+                partition = JsonPartition(self.partition_filename(guild_id), self.compact_every)
+                self.partitions[guild_id] = partition
+            partition.last_used = time.monotonic()
+            return partition
+
+    def existing_partition(self, guild_id):
+        """Like partition(), but None for a guild that has no data at all"""
+        if guild_id in self.partitions or os.path.exists(self.partition_filename(guild_id)):
+            return self.partition(guild_id)
+        return None
+
+    def loaded(self, guild_id):
+        return guild_id in self.partitions
+
+    def load_guild(self, guild_id):
+        # Guilds without data get an empty partition too, so they count as loaded
+        self.partition(guild_id)
+
+    def guild_ids(self):
+        on_disk = {
+            os.path.splitext(name)[0]
+            for name in os.listdir(self.directory)
+            if name.endswith('.json') or name.endswith('.journal')
+        }
+        return on_disk | set(self.partitions)
+
+    def apply(self, records):
+        # The sanctions index is saved first, replaying it after a failed
+        # batch is retried is harmless
+        sanctions = dict(self.sanctions)
+        changed = [update_sanctions(sanctions, record) for record in records]
+        if any(changed):
+            self.save_sanctions(sanctions)
+            self.sanctions = sanctions
+
+        by_guild = {}
+        for record in records:
+            if record['op'] != 'lift':
+                by_guild.setdefault(record['guild'], []).append(record)
+        for guild_id, guild_records in by_guild.items():
+            self.partition(guild_id).apply(guild_records)
+
+    def maintain(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for guild_id, partition in list(self.partitions.items()):
+            if partition.last_used > cutoff:
+                continue
+            # Fold the journal in while the partition is still the one readers
+            # see, so a reload afterwards only has to read the snapshot
+            if partition.journal_records:
+                partition.compact()
+            with self._lock:
+                if partition.last_used <= cutoff:
+                    del self.partitions[guild_id]
+                    self.logger.info(f"Unloaded idle guild {guild_id}")
+
+    def close(self):
+        for partition in list(self.partitions.values()):
+            partition.close()
+
+    def load_user(self, guild_id, user_id):
+        partition = self.existing_partition(guild_id)
+        return partition.load_user(user_id) if partition else None
+
+    def get_actions(self, guild_id, user_id, category=None, limit=None):
+        partition = self.existing_partition(guild_id)
+        return partition.get_actions(user_id, category, limit) if partition else []
+
+    def count_actions(self, guild_id, user_id):
+        partition = self.existing_partition(guild_id)
+        if partition is None:
+            return {category: 0 for category in CATEGORIES}
+        return partition.count_actions(user_id)
+
+    def active_sanctions(self):
+        return [(*key, expires_at) for key, expires_at in self.sanctions.items()]
+
+    def query_actions(self, guild_id, category=None, moderator_id=None, since=None, limit=None):
+        partition = self.existing_partition(guild_id)
+        return partition.query_actions(category, moderator_id, since, limit) if partition else []
+
+    def archivable_actions(self, guild_id, cutoff, now):
+        return self.partition(guild_id).archivable_actions(cutoff, now)
+
+    def iter_actions(self, category):
+        for guild_id in self.guild_ids():
+            for user_id, action in self.partition(guild_id).iter_actions(category):
+                yield guild_id, user_id, action
+
+    def convert(self):
+        """Rewrite every partition in the current snapshot format"""
+        for guild_id in self.guild_ids():
+            self.partition(guild_id).compact()
+
+def partition_legacy_data(source, default_guild_id=0):
+    """Regroup a pre-partitioning JsonPartition into {guild_id: (users, actions)}
+
+    Actions go to the guild stored in their details. Counters and actions
+    that never recorded a guild go to default_guild_id.
+    """
+    guilds = {}
+
+    def target(guild_id):
+        return guilds.setdefault(str(guild_id), ({}, {}))
+
+    for user_id, user_data in source.users.items():
+        target(default_guild_id)[0][user_id] = user_data
+    for user_id, actions in source.actions.items():
+        for action in actions:
+            users, guild_actions = target(action.details.get('guild_id', default_guild_id))
+            if user_id not in users:
+                # Only the dates carry over, counters were never kept per guild
+                legacy = source.users.get(user_id, UserRecord())
+                users[user_id] = UserRecord(join_date=legacy.join_date, last_seen=legacy.last_seen)
+            guild_actions.setdefault(user_id, []).append(action)
+    return guilds
+
+def split_legacy_file(filename, directory, default_guild_id=0):
+    """Split a pre-partitioning user_logs.json into one JsonStorage file per guild
+
+    The old file (and its journal) is renamed to *.migrated afterwards.
+    """
+    source = JsonPartition(filename)
+    guilds = partition_legacy_data(source, default_guild_id)
+    for guild_id, (users, actions) in guilds.items():
+        partition = JsonPartition(os.path.join(directory, f"{guild_id}.json"))
+        partition.users, partition.actions = users, actions
+        partition.compact()
+    os.replace(filename, filename + '.migrated')
+    if os.path.exists(source.journal_filename):
+        os.replace(source.journal_filename, source.journal_filename + '.migrated')
+    return len(guilds)
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        print("Usage: python -m utils.storage <guild directory>")
+        sys.exit(1)
+    JsonStorage(sys.argv[1]).convert()
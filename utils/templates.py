@@ -0,0 +1,114 @@
+import re
+import time
+
+_PLACEHOLDER = re.compile(r'\{([a-z]+(?:\.[a-z]+)?|\d+)\}')
+
+# Placeholders and what they're replaced with; {1}, {2}, ... are the arguments
+PLACEHOLDERS = {
+    "user": "mention of whoever used the command",
+    "user.name": "their name",
+    "mention": "mention of the member replied to or mentioned",
+    "target.name": "that member's name",
+    "channel": "the channel",
+    "server": "the server's name",
+    "count": "how often the command has been used",
+    "args": "everything after the command"
+}
+
+TARGET_PLACEHOLDERS = ("mention", "target.name")
+
+class Template:
+    """A response parsed once into literal text and placeholders
+
+    Unknown {words} are kept as they are, so responses with braces of
+    their own still work.
+    """
+
+    __slots__ = ('text', 'parts', 'needs_target', 'needs_count')
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            name = match.group(1)
+            if name not in PLACEHOLDERS and not name.isdigit():
+                continue
+            if match.start() > position:
+                self.parts.append(text[position:match.start()])
+            self.parts.append((name,))
+            position = match.end()
+        if position < len(text):
+            self.parts.append(text[position:])
+        names = {part[0] for part in self.parts if isinstance(part, tuple)}
+        self.needs_target = any(name in names for name in TARGET_PLACEHOLDERS)
+        self.needs_count = "count" in names
+
+    def render(self, values, args):
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            elif part[0].isdigit():
+                index = int(part[0]) - 1
+                out.append(args[index] if 0 <= index < len(args) else "")
+            else:
+                out.append(values[part[0]])
+        return ''.join(out)
+
+class CustomCommand:
+    """A guild's custom command, compiled from its stored data"""
+
+    __slots__ = ('name', 'data', 'template', 'required_role', 'aliases', 'cooldown', 'last_used')
+
+    def __init__(self, name, data):
+        self.name = name
+        # The stored dict, kept in sync so it can be saved as is
+        self.data = data
+        self.template = Template(data["response"])
+        self.required_role = data.get("required_role", 0)
+        self.aliases = tuple(data.get("aliases", ()))
+        self.cooldown = data.get("cooldown", 0)
+        # user_id -> monotonic time of their last use
+        self.last_used = {}
+
+    def use_cooldown(self, user_id, now=None):
+        """Start the user's cooldown, or return the seconds left if it's still running"""
+        if not self.cooldown:
+            return 0
+        now = time.monotonic() if now is None else now
+        last = self.last_used.get(user_id)
+        if last is not None and now - last < self.cooldown:
+            return self.cooldown - (now - last)
+        if len(self.last_used) > 1000:
+            # Entries past their cooldown don't matter anymore
+            self.last_used = {u: t for u, t in self.last_used.items() if now - t < self.cooldown}
+        self.last_used[user_id] = now
+        return 0
+
+    def used(self):
+        self.data["uses"] = self.data.get("uses", 0) + 1
+        return self.data["uses"]
+
+def compile_commands(commands, previous=None):
+    """Dispatch table of a guild's commands: lower-cased name or alias -> CustomCommand
+
+    Commands of the `previous` table keep their running cooldowns.
+    """
+    table = {}
+    for name, data in commands.items():
+        command = CustomCommand(name, data)
+        old = previous.get(name.lower()) if previous else None
+        if old is not None and old.name == name:
+            command.last_used = old.last_used
+        table[name.lower()] = command
+        for alias in command.aliases:
+            table.setdefault(alias.lower(), command)
+    return table
+
+def case_conflicts(commands):
+    """Groups of command names that only differ by case, only one of each can be used"""
+    names = {}
+    for name in commands:
+        names.setdefault(name.lower(), []).append(name)
+    return [group for group in names.values() if len(group) > 1]
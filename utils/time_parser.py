@@ -1,5 +1,6 @@
 import re
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 
 class TimeParseError(Exception):
     """Custom exception for time parsing errors"""
@@ -64,4 +65,37 @@ def format_duration(seconds):
     if seconds > 0 and not parts:
         parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
         
-    return " ".join(parts)
\ No newline at end of file
+    return " ".join(parts)
+
+def timestamp_now():
+    """Current time as integer seconds since the epoch (UTC)"""
+    return int(time.time())
+
+def to_timestamp(value):
+    """Convert a stored date (epoch number or str(datetime)/ISO string, UTC) to epoch seconds"""
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else int(value)
+    try:
+        return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+    except (ValueError, TypeError):
+        return None
+
+def format_timestamp(timestamp, fmt="%d/%m/%Y %H:%M"):
+    """Format epoch seconds for display"""
+    if timestamp is None:
+        return "Unknown"
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(fmt)
+
+def parse_since(period):
+    """Start of a period as epoch seconds: 'today', 'week', 'month' (calendar, UTC) or a time string like '7d'"""
+    period = period.strip().lower()
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'today':
+        start = today
+    elif period == 'week':
+        start = today - timedelta(days=today.weekday())
+    elif period == 'month':
+        start = today.replace(day=1)
+    else:
+        return timestamp_now() - parse_time(period)
+    return int(start.timestamp())
@@ -0,0 +1,210 @@
+import re
+import time
+import unicodedata
+
+# Digits and symbols commonly standing in for letters
+LEET = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's'
+})
+
+_COMBINING = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+_NON_WORD = re.compile(r'[\W_]+')
+
+def fold(text):
+    """Lower-case, unaccented, leetspeak-folded text with single spaces between words
+
+    Compatibility forms (fullwidth letters, ligatures, ...) are normalized
+    first, so terms and messages folded the same way compare equal.
+    """
+    if not text.isascii():
+        text = _COMBINING.sub('', unicodedata.normalize('NFKD', text))
+    text = text.casefold().translate(LEET)
+    return _NON_WORD.sub(' ', text).strip()
+
+def parse_term(term):
+    """Fold a blocklist entry, returns (folded, prefix, suffix)
+
+    A leading or trailing * lets the term match inside longer words, e.g.
+    `bad*` also matches "badly"; otherwise only whole words match.
+    """
+    term = term.strip()
+    prefix = term.startswith('*')
+    suffix = term.endswith('*')
+    return fold(term.strip('*')), prefix, suffix
+
+class Automaton:
+    """Aho-Corasick automaton over folded terms
+
+    Scanning follows one transition per character (plus amortized failure
+    steps), so its cost depends on the length of the message and not on
+    how many terms there are.
+    """
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        # state -> (term, folded length, prefix, suffix) of every term ending there
+        self.out = [()]
+        for term in terms:
+            folded, prefix, suffix = parse_term(term)
+            if not folded:
+                continue
+            state = 0
+            for ch in folded:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = self.goto[state][ch] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                state = next_state
+            self.out[state] += ((term, len(folded), prefix, suffix),)
+
+        # Breadth-first, so a state's failure target is done before the state
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                target = self.fail[state]
+                while target and ch not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[next_state] = self.goto[target].get(ch, 0)
+                self.out[next_state] += self.out[self.fail[next_state]]
+
+    def __len__(self):
+        return len(self.goto)
+
+    def scan(self, text):
+        """Terms found in already folded text, respecting word boundaries"""
+        goto, fail, out = self.goto, self.fail, self.out
+        found = []
+        state = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for term, length, prefix, suffix in out[state]:
+                    start = i - length + 1
+                    if (prefix or start == 0 or text[start - 1] == ' ') and \
+                            (suffix or i == last or text[i + 1] == ' '):
+                        found.append(term)
+        return found
+
+class TermFilter:
+    """A guild's blocklist with an automaton that is updated incrementally
+
+    The main automaton covers the list as of its last rebuild. Terms added
+    since go into a small second automaton, rebuilt on every change, and
+    removed ones are filtered out of the matches. Once the delta passes
+    `max_delta` terms, needs_rebuild says it's time to compile the whole
+    list again, which can be done off the event loop and passed to install();
+    until that's installed, terms added past `max_delta` aren't matched yet.
+    """
+
+    def __init__(self, terms=(), max_delta=64):
+        self.max_delta = max_delta
+        self.terms = set(terms)
+        self.install(Automaton(self.terms), set(self.terms))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def install(self, automaton, compiled):
+        """Use an automaton compiled from the `compiled` terms as the main one"""
+        self.main = automaton
+        self.compiled = compiled
+        self.added = self.terms - compiled
+        self.removed = compiled - self.terms
+        self.delta = Automaton(self.added)
+
+    @property
+    def needs_rebuild(self):
+        return len(self.added) + len(self.removed) > self.max_delta
+
+    def add(self, term):
+        return self.add_many((term,)) > 0
+
+    def remove(self, term):
+        return self.remove_many((term,)) > 0
+
+    def add_many(self, terms):
+        """Add terms, returns how many were new; the delta is compiled once for all of them"""
+        added = 0
+        for term in terms:
+            if term in self.terms:
+                continue
+            self.terms.add(term)
+            added += 1
+            if term in self.removed:
+                self.removed.discard(term)
+            else:
+                self.added.add(term)
+        if added:
+            self.update_delta()
+        return added
+
+    def remove_many(self, terms):
+        """Remove terms, returns how many were on the list"""
+        removed = 0
+        for term in terms:
+            if term not in self.terms:
+                continue
+            self.terms.discard(term)
+            removed += 1
+            if term in self.added:
+                self.added.discard(term)
+            else:
+                self.removed.add(term)
+        if removed:
+            self.update_delta()
+        return removed
+
+    def update_delta(self):
+        # Past max_delta the whole list is about to be rebuilt off the event
+        # loop, so the old delta is kept until then instead of compiling a big
+        # one here; find() ignores its terms that were removed since
+        if not self.needs_rebuild:
+            self.delta = Automaton(self.added)
+
+    def find(self, text):
+        """Blocked terms in a message, in the order they appear"""
+        folded = fold(text)
+        found = self.main.scan(folded)
+        if self.removed:
+            found = [term for term in found if term not in self.removed]
+        if self.added:
+            found += [term for term in self.delta.scan(folded) if term in self.added]
+        return found
+
+def benchmark(sizes=(10, 100, 1000, 10_000, 50_000), messages=5000):
+    """Time TermFilter.find() per message for blocklists of increasing size"""
+    import random
+    rng = random.Random(0)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    word = lambda low, high: ''.join(rng.choice(letters) for _ in range(rng.randint(low, high)))
+    texts = [' '.join(word(3, 9) for _ in range(rng.randint(5, 30))) for _ in range(messages)]
+    results = []
+    for size in sizes:
+        # Longer than most words in the messages, so matches stay rare at every size
+        terms = {word(6, 12) for _ in range(size)}
+        start = time.perf_counter()
+        term_filter = TermFilter(terms)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        hits = sum(1 for text in texts if term_filter.find(text))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "terms": len(terms),
+            "build_ms": built * 1e3,
+            "us_per_message": elapsed / messages * 1e6,
+            "messages_matched": hits
+        })
+    return results
+
+if __name__ == '__main__':
+    for result in benchmark():
+        print(", ".join(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}"
+                        for name, value in result.items()))